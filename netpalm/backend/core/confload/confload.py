@@ -57,13 +57,38 @@ class Config:
         self.redis_core_q = data["redis_core_q"]
         self.redis_fifo_q = data["redis_fifo_q"]
         self.redis_broadcast_q = data["redis_broadcast_q"]
+        self.redis_task_events_q = data["redis_task_events_q"]
         self.redis_queue_store = data["redis_queue_store"]
         self.redis_pinned_store = data["redis_pinned_store"]
+        self.redis_fifo_autoscaler_store = data["redis_fifo_autoscaler_store"]
+        self.redis_device_semaphore = data["redis_device_semaphore"]
+        self.redis_worker_liveness_key = data["redis_worker_liveness_key"]
+        self.redis_batch_store = data["redis_batch_store"]
         self.redis_schedule_store = data["redis_schedule_store"]
         self.redis_schedule_store_stats = data["redis_schedule_store_stats"]
         self.redis_cache_enabled = data["redis_cache_enabled"]
         self.redis_cache_default_timeout = data["redis_cache_default_timeout"]
         self.redis_cache_key_prefix = data["redis_cache_key_prefix"]
+        self.redis_cache_index_prefix = data["redis_cache_index_prefix"]
+        self.redis_cache_local = data["redis_cache_local"]
+        self.redis_cache_local_max_entries = data["redis_cache_local_max_entries"]
+        self.redis_cache_local_max_bytes = data["redis_cache_local_max_bytes"]
+        self.redis_cache_singleflight = data["redis_cache_singleflight"]
+        self.redis_cache_singleflight_wait = data["redis_cache_singleflight_wait"]
+        self.redis_cache_singleflight_max_joiners = data["redis_cache_singleflight_max_joiners"]
+        self.redis_inflight_key_prefix = data["redis_inflight_key_prefix"]
+        self.redis_inflight_events_q = data["redis_inflight_events_q"]
+        self.redis_cache_refresh_prefix = data["redis_cache_refresh_prefix"]
+        self.redis_cache_epochs = data["redis_cache_epochs"]
+        self.redis_cache_warm_enabled = data["redis_cache_warm_enabled"]
+        self.redis_cache_warm_store = data["redis_cache_warm_store"]
+        self.redis_cache_warm_top_n = data["redis_cache_warm_top_n"]
+        self.redis_cache_warm_interval = data["redis_cache_warm_interval"]
+        self.redis_cache_warm_lead = data["redis_cache_warm_lead"]
+        self.redis_compression_enabled = data["redis_compression_enabled"]
+        self.redis_compression_algorithm = data["redis_compression_algorithm"]
+        self.redis_compression_threshold = data["redis_compression_threshold"]
+        self.redis_compression_stats = data["redis_compression_stats"]
         self.redis_update_log = data["redis_update_log"]
         self.redis_tls_cert_file = data["redis_tls_cert_file"]
         self.redis_tls_key_file = data["redis_tls_key_file"]
@@ -71,8 +96,27 @@ class Config:
         self.redis_tls_enabled = data["redis_tls_enabled"]
         self.redis_socket_connect_timeout = data["redis_socket_connect_timeout"]
         self.redis_socket_keepalive = data["redis_socket_keepalive"]
+        self.redis_pool_max_connections = data["redis_pool_max_connections"]
+        self.redis_pool_timeout = data["redis_pool_timeout"]
+        self.redis_pool_health_check_interval = data["redis_pool_health_check_interval"]
         self.fifo_process_per_node = data["fifo_process_per_node"]
+        self.worker_mode = data["worker_mode"]
+        self.worker_concurrency = data["worker_concurrency"]
+        self.fifo_priority_mode = data["fifo_priority_mode"]
+        self.fifo_priority_weights = data["fifo_priority_weights"]
+        self.fifo_autoscale = data["fifo_autoscale"]
+        self.fifo_process_min_per_node = data["fifo_process_min_per_node"]
+        self.fifo_process_max_per_node = data["fifo_process_max_per_node"]
+        self.fifo_autoscale_jobs_per_worker = data["fifo_autoscale_jobs_per_worker"]
+        self.fifo_autoscale_max_job_age = data["fifo_autoscale_max_job_age"]
+        self.fifo_autoscale_interval = data["fifo_autoscale_interval"]
+        self.fifo_autoscale_cooldown = data["fifo_autoscale_cooldown"]
+        self.fifo_device_max_sessions = data["fifo_device_max_sessions"]
         self.pinned_process_per_node = data["pinned_process_per_node"]
+        self.pinned_session_reuse = data["pinned_session_reuse"]
+        self.pinned_session_idle_timeout = data["pinned_session_idle_timeout"]
+        self.pinned_worker_idle_timeout = data["pinned_worker_idle_timeout"]
+        self.worker_liveness_cache_ttl = data["worker_liveness_cache_ttl"]
         self.redis_task_timeout = data["redis_task_timeout"]
         self.txtfsm_index_file = data["txtfsm_index_file"]
         self.txtfsm_template_server = data["txtfsm_template_server"]
@@ -80,6 +124,8 @@ class Config:
         self.jinja2_config_templates = data["jinja2_config_templates"]
         self.jinja2_service_templates = data["jinja2_service_templates"]
         self.self_api_call_timeout = data["self_api_call_timeout"]
+        self.task_wait_max_timeout = data["task_wait_max_timeout"]
+        self.task_events_keepalive = data["task_events_keepalive"]
         self.default_webhook_url = data["default_webhook_url"]
         self.default_webhook_ssl_verify = data["default_webhook_ssl_verify"]
         self.default_webhook_timeout = data["default_webhook_timeout"]
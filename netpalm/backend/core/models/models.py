@@ -9,6 +9,12 @@ class QueueStrategy(str, Enum):
     pinned = "pinned"
 
 
+class TaskPriority(str, Enum):
+    high = "high"
+    normal = "normal"
+    low = "low"
+
+
 class LibraryName(str, Enum):
     napalm = "napalm"
     ncclient = "ncclient"
@@ -61,6 +67,7 @@ class SetConfig(BaseModel):
     args: Optional[SetConfigArgs] = {}
     webhook: Optional[Webhook] = None
     queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
     pre_checks: Optional[List[GenericPrePostCheck]] = None
     post_checks: Optional[List[GenericPrePostCheck]] = None
     enable_mode: bool = False
@@ -107,6 +114,7 @@ class Script(BaseModel):
     args: Optional[dict] = None
     webhook: Optional[Webhook] = None
     queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
 
     class Config:
         schema_extra = {
@@ -123,6 +131,7 @@ class Script(BaseModel):
 class CacheConfig(BaseModel):
     enabled: bool = False
     ttl: Optional[int] = None
+    stale_ttl: Optional[int] = None
     poison: Optional[bool] = False
 
     class Config:
@@ -130,6 +139,7 @@ class CacheConfig(BaseModel):
             'example': {
                 'enabled': True,
                 'ttl': 300,
+                'stale_ttl': 600,
                 'poison': False
             }
         }
@@ -142,6 +152,7 @@ class GetConfig(BaseModel):
     args: Optional[dict] = {}
     webhook: Optional[Webhook] = {}
     queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
     post_checks: Optional[List[GenericPrePostCheck]] = []
     cache: Optional[CacheConfig] = {}
 
@@ -170,6 +181,80 @@ class GetConfig(BaseModel):
         }
 
 
+class BulkGetConfig(BaseModel):
+    library: LibraryName
+    connection_args: List[dict]
+    command: Any
+    args: Optional[dict] = {}
+    webhook: Optional[Webhook] = {}
+    queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
+    post_checks: Optional[List[GenericPrePostCheck]] = []
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "library": "netmiko",
+                "connection_args": [
+                    {
+                        "device_type": "cisco_ios",
+                        "host": "10.0.2.33",
+                        "username": "device_username",
+                        "password": "device_password"
+                    },
+                    {
+                        "device_type": "cisco_ios",
+                        "host": "10.0.2.34",
+                        "username": "device_username",
+                        "password": "device_password"
+                    }
+                ],
+                "command": "show ip int brief",
+                "args": {
+                    "use_textfsm": True
+                },
+                "queue_strategy": "fifo"
+            }
+        }
+
+
+class BulkSetConfig(BaseModel):
+    library: LibraryName
+    connection_args: List[dict]
+    config: Optional[Any] = None
+    j2config: Optional[J2Config] = None
+    args: Optional[SetConfigArgs] = {}
+    webhook: Optional[Webhook] = None
+    queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
+    pre_checks: Optional[List[GenericPrePostCheck]] = None
+    post_checks: Optional[List[GenericPrePostCheck]] = None
+    enable_mode: bool = False
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "library": "netmiko",
+                "connection_args": [
+                    {
+                        "device_type": "cisco_ios",
+                        "host": "10.0.2.33",
+                        "username": "device_username",
+                        "password": "device_password"
+                    },
+                    {
+                        "device_type": "cisco_ios",
+                        "host": "10.0.2.34",
+                        "username": "device_username",
+                        "password": "device_password"
+                    }
+                ],
+                "config": ["hostname cat"],
+                "queue_strategy": "fifo"
+            }
+        }
+
+
 class TFSMPushTemplateModel(BaseModel):
     driver: str
     command: str
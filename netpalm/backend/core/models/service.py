@@ -3,7 +3,7 @@ from typing import Optional, List
 
 from pydantic import BaseModel
 
-from netpalm.backend.core.models.models import QueueStrategy
+from netpalm.backend.core.models.models import QueueStrategy, TaskPriority
 
 
 class ServiceLifecycle(str, Enum):
@@ -18,6 +18,7 @@ class ServiceModel(BaseModel):
     operation: ServiceLifecycle
     args: dict
     queue_strategy: Optional[QueueStrategy] = None
+    priority: Optional[TaskPriority] = None
 
     class Config:
         schema_extra = {
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Any
+from typing import Optional, Any, List
 
 from pydantic import BaseModel
 
@@ -39,6 +39,8 @@ class TaskResponse(BaseModel):
     task_status: TaskStatusEnum
     task_result: Any
     task_errors: list
+    cached: bool = False
+    stale: bool = False
 
 
 class Response(BaseModel):
@@ -116,6 +118,67 @@ class ServiceResponse(BaseModel):
         }
 
 
+class BulkTaskResponse(BaseModel):
+    batch_id: str
+    task_ids: List[str]
+
+
+class BulkResponse(BaseModel):
+    status: TaskResponseEnum
+    data: BulkTaskResponse
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "status": "success",
+                "data": {
+                    "batch_id": "5e9a1f0c-2b5d-4d0c-8a53-7a4f3f6b9e21",
+                    "task_ids": [
+                        "b380cf2b-ba78-4aab-b157-9b87ebbe6bb3",
+                        "0d1c3b9e-0f4a-4a55-9f0e-2a3b1c9d8e7f"
+                    ]
+                }
+            }
+        }
+
+
+class TaskStatusRequest(BaseModel):
+    task_ids: List[str]
+    include_result: bool = False
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "task_ids": [
+                    "b380cf2b-ba78-4aab-b157-9b87ebbe6bb3",
+                    "0d1c3b9e-0f4a-4a55-9f0e-2a3b1c9d8e7f"
+                ],
+                "include_result": False
+            }
+        }
+
+
+class TaskStatusRecord(BaseModel):
+    task_id: str
+    task_queue: Optional[str] = None
+    task_status: Optional[TaskStatusEnum] = None
+    enqueued_at: Optional[str] = None
+    started_at: Optional[str] = None
+    ended_at: Optional[str] = None
+    task_errors: list = []
+    task_result: Optional[Any] = None
+
+
+class TaskStatusList(BaseModel):
+    tasks: List[TaskStatusRecord]
+    missing: List[str]
+
+
+class TaskStatusResponse(BaseModel):
+    status: TaskResponseEnum
+    data: TaskStatusList
+
+
 class ResponseBasic(BaseModel):
     status: TaskResponseEnum
     data: dict
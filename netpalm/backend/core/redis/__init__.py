@@ -1,3 +1,5 @@
 from netpalm.backend.core.redis.rediz import Rediz
+from netpalm.backend.core.redis.async_rediz import AsyncRediz
 
 reds = Rediz()
+areds = AsyncRediz(reds)
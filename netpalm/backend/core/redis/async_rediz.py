@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import List
+
+from redis.asyncio import Redis as AsyncRedis
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from rq.utils import utcnow
+
+from netpalm.backend.core.confload.confload import config, Config
+from netpalm.backend.core.redis.connection import async_redis_connection
+from netpalm.backend.core.redis.local_cache import cache_invalidate_message
+from netpalm.backend.core.redis.rediz import Rediz, InflightRequests, PinnedQueue, CLEAR_INDEX_SCRIPT, \
+    INDEXED_SET_SCRIPT, PINNED_PUSH_SCRIPT, cache_entry, cache_key_host, cache_target, fifo_queue_name, \
+    response_task_id, worker_liveness_key
+from netpalm.backend.core.redis.task_events import task_event_message, task_host, FINAL_TASK_STATES
+
+log = logging.getLogger(__name__)
+
+
+class AsyncClearableCache:
+    """asyncio counterpart of ClearableCache, shares its key prefix, serialization and local cache"""
+
+    def __init__(self, client: AsyncRedis, cache):
+        self._client = client
+        self.cache = cache
+        self.key_prefix = cache.key_prefix
+        self.local = cache.local
+        self._indexed_set = client.register_script(INDEXED_SET_SCRIPT)
+        self._clear_index = client.register_script(CLEAR_INDEX_SCRIPT)
+
+    async def invalidate(self, keys: List[str] = (), pattern: str = None, flush: bool = False):
+        if self.local is not None:
+            if flush:
+                self.local.flush()
+            else:
+                self.local.drop(keys=keys, pattern=pattern)
+        if self.cache.invalidation_channel:
+            message = cache_invalidate_message(keys=keys, pattern=pattern, flush=flush, prefix=self.key_prefix,
+                                               origin=self.local.origin if self.local is not None else None)
+            await self._client.publish(self.cache.invalidation_channel, message)
+
+    async def get(self, key):
+        return (await self.get_entry(key))[0]
+
+    async def get_entry(self, key):
+        return cache_entry(await self.get_stored(key))
+
+    async def epoch(self, host_port: str) -> int:
+        return sum(int(epoch or 0) for epoch in await self._client.hmget(self.cache.epochs_key, host_port, "*"))
+
+    async def claim_refresh(self, key: str, ttl: int) -> bool:
+        return bool(await self._client.set(self.cache.refresh_key(key), 1, nx=True, ex=max(int(ttl), 1)))
+
+    async def get_stored(self, key):
+        if self.local is None:
+            return self.cache.load_object(await self._client.get(self.key_prefix + key))
+        found, value = self.local.get(key)
+        if found:
+            return value
+        self.local.ensure_listener()
+        generation = self.local.generation
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_prefix + key)
+            pipe.pttl(self.key_prefix + key)
+            raw, ttl_ms = await pipe.execute()
+        value, size = self.cache.load_sized(raw)
+        if raw is not None:
+            self.local.put(key, value, size, ttl_ms, generation)
+        return value
+
+    async def set(self, key, value, timeout=None, stale_ttl=None, epoch: int = None):
+        keys, args, compression = self.cache.indexed_set_args(key, value, timeout, stale_ttl, epoch)
+        async with self._client.pipeline(transaction=False) as pipe:
+            await self._indexed_set(keys=keys, args=args, client=pipe)
+            pipe.delete(self.cache.refresh_key(key))
+            self.cache.compressor.record(pipe, compression, "cache")
+            result = bool((await pipe.execute())[0])
+        await self.invalidate(keys=[key])
+        return result
+
+    async def keys(self, key_pattern: str = ""):
+        return [key async for key in self._client.scan_iter(match=f"{self.key_prefix}{key_pattern}*", count=1000)
+                if not key.decode().startswith(self.cache.index_prefix)]
+
+    async def clear_keys(self, key_pattern: str):
+        if not key_pattern:
+            raise ValueError(f"no key_pattern provided!")
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.cache.epochs_key, cache_key_host(key_pattern), 1)
+            await self._clear_index(keys=[self.cache.index_key(key_pattern)], args=[self.key_prefix], client=pipe)
+            status = (await pipe.execute())[1]
+        await self.invalidate(pattern=key_pattern)
+
+        return status
+
+
+class AsyncInflightRequests:
+    """asyncio counterpart of InflightRequests, shares its keys and serialization"""
+
+    def __init__(self, client: AsyncRedis, inflight: InflightRequests):
+        self._client = client
+        self.inflight = inflight
+        self._clear_index = client.register_script(CLEAR_INDEX_SCRIPT)
+
+    async def claim(self, cache_key: str) -> bool:
+        index_key = self.inflight.index_key(cache_key_host(cache_key))
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(self.inflight.key(cache_key), self.inflight.PENDING, nx=True, ex=max(int(self.inflight.wait), 1))
+            pipe.sadd(index_key, cache_key)
+            pipe.expire(index_key, self.inflight.ttl)
+            claimed, _, _ = await pipe.execute()
+        return bool(claimed)
+
+    async def publish(self, cache_key: str, result):
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(self.inflight.key(cache_key), self.inflight.cache.dump_object(result),
+                     ex=self.inflight.publish_ttl(result))
+            pipe.publish(self.inflight.events_channel, cache_key)
+            await pipe.execute()
+
+    async def drop(self, cache_key: str):
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.delete(self.inflight.key(cache_key))
+            pipe.srem(self.inflight.index_key(cache_key_host(cache_key)), cache_key)
+            pipe.publish(self.inflight.events_channel, cache_key)
+            await pipe.execute()
+
+    async def lookup(self, cache_key: str):
+        raw = await self._client.get(self.inflight.key(cache_key))
+        if raw is None:
+            return False, None
+        if raw == self.inflight.PENDING:
+            return True, None
+        result = self.inflight.cache.load_object(raw)
+        if task_id := response_task_id(result):
+            status = await self._client.hget(Job.key_for(task_id), "status")
+            if status is None or status.decode() in FINAL_TASK_STATES:
+                async with self._client.pipeline(transaction=False) as pipe:
+                    pipe.delete(self.inflight.key(cache_key))
+                    pipe.srem(self.inflight.index_key(cache_key_host(cache_key)), cache_key)
+                    await pipe.execute()
+                return False, None
+        return False, result
+
+    async def join(self, cache_key: str):
+        events = self.inflight.events
+        if not await asyncio.get_running_loop().run_in_executor(None, events.ensure_listener):
+            log.warning(f"inflight event listener isn't subscribed yet, {cache_key} may wait the full "
+                        f"{self.inflight.wait}s")
+        settled = events.register(cache_key)
+        try:
+            pending, result = await self.lookup(cache_key)
+            if pending:
+                try:
+                    await asyncio.wait_for(settled, self.inflight.wait)
+                except asyncio.TimeoutError:
+                    pass
+                pending, result = await self.lookup(cache_key)
+            return result
+        finally:
+            events.unregister(cache_key, settled)
+
+    async def clear_keys(self, key_pattern: str):
+        await self._clear_index(keys=[self.inflight.index_key(key_pattern)], args=[f"{self.inflight.key_prefix}:"])
+        await self._client.publish(self.inflight.events_channel, f"{key_pattern}:")
+
+
+class AsyncDisabledCache:
+    @staticmethod
+    async def always_return_none(*args, **kwargs):
+        return None
+
+    @staticmethod
+    async def get_entry(key):
+        return None, False
+
+    def __getattr__(self, item):
+        return self.always_return_none
+
+
+class AsyncRediz:
+    """asyncio client for the controllers hot paths, everything else stays on the blocking Rediz"""
+
+    def __init__(self, reds: Rediz, config: Config = config):
+        self.reds = reds
+        self.config = config
+        self.base_connection = async_redis_connection(config)
+        self._pinned_push = self.base_connection.register_script(PINNED_PUSH_SCRIPT)
+        if reds.cache_enabled:
+            self.cache = AsyncClearableCache(self.base_connection, reds.cache)
+            self.inflight = None
+            if reds.inflight is not None:
+                self.inflight = AsyncInflightRequests(self.base_connection, reds.inflight)
+        else:
+            # noinspection PyTypeChecker
+            self.cache = AsyncDisabledCache()
+            self.inflight = None
+
+    @staticmethod
+    async def run_blocking(func, *args, **kwargs):
+        """runs a blocking Rediz call in the default executor"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+    async def queue_is_ready(self, host):
+        """fast path of Rediz.getqueue, True only when the queue exists and a worker is known to be alive"""
+        if not await self.base_connection.hexists(self.reds.networked_queuedb, host):
+            return False
+        now = time.monotonic()
+        if self.reds.worker_liveness_memo.get(host, 0) <= now:
+            if not await self.base_connection.exists(worker_liveness_key(host, self.config)):
+                return False
+            self.reds.worker_liveness_memo[host] = now + self.reds.worker_liveness_memo_ttl
+        if not self.reds.exists_in_local_queue_db(qn=host):
+            self.reds.append_local_queue_db(qn=host)
+        return True
+
+    async def reoute_and_create_q_worker(self, hst):
+        """routes a process to the correct container."""
+        if not await self.queue_is_ready(hst):
+            # reserving capacity and spawning a pinned worker is rare enough to stay blocking
+            await self.run_blocking(self.reds.reoute_and_create_q_worker, hst=hst)
+
+    async def sendtask(self, q, exe, at_front=False, **kwargs):
+        """enqueues the job the same way rq's Queue.enqueue_call does, in one pipelined round trip"""
+        queue = self.reds.local_queuedb[q]["queue"]
+        target = cache_target.get()
+        if target:
+            target = {**target, "cache_epoch": await self.cache.epoch(cache_key_host(target["cache_key"]))}
+        task = queue.create_job(func=self.reds.routes[exe], kwargs=kwargs["kwargs"], description=q,
+                                ttl=self.reds.ttl, result_ttl=self.reds.task_result_ttl,
+                                meta={**self.reds.get_redis_meta_template(), **(target or {})},
+                                timeout=self.reds.timeout)
+        task.enqueued_at = utcnow()
+        if target and self.reds.cache_warmer is not None:
+            self.reds.cache_warmer.remember(target["cache_key"], exe, kwargs["kwargs"], target)
+
+        async with self.base_connection.pipeline() as pipe:
+            pipe.sadd(queue.redis_queues_keys, queue.key)
+            pipe.hset(task.key, mapping=task.to_dict())
+            if task.ttl:
+                pipe.expire(task.key, task.ttl)
+            if isinstance(queue, PinnedQueue):
+                await self._pinned_push(keys=[queue.key, queue.queue_store], args=[queue.name, task.id, int(at_front)],
+                                        client=pipe)
+                pushed = len(pipe) - 1
+            elif at_front:
+                pipe.lpush(queue.key, task.id)
+            else:
+                pipe.rpush(queue.key, task.id)
+            pipe.publish(self.config.redis_task_events_q,
+                         task_event_message(task.id, "queued", q, host=task_host(kwargs["kwargs"])))
+            results = await pipe.execute()
+        if isinstance(queue, PinnedQueue) and not results[pushed]:
+            await self.run_blocking(self.reds.adopt_released_queue, q)
+
+        resultdata = self.reds.render_task_response(task, read_only=True)
+        return resultdata
+
+    async def execute_task(self, method, **kwargs):
+        """main entry point for rpc tasks"""
+        kw = kwargs.get("kwargs", False)
+        connectionargs = kw.get("connection_args", False)
+        host = False
+        if connectionargs:
+            host = kw["connection_args"].get("host", False)
+        queue_strategy = kw.get("queue_strategy", False)
+        priority = kw.get("priority")
+        if queue_strategy == "pinned":
+            await self.reoute_and_create_q_worker(hst=host)
+            r = await self.sendtask(q=host, exe=method, kwargs=kw, at_front=priority == "high")
+        else:
+            r = await self.sendtask(q=fifo_queue_name(self.config.redis_fifo_q, priority), exe=method, kwargs=kw)
+        return r
+
+    async def fetchtask(self, task_id):
+        """gets a job result and renders it"""
+        log.info(f"fetching task: {task_id}")
+        try:
+            raw_data = await self.base_connection.hgetall(Job.key_for(task_id))
+            if not raw_data:
+                raise NoSuchJobError(f"No such job: {task_id}")
+            task = Job(task_id, connection=self.reds.base_connection)
+            task.restore(raw_data)
+            response_object = self.reds.render_task_response(task, read_only=True)
+            if "task_id" in str(response_object["data"]["task_result"]) and "operation" in str(response_object["data"]["task_result"]):
+                response_object = await self.run_blocking(self.reds.fetchsubtask, parent_task_object=response_object)
+            return response_object
+        except Exception as e:
+            return e
+
+    async def send_broadcast(self, msg: str):
+        """publishes a message to all workers"""
+        log.info(f"sending broadcast: {msg}")
+        try:
+            await self.base_connection.publish(self.config.redis_broadcast_q, msg)
+            return {
+                "result": "Message Sent"
+            }
+
+        except Exception as e:
+            return e
+
+    async def clear_cache_for_host(self, cache_key: str):
+        """poisions a cache for a specific host"""
+        if not cache_key.count(":") >= 2:
+            log.error(f"{cache_key=} doesn't seem to be a valid cache key!")
+        modified_cache_key = cache_key_host(cache_key)
+        log.info(f"deleting {modified_cache_key=}")
+        if self.inflight is not None:
+            await self.inflight.clear_keys(modified_cache_key)
+        return await self.cache.clear_keys(modified_cache_key)
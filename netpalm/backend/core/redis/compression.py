@@ -0,0 +1,154 @@
+import bz2
+import io
+import json
+import logging
+import lzma
+import pickle
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+from netpalm.backend.core.confload.confload import config, Config
+
+log = logging.getLogger(__name__)
+
+ALGORITHMS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+}
+
+# how many of the latest compressed entries are kept for the metrics endpoint
+RECENT_ENTRIES = 100
+
+
+def decompress_payload(algorithm: str, blob: bytes):
+    """what a CompressedPayload unpickles to, the value it was made from"""
+    return pickle.loads(ALGORITHMS[algorithm][1](blob))
+
+
+class CompressedPayload:
+    """stands in for a large value wherever it gets pickled and turns back into that value when unpickled,
+    so whatever reads it back with plain pickle (cachelib, rq) needs no idea it was ever compressed and
+    entries written before compression was turned on read exactly as they did"""
+
+    def __init__(self, algorithm: str, blob: bytes):
+        self.algorithm = algorithm
+        self.blob = blob
+
+    def __reduce__(self):
+        return decompress_payload, (self.algorithm, self.blob)
+
+
+class PickledPayload:
+    """a value that has already been pickled, pickling it again only copies the bytes and unpickling it
+    returns the value"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __reduce__(self):
+        return pickle.loads, (self.data,)
+
+
+class SizingUnpickler(pickle.Unpickler):
+    """unpickles like pickle.loads while counting what compressed payloads took up once decompressed"""
+
+    def __init__(self, data: bytes):
+        super().__init__(io.BytesIO(data))
+        self.size = len(data)
+
+    def find_class(self, module, name):
+        if module == __name__ and name == "decompress_payload":
+            return self.decompress_payload
+        return super().find_class(module, name)
+
+    def decompress_payload(self, algorithm: str, blob: bytes):
+        data = ALGORITHMS[algorithm][1](blob)
+        self.size += len(data) - len(blob)
+        return pickle.loads(data)
+
+
+def loads_sized(data: bytes) -> Tuple[object, int]:
+    """unpickles data, returns the value and the size of its pickle, uncompressed if it was compressed"""
+    unpickler = SizingUnpickler(data)
+    return unpickler.load(), unpickler.size
+
+
+class Compressor:
+    """compresses values whose pickle is at least threshold bytes with one of ALGORITHMS"""
+
+    def __init__(self, config: Config = config):
+        if config.redis_compression_algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown redis_compression_algorithm {config.redis_compression_algorithm!r}, "
+                             f"expected one of {sorted(ALGORITHMS)}")
+        self.enabled = config.redis_compression_enabled
+        self.algorithm = config.redis_compression_algorithm
+        self.threshold = config.redis_compression_threshold
+        self.stats_key = config.redis_compression_stats
+
+    def pack(self, value, key: str = None) -> Tuple[object, Optional[Dict]]:
+        """returns what to store in value's place, for callers that pickle it themselves, and a metrics entry,
+        which is None if it was stored uncompressed"""
+        if not self.enabled or value is None or isinstance(value, (int, CompressedPayload, PickledPayload)):
+            return value, None
+        data, entry = self.dumps(value, key=key)
+        return PickledPayload(data), entry
+
+    def dumps(self, value, key: str = None) -> Tuple[bytes, Optional[Dict]]:
+        """pickles value once, compressing the pickle if it's at least threshold bytes, and returns it with
+        a metrics entry, which is None if it wasn't compressed"""
+        started = time.thread_time()
+        raw = pickle.dumps(value)
+        if not self.enabled or len(raw) < self.threshold:
+            return raw, None
+        blob = ALGORITHMS[self.algorithm][0](raw)
+        cpu_ms = (time.thread_time() - started) * 1000
+        if len(blob) >= len(raw):
+            return raw, None
+        entry = {
+            "key": key,
+            "algorithm": self.algorithm,
+            "original_bytes": len(raw),
+            "compressed_bytes": len(blob),
+            "ratio": round(len(raw) / len(blob), 2),
+            "cpu_ms": round(cpu_ms, 3)
+        }
+        return pickle.dumps(CompressedPayload(self.algorithm, blob)), entry
+
+    def record(self, pipe, entry: Optional[Dict], kind: str):
+        """queues entry's metrics on pipe, which may be a sync or an asyncio pipeline"""
+        if entry is None:
+            return
+        entry = {**entry, "kind": kind}
+        pipe.hincrby(self.stats_key, f"{kind}:entries", 1)
+        pipe.hincrby(self.stats_key, f"{kind}:original_bytes", entry["original_bytes"])
+        pipe.hincrby(self.stats_key, f"{kind}:compressed_bytes", entry["compressed_bytes"])
+        pipe.hincrbyfloat(self.stats_key, f"{kind}:cpu_ms", entry["cpu_ms"])
+        pipe.lpush(self.recent_key, json.dumps(entry))
+        pipe.ltrim(self.recent_key, 0, RECENT_ENTRIES - 1)
+
+    @property
+    def recent_key(self) -> str:
+        return f"{self.stats_key}_recent"
+
+    def stats(self, client) -> Dict:
+        """totals per kind of entry plus the latest entries, each with its own ratio and cpu time"""
+        with client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self.stats_key)
+            pipe.lrange(self.recent_key, 0, -1)
+            totals, recent = pipe.execute()
+        kinds = {}
+        for field, value in totals.items():
+            kind, _, metric = field.decode().partition(":")
+            kinds.setdefault(kind, {})[metric] = float(value) if metric == "cpu_ms" else int(value)
+        for kind in kinds.values():
+            if kind.get("compressed_bytes"):
+                kind["ratio"] = round(kind.get("original_bytes", 0) / kind["compressed_bytes"], 2)
+        return {
+            "enabled": self.enabled,
+            "algorithm": self.algorithm,
+            "threshold": self.threshold,
+            "totals": kinds,
+            "recent": [json.loads(entry) for entry in recent]
+        }
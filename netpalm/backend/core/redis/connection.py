@@ -0,0 +1,170 @@
+"""redis connection factory, every component in a process shares one pool per redis server
+
+redis-py pools check the pid before handing out a connection and start afresh after a fork,
+so pools built at import time are safe to use from forked workers."""
+import logging
+import threading
+import time
+from typing import Dict
+from weakref import WeakSet
+
+import redis.asyncio
+from redis import Redis
+from redis.connection import BlockingConnectionPool, Connection, SSLConnection
+
+from netpalm.backend.core.confload.confload import config, Config
+
+log = logging.getLogger(__name__)
+
+_pools: Dict[tuple, "InstrumentedConnectionPool"] = {}
+_async_pools: "WeakSet[redis.asyncio.BlockingConnectionPool]" = WeakSet()
+_pools_lock = threading.Lock()
+
+
+class PoolStats:
+    """counters for a single pool, reset along with the pool after a fork"""
+
+    def __init__(self):
+        self.connections_created = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.connect_seconds = 0.0
+        self.tls_handshakes = 0
+
+    def dict(self):
+        return dict(vars(self))
+
+
+class InstrumentedConnection(Connection):
+    """times every (re)connect, which covers the tcp connect, any tls handshake and AUTH"""
+
+    def __init__(self, *args, stats: PoolStats = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+
+    def connect(self):
+        if self._sock:
+            return
+        start = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            self.stats.connect_seconds += time.monotonic() - start
+
+
+class InstrumentedSSLConnection(InstrumentedConnection, SSLConnection):
+    """redis-py's SSLConnection does the handshake, this only counts the ones that completed"""
+
+    def on_connect(self):
+        self.stats.tls_handshakes += 1
+        super().on_connect()
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """blocking pool that counts how often callers had to wait for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        self.stats = PoolStats()
+        kwargs["stats"] = self.stats
+        super().__init__(*args, **kwargs)
+
+    def reset(self):
+        super().reset()
+        self.stats = PoolStats()
+        self.connection_kwargs["stats"] = self.stats
+
+    def make_connection(self):
+        self.stats.connections_created += 1
+        return super().make_connection()
+
+    def get_connection(self, command_name, *keys, **options):
+        if not self.pool.empty():
+            return super().get_connection(command_name, *keys, **options)
+        self.stats.waits += 1
+        start = time.monotonic()
+        try:
+            return super().get_connection(command_name, *keys, **options)
+        finally:
+            self.stats.wait_seconds += time.monotonic() - start
+
+    def usage(self) -> dict:
+        return {**blocking_pool_usage(self, self.pool.queue), **self.stats.dict()}
+
+
+def blocking_pool_usage(pool, queued) -> dict:
+    """blocking pools queue a None placeholder for every connection they have yet to create"""
+    idle = sum(1 for connection in list(queued) if connection is not None)
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": len(pool._connections) - idle,
+        "idle": idle
+    }
+
+
+def connection_kwargs(config: Config = config) -> dict:
+    """the single place redis connection and TLS settings are built from config"""
+    kwargs = {
+        "host": config.redis_server,
+        "port": config.redis_port,
+        "password": config.redis_key,
+        "socket_connect_timeout": config.redis_socket_connect_timeout,
+        "socket_keepalive": config.redis_socket_keepalive,
+        "health_check_interval": config.redis_pool_health_check_interval
+    }
+    if config.redis_tls_enabled:
+        kwargs.update({
+            "ssl_cert_reqs": "required",
+            "ssl_keyfile": config.redis_tls_key_file,
+            "ssl_certfile": config.redis_tls_cert_file,
+            "ssl_ca_certs": config.redis_tls_ca_cert_file
+        })
+    return kwargs
+
+
+def pool_key(config: Config) -> tuple:
+    """every setting the pool is built from, so configs that differ in tls or auth never share connections"""
+    return (*sorted(connection_kwargs(config).items()), config.redis_tls_enabled,
+            config.redis_pool_max_connections, config.redis_pool_timeout)
+
+
+def connection_pool(config: Config = config) -> InstrumentedConnectionPool:
+    """returns this process's pool for the configured redis server, creating it on first use"""
+    key = pool_key(config)
+    with _pools_lock:
+        if key not in _pools:
+            kwargs = connection_kwargs(config)
+            kwargs["connection_class"] = InstrumentedSSLConnection if config.redis_tls_enabled \
+                else InstrumentedConnection
+            _pools[key] = InstrumentedConnectionPool(max_connections=config.redis_pool_max_connections,
+                                                     timeout=config.redis_pool_timeout, **kwargs)
+        return _pools[key]
+
+
+def redis_connection(config: Config = config) -> Redis:
+    return Redis(connection_pool=connection_pool(config))
+
+
+def async_redis_connection(config: Config = config) -> redis.asyncio.Redis:
+    """asyncio pools are bound to the event loop that first uses them, so each client gets its own"""
+    kwargs = connection_kwargs(config)
+    if config.redis_tls_enabled:
+        kwargs["connection_class"] = redis.asyncio.SSLConnection
+    pool = redis.asyncio.BlockingConnectionPool(max_connections=config.redis_pool_max_connections,
+                                                timeout=config.redis_pool_timeout, **kwargs)
+    _async_pools.add(pool)
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+def pool_stats() -> dict:
+    """usage of every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        async_pools = list(_async_pools)
+    result = {}
+    for pool in pools:
+        server = f'{pool.connection_kwargs["host"]}:{pool.connection_kwargs["port"]}'
+        result.setdefault(server, {}).update(pool.usage())
+    for pool in async_pools:
+        server = f'{pool.connection_kwargs["host"]}:{pool.connection_kwargs["port"]}'
+        result.setdefault(server, {}).setdefault("async", []).append(blocking_pool_usage(pool, pool.pool._queue))
+    return result
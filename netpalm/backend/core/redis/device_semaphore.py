@@ -0,0 +1,124 @@
+import logging
+import time
+from typing import Dict, List
+
+from redis import Redis
+
+from netpalm.backend.core.confload.confload import config, Config
+
+log = logging.getLogger(__name__)
+
+# returns deferred jobs to the front of their queue while the device has free slots
+PROMOTE_FUNCTION = """
+local function promote(holders, deferred, hosts, host, now, limit)
+    redis.call('ZREMRANGEBYSCORE', holders, '-inf', now)
+    local free = limit - redis.call('ZCARD', holders)
+    local promoted = 0
+    while free > 0 do
+        local entry = redis.call('LPOP', deferred)
+        if not entry then
+            break
+        end
+        local queue_key, job_id = string.match(entry, '^(.*)|([^|]*)$')
+        redis.call('LPUSH', queue_key, job_id)
+        free = free - 1
+        promoted = promoted + 1
+    end
+    if redis.call('LLEN', deferred) == 0 then
+        redis.call('SREM', hosts, host)
+    end
+    return promoted
+end
+"""
+
+
+class DeviceSemaphore:
+    """limits how many fifo jobs hold a session to the same device at once
+
+    holders live in a sorted set per device scored by when their lease runs out, so a worker that dies
+    mid job only blocks the device until its lease expires. a job that finds the device full is parked on
+    a list per device in the same step, and each release puts the next parked job back on its queue"""
+
+    ACQUIRE_SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    if redis.call('ZSCORE', KEYS[1], ARGV[3]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[4]) then
+        redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+        local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+        redis.call('PEXPIREAT', KEYS[1], last[2])
+        return 1
+    end
+    redis.call('RPUSH', KEYS[2], ARGV[6])
+    redis.call('SADD', KEYS[3], ARGV[5])
+    return 0
+    """
+
+    RELEASE_SCRIPT = PROMOTE_FUNCTION + """
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return promote(KEYS[1], KEYS[2], KEYS[3], ARGV[2], ARGV[3], tonumber(ARGV[4]))
+    """
+
+    PROMOTE_SCRIPT = PROMOTE_FUNCTION + """
+    return promote(KEYS[1], KEYS[2], KEYS[3], ARGV[1], ARGV[2], tonumber(ARGV[3]))
+    """
+
+    def __init__(self, base_connection: Redis, config: Config = config):
+        self.base_connection = base_connection
+        self.prefix = config.redis_device_semaphore
+        self.limit = config.fifo_device_max_sessions
+        self.deferred_hosts = f"{self.prefix}_deferred_hosts"
+        self._acquire = base_connection.register_script(self.ACQUIRE_SCRIPT)
+        self._release = base_connection.register_script(self.RELEASE_SCRIPT)
+        self._promote = base_connection.register_script(self.PROMOTE_SCRIPT)
+
+    def holders_key(self, host: str) -> str:
+        return f"{self.prefix}:{host}"
+
+    def deferred_key(self, host: str) -> str:
+        return f"{self.prefix}_deferred:{host}"
+
+    def keys(self, host: str) -> List[str]:
+        return [self.holders_key(host), self.deferred_key(host), self.deferred_hosts]
+
+    @staticmethod
+    def now_ms() -> int:
+        return int(time.time() * 1000)
+
+    def acquire(self, host: str, holder: str, queue_key: str, lease: int) -> bool:
+        """takes a slot on host for lease seconds, or parks holder (a job id) until a slot frees up"""
+        now = self.now_ms()
+        acquired = self._acquire(keys=self.keys(host),
+                                 args=[now, now + lease * 1000, holder, self.limit, host, f"{queue_key}|{holder}"])
+        return bool(acquired)
+
+    def release(self, host: str, holder: str) -> int:
+        """frees holder's slot on host, returns how many parked jobs went back on their queue"""
+        return self._release(keys=self.keys(host), args=[holder, host, self.now_ms(), self.limit])
+
+    def holders(self, host: str) -> int:
+        return self.base_connection.zcount(self.holders_key(host), self.now_ms(), "+inf")
+
+    def deferred(self, host: str) -> int:
+        return self.base_connection.llen(self.deferred_key(host))
+
+    @staticmethod
+    def deferred_job_id(entry: bytes) -> str:
+        """the job id of an entry of a device's list of parked jobs"""
+        return entry.decode().rsplit("|", 1)[-1]
+
+    def deferred_depths(self) -> Dict[str, int]:
+        """how many jobs are parked on each device that has any"""
+        hosts = [host.decode() for host in self.base_connection.smembers(self.deferred_hosts)]
+        with self.base_connection.pipeline() as pipe:
+            for host in hosts:
+                pipe.llen(self.deferred_key(host))
+            return {host: depth for host, depth in zip(hosts, pipe.execute()) if depth}
+
+    def sweep(self) -> int:
+        """requeues jobs parked on devices whose holders' leases ran out without a release"""
+        promoted = 0
+        for host in self.base_connection.smembers(self.deferred_hosts):
+            host = host.decode()
+            promoted += self._promote(keys=self.keys(host), args=[host, self.now_ms(), self.limit])
+        if promoted:
+            log.info(f"device semaphore: requeued {promoted} jobs parked behind expired sessions")
+        return promoted
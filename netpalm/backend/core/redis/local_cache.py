@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+CACHE_INVALIDATE = "cache_invalidate"
+
+
+def cache_invalidate_message(keys: Iterable[str] = (), pattern: Optional[str] = None, flush: bool = False,
+                             prefix: Optional[str] = None, origin: Optional[str] = None) -> str:
+    """broadcast telling every controller process to drop entries from its local cache for the cache prefix,
+    origin is the local cache that already dropped them"""
+    return json.dumps({
+        "type": CACHE_INVALIDATE,
+        "kwargs": {"keys": list(keys), "pattern": pattern, "flush": flush, "prefix": prefix, "origin": origin}
+    })
+
+
+class LocalCache:
+    """bounded in-process LRU in front of the redis result cache
+
+    entries expire when their redis key does, and are dropped when any process broadcasts an invalidation.
+    nothing is kept until the broadcast subscription is up, and everything is dropped whenever it has to
+    be re-established, so an invalidation sent while it was down can't leave a stale entry behind.
+    invalidations for another cache prefix sharing the channel are ignored, as are this cache's own, which it
+    applied as it sent them and which would otherwise drop entries filled since"""
+
+    def __init__(self, base_connection, channel: str, max_entries: int, max_bytes: int, prefix: str = None):
+        self.base_connection = base_connection
+        self.channel = channel
+        self.prefix = prefix
+        self.origin = uuid.uuid4().hex
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.subscribed = threading.Event()
+        self.listener = None
+
+    def ensure_listener(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.subscribed.clear()
+                self.listener = threading.Thread(target=self.listen, name="local_cache_listener", daemon=True)
+                self.listener.start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.base_connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.flush()
+                self.subscribed.set()
+                log.info(f"local cache listening for invalidations on {self.channel}")
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self.dispatch(message["data"])
+            except Exception as e:
+                self.subscribed.clear()
+                self.flush()
+                log.error(f"local cache listener: {e}")
+                time.sleep(1)
+
+    def dispatch(self, data):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(message, dict) or message.get("type") != CACHE_INVALIDATE:
+            return
+        kwargs = message.get("kwargs") or {}
+        if self.prefix and kwargs.get("prefix") not in (None, self.prefix):
+            return
+        if kwargs.get("origin") == self.origin:
+            return
+        if kwargs.get("flush"):
+            self.flush()
+            return
+        self.drop(keys=kwargs.get("keys") or (), pattern=kwargs.get("pattern"))
+
+    def get(self, key: str) -> Tuple[bool, object]:
+        """returns (found, value) without touching redis"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            value, size, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._remove(key)
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def put(self, key: str, value, size: int, ttl_ms: int, generation: int):
+        """keeps value for key unless an invalidation arrived since generation was read"""
+        if not self.subscribed.is_set() or size > self.max_bytes or ttl_ms == -2:
+            return
+        expires_at = None if ttl_ms < 0 else time.monotonic() + ttl_ms / 1000
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, size, expires_at)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def drop(self, keys: Iterable[str] = (), pattern: Optional[str] = None):
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                if key in self.entries:
+                    self._remove(key)
+            if pattern:
+                for key in [key for key in self.entries if key.startswith(pattern)]:
+                    self._remove(key)
+
+    def flush(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes, "subscribed": self.subscribed.is_set()}
+
+
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+def local_cache_for(base_connection, config, key_prefix: str) -> LocalCache:
+    """the process wide local cache for a redis server and cache prefix, so every client in a process
+    drops an entry the moment any of them invalidates it"""
+    key = (config.redis_server, config.redis_port, key_prefix, config.redis_broadcast_q)
+    with _local_caches_lock:
+        if key not in _local_caches:
+            _local_caches[key] = LocalCache(base_connection, config.redis_broadcast_q,
+                                            max_entries=config.redis_cache_local_max_entries,
+                                            max_bytes=config.redis_cache_local_max_bytes, prefix=key_prefix)
+        return _local_caches[key]
@@ -1,8 +1,12 @@
 import datetime
 import json
 import logging
+import pickle
+import threading
+import time
+from collections import Counter
 from logging import error
-from typing import Union, Dict, List
+from typing import Union, Dict, List, NamedTuple, Optional, Tuple
 
 from jsonpath_ng import jsonpath, parse
 
@@ -10,6 +14,7 @@ import redis_lock
 from cachelib import RedisCache
 
 import uuid
+from contextvars import ContextVar
 
 from redis import Redis
 from rq import Queue, Worker
@@ -17,28 +22,386 @@ from rq.job import Job
 from rq.registry import StartedJobRegistry, FinishedJobRegistry, FailedJobRegistry
 
 from netpalm.backend.core.confload.confload import config, Config
-from netpalm.backend.core.models.task import Response, WorkerResponse
-from netpalm.backend.core.models.service import ServiceModel
+from netpalm.backend.core.models.task import Response, WorkerResponse, BulkResponse, TaskStatusRecord, \
+    TaskStatusResponse
 from netpalm.backend.core.models.transaction_log import TransactionLogEntryModel, TransactionLogEntryType
+from netpalm.backend.core.redis.compression import Compressor, loads_sized
+from netpalm.backend.core.redis.connection import redis_connection
+from netpalm.backend.core.redis.device_semaphore import DeviceSemaphore
+from netpalm.backend.core.redis.local_cache import LocalCache, cache_invalidate_message, local_cache_for
+from netpalm.backend.core.redis.task_events import TaskEventHub, task_event_message, task_host, FINAL_TASK_STATES
 from netpalm.backend.core.routes import routes
 
 log = logging.getLogger(__name__)
 
 
+def worker_liveness_key(queue_name: str, config: Config = config) -> str:
+    """key refreshed by worker heartbeats while at least one worker listens on queue_name"""
+    return f"{config.redis_worker_liveness_key}:{queue_name}"
+
+
+# pushes a job onto a pinned queue and reports whether the queue is still registered, in the same step.
+# a worker only gives its queue up while it's empty, so it either finds the job or had already let the queue go
+PINNED_PUSH_SCRIPT = """
+if ARGV[3] == '1' then
+    redis.call('LPUSH', KEYS[1], ARGV[2])
+else
+    redis.call('RPUSH', KEYS[1], ARGV[2])
+end
+return redis.call('HEXISTS', KEYS[2], ARGV[1])
+"""
+
+
+class PinnedQueue(Queue):
+    """queue of a pinned worker, pushing a job returns whether a worker still owns the queue"""
+
+    def __init__(self, *args, queue_store: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue_store = queue_store
+        self._push = self.connection.register_script(PINNED_PUSH_SCRIPT)
+
+    def push_job_id(self, job_id, pipeline=None, at_front=False):
+        return self._push(keys=[self.key, self.queue_store], args=[self.name, job_id, int(at_front)],
+                          client=pipeline if pipeline is not None else self.connection)
+
+
+FIFO_PRIORITIES = ("high", "normal", "low")
+
+# segments of a queue's task listing kept in lists, the others are rq's job registries
+LIST_SEGMENTS = ("queued", "deferred")
+
+
+# set by cacheable routes, tells the worker which result cache key and ttl the task's result belongs under
+cache_target: ContextVar[Optional[Dict]] = ContextVar("cache_target", default=None)
+
+
+def cache_target_for(cache_key: str, cache_config: dict) -> dict:
+    """job meta a task enqueued by a cacheable route needs to cache its own result"""
+    return {
+        "cache_key": cache_key,
+        "cache_ttl": cache_config.get("ttl"),
+        "cache_stale_ttl": cache_config.get("stale_ttl")
+    }
+
+
+def cache_set_kwargs(cache_config: dict) -> dict:
+    """ClearableCache.set kwargs for a request's cache config, an entry never outlives the task results it came from"""
+    kwargs = {}
+    if ttl := cache_config.get("ttl"):
+        kwargs["timeout"] = min(int(ttl), int(config.redis_task_result_ttl))
+    if stale_ttl := cache_config.get("stale_ttl"):
+        kwargs["stale_ttl"] = int(stale_ttl)
+    return kwargs
+
+
+def cache_key_prefix(config: Config = config) -> str:
+    # we MUST have a prefix, else ".clear()" will drop ALL keys in redis (including those used for the queues).
+    return str(config.redis_cache_key_prefix).strip() or "NOPREFIX"
+
+
+def invalidation_channel(config: Config = config) -> Optional[str]:
+    """where result cache writers announce changes, None unless controllers keep a local cache"""
+    return config.redis_broadcast_q if config.redis_cache_local else None
+
+
+def response_task_id(result) -> Optional[str]:
+    """the task a route's response is about, if it's a task response that isn't from the cache"""
+    if isinstance(result, dict) and isinstance(result.get("data"), dict) and not result["data"].get("cached"):
+        return result["data"].get("task_id")
+    return None
+
+
+def cached_task_response(task_job) -> Dict:
+    """the response a cache hit returns for a finished task, the device output without any job lookup"""
+    def timestamp(value):
+        return None if value is None else str(value)
+
+    elapsed = None
+    if task_job.created_at and task_job.ended_at:
+        elapsed = (task_job.ended_at - task_job.created_at).seconds
+    return Response(status="success", data={
+        "task_id": task_job.get_id(),
+        "created_on": timestamp(task_job.created_at),
+        "task_queue": task_job.description,
+        "task_meta": {
+            "enqueued_at": timestamp(task_job.enqueued_at),
+            "started_at": timestamp(task_job.started_at),
+            "ended_at": timestamp(task_job.ended_at),
+            "enqueued_elapsed_seconds": task_job.meta.get("enqueued_elapsed_seconds"),
+            "total_elapsed_seconds": elapsed
+        },
+        "task_status": "finished",
+        "task_result": task_job.result,
+        "task_errors": task_job.meta.get("errors", []),
+        "cached": True
+    }).dict()
+
+
+def fifo_queue_name(fifo_q: str, priority=None) -> str:
+    """the fifo queue for a task priority, normal priority keeps the plain fifo queue"""
+    priority = getattr(priority, "value", priority)
+    if not priority or priority == "normal":
+        return fifo_q
+    return f"{fifo_q}_{priority}"
+
+
+def fifo_queue_names(fifo_q: str) -> List[str]:
+    """every fifo queue, in the order workers drain them"""
+    return [fifo_queue_name(fifo_q, priority) for priority in FIFO_PRIORITIES]
+
+
+class StaleableValue(NamedTuple):
+    """a cached value that's still served for a while after fresh_until, flagged as stale"""
+    value: object
+    fresh_until: float
+
+
+def cache_entry(stored) -> Tuple[object, bool]:
+    """returns (value, stale) for whatever the cache had stored"""
+    if isinstance(stored, StaleableValue):
+        return stored.value, time.time() >= stored.fresh_until
+    return stored, False
+
+
+def cache_key_host(cache_key: str) -> str:
+    """the host:port a cache key belongs to, its first two segments"""
+    return ":".join(cache_key.split(":")[:2])
+
+
+# sets the value and records its key in the host's index, which lives as long as the longest lived entry in it.
+# given the host's cache epoch as it was when the value was asked for, refuses the write if the host's cache
+# has been poisoned or the whole cache cleared since, KEYS[3] holds the epochs.
+# each write also drops a few members whose entries have expired, so a busy host's index doesn't keep every
+# key it ever had. like CLEAR_INDEX_SCRIPT this builds key names from ARGV[6], the cache key prefix
+INDEXED_SET_SCRIPT = """
+if ARGV[4] ~= '' then
+    local epochs = redis.call('HMGET', KEYS[3], ARGV[5], '*')
+    if (tonumber(epochs[1]) or 0) + (tonumber(epochs[2]) or 0) > tonumber(ARGV[4]) then
+        return 0
+    end
+end
+local ttl = tonumber(ARGV[3])
+if ttl > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+local existed = redis.call('EXISTS', KEYS[2])
+redis.call('SADD', KEYS[2], ARGV[2])
+for _, member in ipairs(redis.call('SRANDMEMBER', KEYS[2], 3)) do
+    if redis.call('EXISTS', ARGV[6] .. member) == 0 then
+        redis.call('SREM', KEYS[2], member)
+    end
+end
+if ttl <= 0 then
+    redis.call('PERSIST', KEYS[2])
+else
+    local current = redis.call('TTL', KEYS[2])
+    if existed == 0 or (current >= 0 and current < ttl) then
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+end
+return 1
+"""
+
+# deletes every key in an index and the index itself, ARGV[1] is prefixed to each member.
+# the keys it deletes aren't declared in KEYS, which only works against a single redis instance, not a cluster
+CLEAR_INDEX_SCRIPT = """
+local members = redis.call('SMEMBERS', KEYS[1])
+local deleted = 0
+for i = 1, #members, 1000 do
+    local batch = {}
+    for j = i, math.min(i + 999, #members) do
+        batch[#batch + 1] = ARGV[1] .. members[j]
+    end
+    deleted = deleted + redis.call('DEL', unpack(batch))
+end
+redis.call('DEL', KEYS[1])
+return deleted
+"""
+
+
 class ClearableCache(RedisCache):
+    """RedisCache which can clear every key of a host:port
+
+    each write also adds the key to a set per host:port, so clearing a host touches only its own keys
+    and nothing ever has to walk the keyspace with KEYS.
+    given a local cache, hits are served from process memory and every write or clear is broadcast
+    on invalidation_channel so other processes drop their copies.
+    values past the compressor's threshold are stored compressed and read back as they were.
+    a value set with a stale_ttl outlives its timeout by that long, get_entry hands it out flagged as stale
+    and claim_refresh lets exactly one caller refresh it until the next write.
+    clearing a host bumps its epoch, clearing everything bumps every host's, a value set with the epoch read
+    before it was fetched is dropped if its host was cleared in the meantime"""
+
+    def __init__(self, *args, local: LocalCache = None, invalidation_channel: str = None,
+                 index_prefix: str = None, compressor: Compressor = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.local = local
+        self.invalidation_channel = invalidation_channel
+        self.compressor = compressor or Compressor(config)
+        self.index_prefix = f"{index_prefix or config.redis_cache_index_prefix}:{self.key_prefix}:"
+        self.refresh_prefix = f"{config.redis_cache_refresh_prefix}:{self.key_prefix}:"
+        self.epochs_key = f"{config.redis_cache_epochs}:{self.key_prefix}"
+        self._indexed_set = self._client.register_script(INDEXED_SET_SCRIPT)
+        self._clear_index = self._client.register_script(CLEAR_INDEX_SCRIPT)
+
+    def index_key(self, host_port: str) -> str:
+        return f"{self.index_prefix}{host_port}"
+
+    def invalidate(self, keys: List[str] = (), pattern: str = None, flush: bool = False):
+        if self.local is not None:
+            if flush:
+                self.local.flush()
+            else:
+                self.local.drop(keys=keys, pattern=pattern)
+        if self.invalidation_channel:
+            message = cache_invalidate_message(keys=keys, pattern=pattern, flush=flush, prefix=self.key_prefix,
+                                               origin=self.local.origin if self.local is not None else None)
+            self._client.publish(self.invalidation_channel, message)
+
+    def refresh_key(self, key: str) -> str:
+        return f"{self.refresh_prefix}{key}"
+
+    def epoch(self, host_port: str) -> int:
+        """the cache epoch of host_port, pass it to set for a value fetched from now on"""
+        return sum(int(epoch or 0) for epoch in self._client.hmget(self.epochs_key, host_port, "*"))
+
+    def claim_refresh(self, key: str, ttl: int) -> bool:
+        """true for the first caller to find key stale, until it's written again or ttl seconds have passed"""
+        return bool(self._client.set(self.refresh_key(key), 1, nx=True, ex=max(int(ttl), 1)))
+
+    def get(self, key):
+        return self.get_entry(key)[0]
+
+    def get_entry(self, key) -> Tuple[object, bool]:
+        """returns (value, stale), value is None on a miss"""
+        return cache_entry(self.get_stored(key))
+
+    def get_stored(self, key):
+        if self.local is None:
+            return super().get(key)
+        found, value = self.local.get(key)
+        if found:
+            return value
+        self.local.ensure_listener()
+        generation = self.local.generation
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_prefix + key)
+            pipe.pttl(self.key_prefix + key)
+            raw, ttl_ms = pipe.execute()
+        value, size = self.load_sized(raw)
+        if raw is not None:
+            self.local.put(key, value, size, ttl_ms, generation)
+        return value
+
+    def load_sized(self, raw) -> Tuple[object, int]:
+        """load_object, plus the size to charge the local cache, compressed values count uncompressed"""
+        if raw is None or not raw.startswith(b"!"):
+            return self.load_object(raw), len(raw or b"")
+        try:
+            return loads_sized(raw[1:])
+        except pickle.PickleError:
+            return None, 0
+
+    def dump_sized(self, value, key: str = None) -> Tuple[bytes, Optional[Dict]]:
+        """dump_object in the same format as cachelib's, pickling value only once on the way to compressing it,
+        plus the compression metrics of value if it was compressed"""
+        if type(value) == int:
+            return super().dump_object(value), None
+        data, compression = self.compressor.dumps(value, key=key)
+        return b"!" + data, compression
+
+    def dump_object(self, value):
+        return self.dump_sized(value)[0]
+
+    def indexed_set_args(self, key, value, timeout=None, stale_ttl=None, epoch: int = None):
+        """keys and args of INDEXED_SET_SCRIPT, and the compression metrics of value if it was compressed"""
+        timeout = self._normalize_timeout(timeout)
+        if stale_ttl and timeout > 0:
+            value = StaleableValue(value, time.time() + timeout)
+            timeout += int(stale_ttl)
+        data, compression = self.dump_sized(value, key=key)
+        return ([self.key_prefix + key, self.index_key(cache_key_host(key)), self.epochs_key],
+                [data, key, timeout, "" if epoch is None else epoch, cache_key_host(key), self.key_prefix],
+                compression)
+
+    def set(self, key, value, timeout=None, stale_ttl=None, epoch: int = None):
+        """false if the write was refused because key's host was cleared after epoch"""
+        keys, args, compression = self.indexed_set_args(key, value, timeout, stale_ttl, epoch)
+        with self._client.pipeline(transaction=False) as pipe:
+            self._indexed_set(keys=keys, args=args, client=pipe)
+            pipe.delete(self.refresh_key(key))
+            self.compressor.record(pipe, compression, "cache")
+            result = bool(pipe.execute()[0])
+        self.invalidate(keys=[key])
+        return result
+
+    def set_many(self, mapping, timeout=None):
+        with self._client.pipeline(transaction=False) as pipe:
+            positions = []
+            for key, value in mapping.items():
+                keys, args, compression = self.indexed_set_args(key, value, timeout)
+                positions.append(len(pipe))
+                self._indexed_set(keys=keys, args=args, client=pipe)
+                self.compressor.record(pipe, compression, "cache")
+            statuses = pipe.execute()
+            result = [statuses[position] for position in positions]
+        self.invalidate(keys=list(mapping))
+        return result
+
+    def delete(self, key):
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.delete(self.key_prefix + key)
+            pipe.srem(self.index_key(cache_key_host(key)), key)
+            result = bool(pipe.execute()[0])
+        self.invalidate(keys=[key])
+        return result
+
+    def scan(self, cursor: int = 0, count: int = 100, key_pattern: str = ""):
+        """one page of cache keys, returns the cursor to continue from, 0 once every key has been seen"""
+        cursor, keys = self._client.scan(cursor=cursor, match=f"{self.key_prefix}{key_pattern}*", count=count)
+        return cursor, [key for key in keys if not key.decode().startswith(self.index_prefix)]
+
     def keys(self, key_pattern: str = ""):
-        prefix = f"{self.key_prefix}{key_pattern}*"
-        keys = self._client.keys(prefix)
+        keys = []
+        cursor = None
+        while cursor != 0:
+            cursor, page = self.scan(cursor=cursor or 0, count=1000, key_pattern=key_pattern)
+            keys.extend(page)
         return keys
 
+    def delete_matching(self, pattern: str, skip: str = None) -> int:
+        """deletes keys matching pattern a batch at a time, leaving those starting with skip"""
+        deleted = 0
+        batch = []
+        for key in self._client.scan_iter(match=pattern, count=1000):
+            if skip is None or not key.decode().startswith(skip):
+                batch.append(key)
+            if len(batch) >= 1000:
+                deleted += self._client.delete(*batch)
+                batch = []
+        if batch:
+            deleted += self._client.delete(*batch)
+        return deleted
+
+    def clear(self):
+        self._client.hincrby(self.epochs_key, "*", 1)
+        status = self.delete_matching(f"{self.key_prefix}*", skip=self.index_prefix)
+        self.delete_matching(f"{self.index_prefix}*")
+        self.invalidate(flush=True)
+        return status
+
     def clear_keys(self, key_pattern: str):
+        """clears every key of the host:port key_pattern"""
         if not key_pattern:
             raise ValueError(f"no key_pattern provided!")
 
-        status = False
-        keys = self.keys(key_pattern)
-        if keys:
-            status = self._client.delete(*keys)
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.epochs_key, cache_key_host(key_pattern), 1)
+            self._clear_index(keys=[self.index_key(key_pattern)], args=[self.key_prefix], client=pipe)
+            status = pipe.execute()[1]
+        self.invalidate(pattern=key_pattern)
 
         return status
 
@@ -48,10 +411,336 @@ class DisabledCache:
     def always_return_none(*args, **kwargs):
         return None
 
+    @staticmethod
+    def get_entry(key):
+        return None, False
+
     def __getattr__(self, item):
         return self.always_return_none
 
 
+class InflightEventHub(TaskEventHub):
+    """wakes requests joining one in flight once it's published or dropped, each message is a cache key or,
+    when a host's requests are dropped, the host:port: every one of its cache keys starts with
+
+    waiters are asyncio futures or, for requests served on a thread, threading events"""
+
+    def dispatch(self, data):
+        settled = data.decode() if isinstance(data, bytes) else str(data)
+        with self.lock:
+            settled_keys = [cache_key for cache_key in self.waiters if cache_key.startswith(settled)]
+            waiters = [waiter for cache_key in settled_keys for waiter in self.waiters.pop(cache_key)]
+        for waiter in waiters:
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                waiter.get_loop().call_soon_threadsafe(self._resolve, waiter, settled)
+
+    def register_event(self, cache_key: str) -> threading.Event:
+        event = threading.Event()
+        with self.lock:
+            self.waiters.setdefault(cache_key, set()).add(event)
+        return event
+
+
+class InflightRequests:
+    """singleflight for cacheable requests, the first request for a cache key claims it and publishes
+    its response, identical requests arriving meanwhile get that response instead of enqueueing again.
+
+    a response naming a task is only handed out until the task finishes, after that requests go back
+    to the cache. joining requests sleep until the first one announces it's published or given up,
+    at most max_joiners threads wait at once, requests past that run on their own"""
+
+    PENDING = b"pending"
+
+    def __init__(self, client: Redis, cache: RedisCache, key_prefix: str, wait: float, ttl: int,
+                 index_prefix: str = None, events_channel: str = None, max_joiners: int = None):
+        self._client = client
+        self.cache = cache
+        self.key_prefix = key_prefix
+        self.wait = wait
+        self.ttl = ttl
+        self.index_prefix = f"{index_prefix or config.redis_cache_index_prefix}:{key_prefix}:"
+        self._clear_index = client.register_script(CLEAR_INDEX_SCRIPT)
+        self.events_channel = events_channel or config.redis_inflight_events_q
+        self.events = InflightEventHub(client, self.events_channel)
+        self.joiners = threading.BoundedSemaphore(max_joiners or config.redis_cache_singleflight_max_joiners)
+
+    def key(self, cache_key: str) -> str:
+        return f"{self.key_prefix}:{cache_key}"
+
+    def index_key(self, host_port: str) -> str:
+        return f"{self.index_prefix}{host_port}"
+
+    def claim(self, cache_key: str) -> bool:
+        """true if this request should run, the claim lapses after wait seconds if it's never published"""
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(self.key(cache_key), self.PENDING, nx=True, ex=max(int(self.wait), 1))
+            # an in flight task can't outlive ttl, so neither can the index of its host
+            pipe.sadd(self.index_key(cache_key_host(cache_key)), cache_key)
+            pipe.expire(self.index_key(cache_key_host(cache_key)), self.ttl)
+            claimed, _, _ = pipe.execute()
+        return bool(claimed)
+
+    def publish_ttl(self, result) -> int:
+        # anything but a task is only worth sharing with requests that raced the first one
+        return self.ttl if response_task_id(result) else 1
+
+    def publish(self, cache_key: str, result):
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(self.key(cache_key), self.cache.dump_object(result), ex=self.publish_ttl(result))
+            pipe.publish(self.events_channel, cache_key)
+            pipe.execute()
+
+    def drop(self, cache_key: str):
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.delete(self.key(cache_key))
+            pipe.srem(self.index_key(cache_key_host(cache_key)), cache_key)
+            pipe.publish(self.events_channel, cache_key)
+            pipe.execute()
+
+    def lookup(self, cache_key: str):
+        """returns (pending, result) for the request in flight under cache_key"""
+        raw = self._client.get(self.key(cache_key))
+        if raw is None:
+            return False, None
+        if raw == self.PENDING:
+            return True, None
+        result = self.cache.load_object(raw)
+        if task_id := response_task_id(result):
+            status = self._client.hget(Job.key_for(task_id), "status")
+            if status is None or status.decode() in FINAL_TASK_STATES:
+                with self._client.pipeline(transaction=False) as pipe:
+                    pipe.delete(self.key(cache_key))
+                    pipe.srem(self.index_key(cache_key_host(cache_key)), cache_key)
+                    pipe.execute()
+                return False, None
+        return False, result
+
+    def join(self, cache_key: str):
+        """waits for the request in flight under cache_key to publish, None if there's nothing to join"""
+        if not self.joiners.acquire(blocking=False):
+            log.info(f"too many requests joining others in flight, {cache_key} runs on its own")
+            return None
+        try:
+            if not self.events.ensure_listener():
+                log.warning(f"inflight event listener isn't subscribed yet, {cache_key} may wait the full {self.wait}s")
+            # register before the first lookup so a publish between the two can't be missed
+            settled = self.events.register_event(cache_key)
+            try:
+                pending, result = self.lookup(cache_key)
+                if pending:
+                    settled.wait(self.wait)
+                    pending, result = self.lookup(cache_key)
+                return result
+            finally:
+                self.events.unregister(cache_key, settled)
+        finally:
+            self.joiners.release()
+
+    def clear_keys(self, key_pattern: str):
+        """drops every request in flight for the host:port key_pattern"""
+        self._clear_index(keys=[self.index_key(key_pattern)], args=[f"{self.key_prefix}:"])
+        self._client.publish(self.events_channel, f"{key_pattern}:")
+
+
+# seconds between flushes of the hits counted in process, how much scores shrink per warm run,
+# the score below which a key stops being tracked and how many keys are tracked at most
+HIT_FLUSH_INTERVAL = 5
+HIT_DECAY = 0.5
+HIT_MIN_SCORE = 0.5
+TRACKED_KEYS = 1000
+
+
+class CacheWarmer:
+    """refreshes the most requested cache entries, and any pinned ones, shortly before they expire
+
+    hits are counted in process and flushed to a sorted set every few seconds, scores halve on every warm run
+    so keys nobody asks for anymore drop out of the top n. a key can only be warmed once a task for it has been
+    enqueued by a cacheable route or it was pinned, that's what records the task to rerun. those tasks are
+    buffered and flushed alongside the hits, each is stored under its own key holding the request's credentials
+    for only as long as its cache entry could need warming"""
+
+    def __init__(self, reds: "Rediz", config: Config = config):
+        self.reds = reds
+        self._client = reds.base_connection
+        self.hits_key = f"{config.redis_cache_warm_store}:hits"
+        self.payloads_prefix = f"{config.redis_cache_warm_store}:payload:"
+        self.pinned_key = f"{config.redis_cache_warm_store}:pinned"
+        self.decay_key = f"{config.redis_cache_warm_store}:decayed"
+        self.top_n = config.redis_cache_warm_top_n
+        self.interval = config.redis_cache_warm_interval
+        self.lead = config.redis_cache_warm_lead
+        self.refresh_ttl = config.redis_task_timeout
+        self.result_ttl = config.redis_task_result_ttl
+        self.hits = Counter()
+        self.payloads = {}
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def payload_key(self, cache_key: str) -> str:
+        return f"{self.payloads_prefix}{cache_key}"
+
+    def start_flusher(self):
+        """starts the flush thread if required, the lock must be held"""
+        if self.flusher is None or not self.flusher.is_alive():
+            self.flusher = threading.Thread(target=self.flush_forever, name="cache_warm_hits", daemon=True)
+            self.flusher.start()
+
+    def record_hit(self, cache_key: str):
+        with self.lock:
+            self.hits[cache_key] += 1
+            self.start_flusher()
+
+    def flush_forever(self):
+        while True:
+            time.sleep(HIT_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"cache warmer: failed to flush hits: {e}")
+
+    def flush(self):
+        self.flush_hits()
+        self.flush_payloads()
+
+    def flush_hits(self):
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+        if not hits:
+            return
+        with self._client.pipeline(transaction=False) as pipe:
+            for cache_key, count in hits.items():
+                pipe.zincrby(self.hits_key, count, cache_key)
+            pipe.execute()
+
+    def flush_payloads(self):
+        with self.lock:
+            payloads, self.payloads = self.payloads, {}
+        if not payloads:
+            return
+        with self._client.pipeline(transaction=False) as pipe:
+            for cache_key, payload in payloads.items():
+                self.write_payload(pipe, cache_key, payload)
+            pipe.execute()
+
+    def payload_ttl(self, payload: Dict) -> int:
+        """seconds a payload is kept, until its cache entry has gone stale and the next warm run has passed"""
+        ttl = min(int(payload["ttl"] or self.reds.cache_timeout), int(self.result_ttl))
+        return ttl + int(payload["stale_ttl"] or 0) + int(self.interval) + int(self.lead)
+
+    def write_payload(self, pipe, cache_key: str, payload: Dict):
+        pipe.set(self.payload_key(cache_key), pickle.dumps(payload), ex=self.payload_ttl(payload))
+
+    @staticmethod
+    def payload(method: str, kwargs: dict, target: dict) -> Dict:
+        return {
+            "method": method,
+            "kwargs": kwargs,
+            "ttl": target.get("cache_ttl"),
+            "stale_ttl": target.get("cache_stale_ttl")
+        }
+
+    def remember(self, cache_key: str, method: str, kwargs: dict, target: dict):
+        """records the task that refreshes cache_key, it's written out with the next flush"""
+        with self.lock:
+            self.payloads[cache_key] = self.payload(method, kwargs, target)
+            self.start_flusher()
+
+    def pin(self, cache_key: str, method: str, kwargs: dict, cache_config: dict):
+        """keeps cache_key warm whether or not anything requests it"""
+        with self._client.pipeline(transaction=False) as pipe:
+            self.write_payload(pipe, cache_key, self.payload(method, kwargs, cache_target_for(cache_key, cache_config)))
+            pipe.sadd(self.pinned_key, cache_key)
+            pipe.execute()
+
+    def unpin(self, cache_key: str) -> bool:
+        return bool(self._client.srem(self.pinned_key, cache_key))
+
+    def status(self) -> Dict:
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.smembers(self.pinned_key)
+            pipe.zrevrange(self.hits_key, 0, self.top_n - 1, withscores=True)
+            pinned, top = pipe.execute()
+        return {
+            "pinned": sorted(key.decode() for key in pinned),
+            "top": [{"cache_key": key.decode(), "score": score} for key, score in top],
+            "interval": self.interval
+        }
+
+    def candidates(self) -> List[str]:
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.smembers(self.pinned_key)
+            pipe.zrevrange(self.hits_key, 0, self.top_n - 1)
+            pinned, top = pipe.execute()
+        return list(dict.fromkeys(key.decode() for key in [*pinned, *top]))
+
+    def decay(self):
+        """shrinks every score once per interval however many controllers run the warmer"""
+        if not self._client.set(self.decay_key, 1, nx=True, ex=max(int(self.interval) - 1, 1)):
+            return
+        with self._client.pipeline(transaction=False) as pipe:
+            pipe.zrange(self.hits_key, 0, -1)
+            pipe.zunionstore(self.hits_key, {self.hits_key: HIT_DECAY})
+            pipe.zremrangebyscore(self.hits_key, "-inf", f"({HIT_MIN_SCORE}")
+            pipe.zremrangebyrank(self.hits_key, 0, -TRACKED_KEYS - 1)
+            pipe.zrange(self.hits_key, 0, -1)
+            pipe.smembers(self.pinned_key)
+            was_tracked, *_, tracked, pinned = pipe.execute()
+        forgotten = set(was_tracked) - set(tracked) - set(pinned)
+        if forgotten:
+            self._client.delete(*[self.payload_key(cache_key.decode()) for cache_key in forgotten])
+
+    def plan(self, now: float = None) -> List[Tuple[float, str]]:
+        """returns (when, cache_key) for every candidate that goes stale before the next run could catch it.
+        each is warmed lead seconds before it would go stale, or earlier to spread them over the interval"""
+        now = time.time() if now is None else now
+        self.flush()
+        self.decay()
+        candidates = self.candidates()
+        if not candidates:
+            return []
+        with self._client.pipeline(transaction=False) as pipe:
+            for cache_key in candidates:
+                pipe.pttl(self.reds.cache.key_prefix + cache_key)
+                pipe.get(self.payload_key(cache_key))
+            results = pipe.execute()
+        due = []
+        for cache_key, ttl_ms, payload in zip(candidates, results[0::2], results[1::2]):
+            if payload is None or ttl_ms == -1:
+                continue  # nothing recorded to refresh it with, or it never expires
+            # seconds until it goes stale, entries kept past their ttl hold a stale window on top
+            fresh_for = max(ttl_ms, 0) / 1000
+            if ttl_ms >= 0:
+                fresh_for -= int(pickle.loads(payload)["stale_ttl"] or 0)
+            if fresh_for > self.interval + self.lead:
+                continue
+            due.append((max(fresh_for - self.lead, 0), cache_key))
+        due.sort()
+        spacing = self.interval / max(len(due), 1)
+        return [(now + min(deadline, position * spacing), cache_key)
+                for position, (deadline, cache_key) in enumerate(due)]
+
+    def warm(self, cache_key: str) -> Optional[Dict]:
+        """enqueues the task that refreshes cache_key unless something already is refreshing it"""
+        payload = self._client.get(self.payload_key(cache_key))
+        if payload is None:
+            return None
+        payload = pickle.loads(payload)
+        if not self.reds.cache.claim_refresh(cache_key, self.refresh_ttl):
+            return None
+        token = cache_target.set(cache_target_for(cache_key, {"ttl": payload["ttl"],
+                                                              "stale_ttl": payload["stale_ttl"]}))
+        try:
+            return self.reds.execute_task(method=payload["method"], kwargs=payload["kwargs"])
+        except Exception as e:
+            # the refresh claim lapses on its own
+            log.error(f"cache warmer: failed to warm {cache_key}: {e}")
+            return None
+        finally:
+            cache_target.reset(token)
+
+
 class ExtnUpdateLog:
     """Class for managing the Extensibles Update Log"""
 
@@ -120,6 +809,107 @@ class ExtnUpdateLog:
         raise TypeError(f"indices must be integers or slices, not {type(index)}.")
 
 
+class PinnedCapacityStore:
+    """Tracks pinned worker capacity per container
+
+    container definitions live in a hash keyed by hostname, free process slots live in a sorted set
+    so the least loaded container can be reserved atomically in a single round trip"""
+
+    # pops one slot from the container with the most free capacity, returns its definition or nil
+    RESERVE_SCRIPT = """
+    local best = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if #best == 0 or tonumber(best[2]) < 1 then
+        return false
+    end
+    redis.call('ZINCRBY', KEYS[1], -1, best[1])
+    return redis.call('HGET', KEYS[2], best[1])
+    """
+
+    # gives a slot back to a container without ever exceeding its limit
+    RELEASE_SCRIPT = """
+    local container = redis.call('HGET', KEYS[2], ARGV[1])
+    if not container then
+        return false
+    end
+    local limit = tonumber(cjson.decode(container)['limit'])
+    local free = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or limit)
+    if free >= limit then
+        return false
+    end
+    return redis.call('ZINCRBY', KEYS[1], 1, ARGV[1])
+    """
+
+    def __init__(self, base_connection: Redis, store_name: str):
+        self.base_connection = base_connection
+        self.store_name = store_name
+        self.capacity_name = f"{store_name}_capacity"
+        self._reserve = base_connection.register_script(self.RESERVE_SCRIPT)
+        self._release = base_connection.register_script(self.RELEASE_SCRIPT)
+        self.migrate()
+
+    def migrate(self):
+        """converts a legacy json list pinned store into the hash + sorted set layout in place"""
+        def _migrate(pipe):
+            if pipe.type(self.store_name) != b"string":
+                return
+            legacy_store = json.loads(pipe.get(self.store_name))
+            pipe.multi()
+            pipe.delete(self.store_name)
+            for container in legacy_store:
+                self._register(pipe, container, free=container["limit"] - container["count"])
+            log.info(f"migrated {len(legacy_store)} containers from legacy pinned store")
+
+        self.base_connection.transaction(_migrate, self.store_name)
+
+    def _register(self, pipe, container: Dict, free: int):
+        definition = {
+            "hostname": container["hostname"],
+            "limit": container["limit"],
+            "pinned_listen_queue": container["pinned_listen_queue"]
+        }
+        pipe.hset(self.store_name, container["hostname"], json.dumps(definition))
+        pipe.zadd(self.capacity_name, {container["hostname"]: max(free, 0)})
+
+    def register(self, container: Dict):
+        """adds or resets a container, all of its slots start out free"""
+        with self.base_connection.pipeline() as pipe:
+            self._register(pipe, container, free=container["limit"] - container.get("count", 0))
+            pipe.execute()
+
+    def remove(self, hostname: str):
+        """removes a container and its capacity"""
+        with self.base_connection.pipeline() as pipe:
+            pipe.hdel(self.store_name, hostname)
+            pipe.zrem(self.capacity_name, hostname)
+            return any(pipe.execute())
+
+    def reserve(self) -> Union[Dict, None]:
+        """reserves one process slot on the least loaded container"""
+        container = self._reserve(keys=[self.capacity_name, self.store_name])
+        if not container:
+            return None
+        return json.loads(container)
+
+    def release(self, hostname: str):
+        """frees one process slot on a container"""
+        return self._release(keys=[self.capacity_name, self.store_name], args=[hostname])
+
+    def all(self) -> List[Dict]:
+        """returns every container along with its current process count"""
+        with self.base_connection.pipeline() as pipe:
+            pipe.hgetall(self.store_name)
+            pipe.zrange(self.capacity_name, 0, -1, withscores=True)
+            containers, capacity = pipe.execute()
+        free_slots = {hostname.decode(): int(free) for hostname, free in capacity}
+        result = []
+        for hostname, definition in sorted(containers.items()):
+            container = json.loads(definition)
+            free = free_slots.get(container["hostname"], container["limit"])
+            container["count"] = container["limit"] - free
+            result.append(container)
+        return result
+
+
 class Rediz:
     cache: ClearableCache  # type hint for IDE's pleasure only
 
@@ -134,77 +924,100 @@ class Rediz:
         self.task_result_ttl = config.redis_task_result_ttl
         self.routes = routes.routes
         self.core_q = config.redis_core_q
-        # config check if TLS required
-        if config.redis_tls_enabled:
-            self.base_connection = Redis(
-                                        host=self.server,
-                                        port=self.port,
-                                        password=self.key,
-                                        ssl=True,
-                                        ssl_cert_reqs='required',
-                                        ssl_keyfile=config.redis_tls_key_file,
-                                        ssl_certfile=config.redis_tls_cert_file,
-                                        ssl_ca_certs=config.redis_tls_ca_cert_file,
-                                        socket_connect_timeout=config.redis_socket_connect_timeout,
-                                        socket_keepalive=config.redis_socket_keepalive
-                                        )
-        else:
-            self.base_connection = Redis(
-                                        host=self.server,
-                                        port=self.port,
-                                        password=self.key,
-                                        socket_connect_timeout=config.redis_socket_connect_timeout,
-                                        socket_keepalive=config.redis_socket_keepalive
-                                        )
+        self.config = config
+        self.base_connection = redis_connection(config)
 #        self.base_q = Queue(self.core_q, connection=self.base_connection)
         self.networked_queuedb = config.redis_queue_store
         self.redis_pinned_store = config.redis_pinned_store
+        self.redis_fifo_autoscaler_store = config.redis_fifo_autoscaler_store
 
         self.local_queuedb = {}
-        self.local_queuedb[config.redis_fifo_q] = {}
-        self.local_queuedb[config.redis_fifo_q]["queue"] = Queue(config.redis_fifo_q, connection=self.base_connection)
+        # queue name -> monotonic time until which its worker is assumed alive
+        self.worker_liveness_memo = {}
+        self.worker_liveness_memo_ttl = config.worker_liveness_cache_ttl
+        for fifo_q in fifo_queue_names(config.redis_fifo_q):
+            self.local_queuedb[fifo_q] = {}
+            self.local_queuedb[fifo_q]["queue"] = Queue(fifo_q, connection=self.base_connection)
 
-        # init networked db for processes queues
-        net_db_exists = self.base_connection.get(self.networked_queuedb)
-        if not net_db_exists:
-            null_network_db = json.dumps({"netpalm-db": "queue-val"})
-            self.base_connection.set(self.networked_queuedb, null_network_db)
+        # init networked db for processes queues, the hash is created on first write
+        self.migrate_network_queue_db()
 
         # init pinned db
-        pinned_db_exists = self.base_connection.get(self.redis_pinned_store)
-        if not pinned_db_exists:
-            null_pinned_db = json.dumps([])
-            self.base_connection.set(self.redis_pinned_store, null_pinned_db)
+        self.pinned_store = PinnedCapacityStore(self.base_connection, self.redis_pinned_store)
+
+        # only read here, to list the tasks fifo workers parked on busy devices
+        self.device_semaphore = None
+        if config.fifo_device_max_sessions > 0:
+            self.device_semaphore = DeviceSemaphore(self.base_connection, config)
 
         self.cache_enabled = config.redis_cache_enabled
         self.cache_timeout = config.redis_cache_default_timeout
-        # we MUST have a prefix, else ".clear()" will drop ALL keys in redis (including those used for the queues).
-        self.key_prefix = str(config.redis_cache_key_prefix).strip()
-        if not self.key_prefix:
-            self.key_prefix = "NOPREFIX"
+        self.key_prefix = cache_key_prefix(config)
+        self.compressor = Compressor(config)
         if self.cache_enabled:
             log.info(f"Enabling cache!")
+            self.local_cache = None
+            if config.redis_cache_local:
+                self.local_cache = local_cache_for(self.base_connection, config, self.key_prefix)
             self.cache = ClearableCache(self.base_connection, default_timeout=self.cache_timeout,
-                                        key_prefix=self.key_prefix)
+                                        key_prefix=self.key_prefix, local=self.local_cache,
+                                        invalidation_channel=invalidation_channel(config),
+                                        index_prefix=config.redis_cache_index_prefix,
+                                        compressor=self.compressor)
+            self.cache_warmer = None
+            if config.redis_cache_warm_enabled:
+                self.cache_warmer = CacheWarmer(self, config)
+            self.inflight = None
+            if config.redis_cache_singleflight:
+                self.inflight = InflightRequests(self.base_connection, self.cache, config.redis_inflight_key_prefix,
+                                                 index_prefix=config.redis_cache_index_prefix,
+                                                 wait=config.redis_cache_singleflight_wait,
+                                                 ttl=self.ttl + self.timeout,
+                                                 events_channel=config.redis_inflight_events_q,
+                                                 max_joiners=config.redis_cache_singleflight_max_joiners)
         else:
             log.info(f"Disabling cache!")
             # noinspection PyTypeChecker
             self.cache = DisabledCache()
+            self.local_cache = None
+            self.cache_warmer = None
+            self.inflight = None
         self.extn_update_log = ExtnUpdateLog(self.base_connection, config.redis_update_log)
+        # only subscribes once something waits on a task
+        self.task_events = TaskEventHub(self.base_connection, config.redis_task_events_q)
+
+    def migrate_network_queue_db(self):
+        """converts a legacy json blob networked queue db into a redis hash in place"""
+        def _migrate(pipe):
+            if pipe.type(self.networked_queuedb) != b"string":
+                return None
+            legacy_db = json.loads(pipe.get(self.networked_queuedb))
+            # only real queues were stored as True, this skips the "netpalm-db" placeholder
+            queues = {qn: 1 for qn, val in legacy_db.items() if val is True}
+            pipe.multi()
+            pipe.delete(self.networked_queuedb)
+            if queues:
+                pipe.hset(self.networked_queuedb, mapping=queues)
+            return len(queues)
+
+        # the callback is rerun whenever the watched key changes, so only the attempt that committed is logged
+        migrated = self.base_connection.transaction(_migrate, self.networked_queuedb, value_from_callable=True)
+        if migrated is not None:
+            log.info(f"migrated {migrated} queues from legacy networked queue db")
 
     def append_network_queue_db(self, qn):
         """appends to the networked queue db"""
-        result = self.base_connection.get(self.networked_queuedb)
-        tmpdb = json.loads(result)
-        tmpdb[qn] = True
-        jsresult = json.dumps(tmpdb)
-        self.base_connection.set(self.networked_queuedb, jsresult)
-
-    def append_local_queue_db(self, qn):
-        """appends to the local queue db"""
+        self.base_connection.hset(self.networked_queuedb, qn, 1)
+
+    def append_local_queue_db(self, qn, pinned=True):
+        """appends to the local queue db, pinned queues are the ones served by a single pinned worker"""
         self.local_queuedb[qn] = {}
-        self.local_queuedb[qn]["queue"] = Queue(qn, connection=self.base_connection)
-        return self.local_queuedb[qn]["queue"]
+        if pinned:
+            queue = PinnedQueue(qn, connection=self.base_connection, queue_store=self.networked_queuedb)
+        else:
+            queue = Queue(qn, connection=self.base_connection)
+        self.local_queuedb[qn]["queue"] = queue
+        return queue
 
     def exists_in_local_queue_db(self, qn):
         q_exists_in_local_db = self.local_queuedb.get(qn, False)
@@ -213,9 +1026,11 @@ class Rediz:
     def worker_is_alive(self, q):
         """checks if a worker exists on a given queue"""
         try:
-            queue = Queue(q, connection=self.base_connection)
-            workers = Worker.all(queue=queue)
-            if len(workers) >= 1:
+            now = time.monotonic()
+            if self.worker_liveness_memo.get(q, 0) > now:
+                return True
+            if self.base_connection.exists(worker_liveness_key(q, self.config)) or self.worker_is_registered(q):
+                self.worker_liveness_memo[q] = now + self.worker_liveness_memo_ttl
                 return True
             else:
                 log.info(f"worker required for {q}")
@@ -224,6 +1039,12 @@ class Rediz:
             log.error(f"worker_is_alive: {e}")
             return False
 
+    def worker_is_registered(self, q):
+        """slow path for workers that don't maintain the liveness index, loads every worker on the queue"""
+        queue = Queue(q, connection=self.base_connection)
+        workers = Worker.all(queue=queue)
+        return len(workers) >= 1
+
     def getqueue(self, host):
         """
             checks whether a queue exists and worker exists
@@ -233,9 +1054,7 @@ class Rediz:
         # checks a centralised db / queue exists and creates a empty db if one does not exist
         try:
             # check the redis db store for a queue
-            result = self.base_connection.get(self.networked_queuedb)
-            jsresult = json.loads(result)
-            res = jsresult.get(host, False)
+            res = self.base_connection.hexists(self.networked_queuedb, host)
             # if exists on the networked db, check whether you have a local connection
             if res:
                 if not self.worker_is_alive(host):
@@ -282,30 +1101,29 @@ class Rediz:
         """routes a process to the correct container."""
         qexists = self.getqueue(hst)
         if not qexists:
-            # check for process availability:
-            pinned_hosts = self.fetch_pinned_store()
-            capacity = False
-            # find first available container with process capacity
-            for host in pinned_hosts:
-                if host["count"] < host["limit"]:
-                    # create in the local db if required
-                    if not self.exists_in_local_queue_db(qn=host["pinned_listen_queue"]):
-                        self.append_local_queue_db(qn=host["pinned_listen_queue"])
-                    self.create_queue_worker(
-                                            pinned_container_queue=host["pinned_listen_queue"],
-                                            pinned_worker_qname=hst
-                                            )
-                    capacity = True
-                    break
+            # atomically reserve a process on the least loaded container
+            host = self.pinned_store.reserve()
             # throw exception if no capcity found
-            if not capacity:
+            if not host:
                 err = """Not enough pinned worker process capacity: kill pinned
                  processes or spin up more pinned workers!"""
                 log.error(err)
                 raise Exception(f"{err}")
-
-    def render_task_response(self, task_job):
-        """formats and returns the task rpc jobs result"""
+            # create in the local db if required
+            if not self.exists_in_local_queue_db(qn=host["pinned_listen_queue"]):
+                self.append_local_queue_db(qn=host["pinned_listen_queue"], pinned=False)
+            r = self.create_queue_worker(
+                                    pinned_container_queue=host["pinned_listen_queue"],
+                                    pinned_worker_qname=hst
+                                    )
+            if isinstance(r, Exception):
+                self.pinned_store.release(host["hostname"])
+                raise r
+
+    def render_task_response(self, task_job, read_only=False):
+        """formats and returns the task rpc jobs result
+
+        read_only skips persisting the elapsed time meta and re-reading the job status from redis"""
         created_at = str(task_job.created_at)
         enqueued_at = str(task_job.enqueued_at)
         started_at = str(task_job.started_at)
@@ -320,16 +1138,16 @@ class Rediz:
             if enqueued_at != "None" and enqueued_at and started_at == "None":
                 parsed_time = datetime.datetime.strptime(enqueued_at, "%Y-%m-%d %H:%M:%S.%f")
                 task_job.meta["enqueued_elapsed_seconds"] = (current_time - parsed_time).seconds
-                task_job.save()
 
             # if created but not finished calculate time
             if ended_at != "None" and ended_at:
                 parsed_time = datetime.datetime.strptime(ended_at, "%Y-%m-%d %H:%M:%S.%f")
                 task_job.meta["total_elapsed_seconds"] = (parsed_time - created_parsed_time).seconds
-                task_job.save()
 
             elif ended_at == "None":
                 task_job.meta["total_elapsed_seconds"] = (current_time - created_parsed_time).seconds
+
+            if not read_only:
                 task_job.save()
 
             # clean up vars for response
@@ -342,6 +1160,12 @@ class Rediz:
             log.error(f"render_task_response : {str(e)}")
             pass
 
+        status = task_job.get_status(refresh=not read_only)
+        if read_only and status != "finished":
+            task_result = None  # avoids a round trip for a result that can't exist yet
+        else:
+            task_result = task_job.result
+
         resultdata = None
         resultdata = Response(status="success", data={
             "task_id": task_job.get_id(),
@@ -354,20 +1178,47 @@ class Rediz:
                 "enqueued_elapsed_seconds": task_job.meta["enqueued_elapsed_seconds"],
                 "total_elapsed_seconds": task_job.meta["total_elapsed_seconds"]
             },
-            "task_status": task_job.get_status(),
-            "task_result": task_job.result,
+            "task_status": status,
+            "task_result": task_result,
             "task_errors": task_job.meta["errors"]
         }).dict()
         return resultdata
 
-    def sendtask(self, q, exe, **kwargs):
-        meta_template = self.get_redis_meta_template()
-        task = self.local_queuedb[q]["queue"].enqueue_call(func=self.routes[exe], description=q, ttl=self.ttl,
-                                                           result_ttl=self.task_result_ttl, kwargs=kwargs["kwargs"],
-                                                           meta=meta_template, timeout=self.timeout)
+    def sendtask(self, q, exe, at_front=False, **kwargs):
+        target = cache_target.get()
+        if target:
+            # results fetched from here on may be cached until the host is next poisoned
+            target = {**target, "cache_epoch": self.cache.epoch(cache_key_host(target["cache_key"]))}
+        meta_template = {**self.get_redis_meta_template(), **(target or {})}
+        if target and self.cache_warmer is not None:
+            self.cache_warmer.remember(target["cache_key"], exe, kwargs["kwargs"], target)
+        queue = self.local_queuedb[q]["queue"]
+        with self.base_connection.pipeline() as pipe:
+            task = queue.enqueue_call(func=self.routes[exe], description=q, ttl=self.ttl,
+                                      result_ttl=self.task_result_ttl, kwargs=kwargs["kwargs"], meta=meta_template,
+                                      timeout=self.timeout, at_front=at_front, pipeline=pipe)
+            # pushing the job is the last thing enqueueing does
+            pushed = pipe.execute()[-1]
+        if isinstance(queue, PinnedQueue) and not pushed:
+            self.adopt_released_queue(q)
+        self.publish_task_event(task.id, "queued", q, host=task_host(kwargs["kwargs"]))
         resultdata = self.render_task_response(task)
         return resultdata
 
+    def adopt_released_queue(self, q):
+        """starts a worker for a pinned queue whose last one gave it up as idle just before jobs were pushed onto it"""
+        log.info(f"adopt_released_queue: {q} was released as its job arrived, re-routing it")
+        self.worker_liveness_memo.pop(q, None)
+        self.reoute_and_create_q_worker(hst=q)
+
+    def publish_task_event(self, task_id, task_status, q, host=None, pipeline=None):
+        """announces a task state change to anything streaming task events"""
+        connection = pipeline if pipeline is not None else self.base_connection
+        try:
+            connection.publish(config.redis_task_events_q, task_event_message(task_id, task_status, q, host=host))
+        except Exception as e:
+            log.error(f"publish_task_event: failed to publish event for {task_id}: {e}")
+
     def execute_task(self, method, **kwargs):
         """main entry point for rpc tasks"""
         kw = kwargs.get("kwargs", False)
@@ -376,13 +1227,79 @@ class Rediz:
         if connectionargs:
             host = kw["connection_args"].get("host", False)
         queue_strategy = kw.get("queue_strategy", False)
+        priority = kw.get("priority")
         if queue_strategy == "pinned":
             self.reoute_and_create_q_worker(hst=host)
-            r = self.sendtask(q=host, exe=method, kwargs=kw)
+            # a pinned queue serves a single device, high priority tasks just jump it
+            r = self.sendtask(q=host, exe=method, kwargs=kw, at_front=priority == "high")
         else:
-            r = self.sendtask(q=config.redis_fifo_q, exe=method, kwargs=kw)
+            r = self.sendtask(q=fifo_queue_name(self.config.redis_fifo_q, priority), exe=method, kwargs=kw)
         return r
 
+    def execute_bulk_task(self, method, kwargs_list: List[Dict]):
+        """enqueues many rpc tasks through a single redis pipeline and records them as a batch"""
+        missing = [index for index, kw in enumerate(kwargs_list)
+                   if kw.get("queue_strategy", False) == "pinned" and not kw["connection_args"].get("host")]
+        if missing:
+            raise ValueError(f"pinned tasks need connection_args.host, missing from entries {missing}")
+        batch_id = str(uuid.uuid4())
+        jobs_by_queue = {}
+        task_ids = []
+        events = []
+        for kw in kwargs_list:
+            priority = kw.get("priority")
+            q = fifo_queue_name(self.config.redis_fifo_q, priority)
+            at_front = False
+            if kw.get("queue_strategy", False) == "pinned":
+                q = kw["connection_args"]["host"]
+                at_front = priority == "high"
+                if q not in jobs_by_queue:
+                    self.reoute_and_create_q_worker(hst=q)
+            # ids are assigned up front so the response keeps the order of the request
+            task_id = str(uuid.uuid4())
+            task_ids.append(task_id)
+            events.append((task_id, q, task_host(kw)))
+            jobs_by_queue.setdefault(q, []).append(Queue.prepare_data(
+                func=self.routes[method], kwargs=kw, description=q, ttl=self.ttl, result_ttl=self.task_result_ttl,
+                timeout=self.timeout, job_id=task_id, meta=self.get_redis_meta_template(), at_front=at_front
+            ))
+
+        batch_key = f"{self.config.redis_batch_store}:{batch_id}"
+        pushes = {}
+        with self.base_connection.pipeline() as pipe:
+            for q, job_datas in jobs_by_queue.items():
+                queue = self.local_queuedb[q]["queue"]
+                queue.enqueue_many(job_datas, pipeline=pipe)
+                if isinstance(queue, PinnedQueue):
+                    # where the result of the queue's last push lands, the pipeline runs as one transaction
+                    pushes[q] = len(pipe) - 1
+            if task_ids:
+                pipe.rpush(batch_key, *task_ids)
+                pipe.expire(batch_key, self.ttl + self.timeout + self.task_result_ttl)
+            for task_id, q, host in events:
+                self.publish_task_event(task_id, "queued", q, host=host, pipeline=pipe)
+            results = pipe.execute()
+        for q, index in pushes.items():
+            if not results[index]:
+                self.adopt_released_queue(q)
+
+        resultdata = BulkResponse(status="success", data={
+            "batch_id": batch_id,
+            "task_ids": task_ids
+        }).dict()
+        return resultdata
+
+    def fetch_batch(self, batch_id):
+        """returns the task ids enqueued as part of a batch"""
+        task_ids = self.base_connection.lrange(f"{self.config.redis_batch_store}:{batch_id}", 0, -1)
+        if not task_ids:
+            return False
+        resultdata = BulkResponse(status="success", data={
+            "batch_id": batch_id,
+            "task_ids": [task_id.decode() for task_id in task_ids]
+        }).dict()
+        return resultdata
+
     def execute_service_task(self, metho, **kwargs):
         """service wrapper for execute task method"""
         log.info(kwargs)
@@ -432,6 +1349,39 @@ class Rediz:
         except Exception as e:
             return e
 
+    def render_task_status(self, task_job, include_result=False):
+        """formats a compact status record for a job, never touches redis"""
+        status = task_job.get_status(refresh=False)
+        record = TaskStatusRecord(
+            task_id=task_job.get_id(),
+            task_queue=task_job.description,
+            task_status=status,
+            enqueued_at=task_job.enqueued_at and str(task_job.enqueued_at),
+            started_at=task_job.started_at and str(task_job.started_at),
+            ended_at=task_job.ended_at and str(task_job.ended_at),
+            task_errors=task_job.meta.get("errors", []),
+            # results are only loaded for finished jobs so unfinished ones don't cost another round trip
+            task_result=task_job.result if include_result and status == "finished" else None
+        )
+        return record.dict()
+
+    def fetch_task_statuses(self, task_ids: List[str], include_result=False):
+        """gets the status of many jobs with a single pipelined lookup"""
+        log.info(f"fetching status of {len(task_ids)} tasks")
+        jobs = Job.fetch_many(task_ids, connection=self.base_connection)
+        tasks = []
+        missing = []
+        for task_id, task_job in zip(task_ids, jobs):
+            if task_job is None:
+                missing.append(task_id)
+                continue
+            tasks.append(self.render_task_status(task_job, include_result=include_result))
+        resultdata = TaskStatusResponse(status="success", data={
+            "tasks": tasks,
+            "missing": missing
+        }).dict()
+        return resultdata
+
     def getjoblist(self, q):
         """provides a list of all jobs in the queue"""
         try:
@@ -462,47 +1412,88 @@ class Rediz:
                 }
                 for i in self.local_queuedb:
                     response_object["data"]["task_id"].append(self.local_queuedb[i]["queue"].get_job_ids())
+                response_object["data"]["queue_depth"] = self.fifo_queue_depths()
+                if self.device_semaphore is not None:
+                    response_object["data"]["deferred_depth"] = self.device_semaphore.deferred_depths()
                 return response_object
         except Exception as e:
             return e
 
-    def getjobliststatus(self, q):
-        """provides a breakdown of all jobs in the queue"""
+    def fifo_queue_depths(self) -> Dict[str, int]:
+        """number of tasks waiting in the fifo queue of each priority"""
+        with self.base_connection.pipeline() as pipe:
+            for fifo_q in fifo_queue_names(self.config.redis_fifo_q):
+                pipe.llen(self.local_queuedb[fifo_q]["queue"].key)
+            return dict(zip(FIFO_PRIORITIES, pipe.execute()))
+
+    def getjobliststatus(self, q, statuses: List[str] = None, cursor: int = 0, limit: int = 100):
+        """provides a paginated breakdown of jobs in the queue without writing to redis
+
+        jobs are listed queued, deferred, started, finished then failed, cursor is the offset into that listing.
+        deferred jobs are the fifo tasks parked until the device q has a free session slot, they still report
+        themselves as queued. total is an upper bound, the registries are read without cleaning them up first so
+        entries whose job has expired are counted and then left out of the page"""
         log.info(f"getting jobs and status: {q}")
         try:
             if q:
-                self.getqueue(q)
-                task = self.local_queuedb[q]["queue"].get_job_ids()
+                queue = Queue(q, connection=self.base_connection)
+                # read the registries directly, their get_job_ids() cleans up expired entries first
+                segment_keys = {"queued": queue.key}
+                if self.device_semaphore is not None:
+                    segment_keys["deferred"] = self.device_semaphore.deferred_key(q)
+                segment_keys.update({
+                    "started": StartedJobRegistry(queue=queue).key,
+                    "finished": FinishedJobRegistry(queue=queue).key,
+                    "failed": FailedJobRegistry(queue=queue).key,
+                })
+                if statuses:
+                    segment_keys = {status: key for status, key in segment_keys.items() if status in statuses}
+
+                with self.base_connection.pipeline() as pipe:
+                    for status, key in segment_keys.items():
+                        if status in LIST_SEGMENTS:
+                            pipe.llen(key)
+                        else:
+                            pipe.zcard(key)
+                    counts = pipe.execute()
+                total = sum(counts)
+
+                skip = cursor
+                remaining = limit
+                listed = []
+                with self.base_connection.pipeline() as pipe:
+                    for (status, key), count in zip(segment_keys.items(), counts):
+                        if skip >= count:
+                            skip -= count
+                            continue
+                        if remaining <= 0:
+                            break
+                        take = min(count - skip, remaining)
+                        if status in LIST_SEGMENTS:
+                            pipe.lrange(key, skip, skip + take - 1)
+                        else:
+                            pipe.zrange(key, skip, skip + take - 1)
+                        listed.append(status)
+                        remaining -= take
+                        skip = 0
+                    task_ids = [
+                        DeviceSemaphore.deferred_job_id(entry) if status == "deferred" else entry.decode()
+                        for status, entries in zip(listed, pipe.execute()) for entry in entries
+                    ]
+
+                next_cursor = cursor + len(task_ids)
                 response_object = {
                     "status": "success",
                     "data": {
-                        "task_id": []
+                        "task_id": [],
+                        "total": total,
+                        "next_cursor": next_cursor if next_cursor < total else None
                     }
                 }
-                # get startedjobs
-                startedjobs = self.getstartedjobs(self.local_queuedb[q]["queue"])
-                for job in startedjobs:
-                    task.append(job)
-
-                # get finishedjobs
-                finishedjobs = self.getfinishedjobs(self.local_queuedb[q]["queue"])
-                for job in finishedjobs:
-                    task.append(job)
-
-                # get failedjobs
-                failedjobs = self.getfailedjobs(self.local_queuedb[q]["queue"])
-                for job in failedjobs:
-                    task.append(job)
-
-                if task:
-                    for job in task:
-                        try:
-                            jobstatus = Job.fetch(job, connection=self.base_connection)
-                            jobdata = self.render_task_response(jobstatus)
-                            response_object["data"]["task_id"].append(jobdata)
-                        except Exception as e:
-                            return e
-                            pass
+                for task_job in Job.fetch_many(task_ids, connection=self.base_connection):
+                    if task_job is not None:  # expired between listing and fetching
+                        jobdata = self.render_task_response(task_job, read_only=True)
+                        response_object["data"]["task_id"].append(jobdata)
                 return response_object
         except Exception as e:
             return e
@@ -553,9 +1544,10 @@ class Rediz:
         """poisions a cache for a specific host"""
         if not cache_key.count(":") >= 2:
             log.error(f"{cache_key=} doesn't seem to be a valid cache key!")
-        host_port = cache_key.split(":")[:2]  # first 2 segments
-        modified_cache_key = ":".join(host_port)
+        modified_cache_key = cache_key_host(cache_key)
         log.info(f"deleting {modified_cache_key=}")
+        if self.inflight is not None:
+            self.inflight.clear_keys(modified_cache_key)
         return self.cache.clear_keys(modified_cache_key)
 
     def get_workers(self):
@@ -600,18 +1592,11 @@ class Rediz:
                 self.send_broadcast(json.dumps(kill_message))
 
                 # update pinned db
-                r = self.base_connection.get(self.redis_pinned_store)
-                rjson = json.loads(r)
-                for container in rjson:
-                    if container["hostname"] == w["hostname"]:
-                        container["count"] -= 1
-                self.base_connection.set(
-                    self.redis_pinned_store,
-                    json.dumps(rjson)
-                    )
+                self.pinned_store.release(w["hostname"])
 
         if not killed:
             raise Exception(f"worker {worker_name} not found")
+        self.worker_liveness_memo.clear()
 
     def create_service_instance(self, raw_data):
         """creates a service id and stores it in the DB with the service
@@ -700,24 +1685,18 @@ class Rediz:
 
     def fetch_pinned_store(self):
         """returns ALL data from the pinned store"""
-        exists = self.base_connection.get(self.redis_pinned_store)
-        result = json.loads(exists)
-        return result
+        return self.pinned_store.all()
+
+    def fetch_fifo_autoscaler_state(self):
+        """returns the last state reported by every container's fifo autoscaler"""
+        keys = sorted(self.base_connection.scan_iter(match=f"{self.redis_fifo_autoscaler_store}:*"))
+        if not keys:
+            return []
+        return [json.loads(state) for state in self.base_connection.mget(keys) if state]
 
     def purge_container_from_pinned_store(self, name):
         """force purge a specific container from the pinned store"""
-        r = self.base_connection.get(config.redis_pinned_store)
-        rjson = json.loads(r)
-        idex = 0
-        for container in rjson:
-            if container["hostname"] == name:
-                rjson.pop(idex)
-                self.base_connection.set(
-                    config.redis_pinned_store,
-                    json.dumps(rjson)
-                    )
-                break
-            idex += 1
+        self.pinned_store.remove(name)
 
     def deregister_worker(self, container):
         """finds and deregisters an rq worker"""
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Dict, Set, Callable, List, Optional
+
+log = logging.getLogger(__name__)
+
+FINAL_TASK_STATES = ("finished", "failed")
+
+
+def task_host(task_kwargs) -> Optional[str]:
+    """the device a task runs against, if it has one"""
+    if isinstance(task_kwargs, dict) and isinstance(task_kwargs.get("connection_args"), dict):
+        return task_kwargs["connection_args"].get("host")
+    return None
+
+
+def task_event_message(task_id: str, task_status: str, task_queue: str, host: Optional[str] = None) -> str:
+    """message published whenever a task changes state"""
+    return json.dumps({
+        "task_id": task_id,
+        "task_status": task_status,
+        "task_queue": task_queue,
+        "host": host
+    })
+
+
+class TaskEventStream:
+    """a filtered feed of task events for a single client"""
+
+    def __init__(self, task_ids: Optional[List[str]] = None, hosts: Optional[List[str]] = None,
+                 maxsize: int = 1000):
+        self.task_ids = set(task_ids) if task_ids else None
+        self.hosts = set(hosts) if hosts else None
+        self.loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        if self.task_ids is not None and event.get("task_id") not in self.task_ids:
+            return False
+        if self.hosts is not None and event.get("host") not in self.hosts:
+            return False
+        return True
+
+    def offer(self, event: dict):
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            # a client this far behind is better off re-reading state than stalling the hub
+            self.dropped += 1
+
+
+class TaskEventHub:
+    """relays task events published by workers to coroutines waiting in this process
+
+    one subscriber thread is started per process the first time it's needed"""
+
+    def __init__(self, base_connection, channel: str):
+        self.base_connection = base_connection
+        self.channel = channel
+        self.waiters: Dict[str, Set[asyncio.Future]] = {}
+        self.streams: Set[TaskEventStream] = set()
+        self.lock = threading.Lock()
+        self.subscribed = threading.Event()
+        self.listener = None
+
+    def ensure_listener(self, timeout: float = 5):
+        """starts the subscriber thread if required and blocks until it's subscribed"""
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.subscribed.clear()
+                self.listener = threading.Thread(target=self.listen, name="task_event_listener", daemon=True)
+                self.listener.start()
+        return self.subscribed.wait(timeout)
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.base_connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.subscribed.set()
+                log.info(f"listening for task events on {self.channel}")
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self.dispatch(message["data"])
+            except Exception as e:
+                self.subscribed.clear()
+                log.error(f"task event listener: {e}")
+                time.sleep(1)
+
+    def dispatch(self, data):
+        try:
+            event = json.loads(data)
+        except (TypeError, ValueError):
+            log.warning(f"ignoring unintelligible task event {data}")
+            return
+        with self.lock:
+            streams = [stream for stream in self.streams if stream.matches(event)]
+            futures = ()
+            if event.get("task_status") in FINAL_TASK_STATES:
+                futures = self.waiters.pop(event.get("task_id"), ())
+        for stream in streams:
+            stream.loop.call_soon_threadsafe(stream.offer, event)
+        for future in futures:
+            future.get_loop().call_soon_threadsafe(self._resolve, future, event)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, event: dict):
+        if not future.done():
+            future.set_result(event)
+
+    def register(self, task_id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        with self.lock:
+            self.waiters.setdefault(task_id, set()).add(future)
+        return future
+
+    def unregister(self, task_id: str, future: asyncio.Future):
+        with self.lock:
+            futures = self.waiters.get(task_id)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self.waiters[task_id]
+
+    async def wait(self, task_id: str, timeout: float, fetch: Callable):
+        """returns fetch(task_id) once the task has finished or failed, or after timeout seconds
+
+        fetch may be a blocking function or a coroutine function"""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.ensure_listener):
+            log.warning(f"task event listener isn't subscribed yet, {task_id} may wait the full {timeout}s")
+        # register before the first fetch so a completion between the two can't be missed
+        future = self.register(task_id)
+        try:
+            task = await self.fetch(fetch, task_id)
+            if not isinstance(task, dict) or task["data"]["task_status"] in FINAL_TASK_STATES:
+                return task
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.unregister(task_id, future)
+        return await self.fetch(fetch, task_id)
+
+    @staticmethod
+    async def fetch(fetch: Callable, task_id: str):
+        if asyncio.iscoroutinefunction(fetch):
+            return await fetch(task_id)
+        return await asyncio.get_running_loop().run_in_executor(None, fetch, task_id)
+
+    async def stream(self, task_ids: Optional[List[str]] = None, hosts: Optional[List[str]] = None,
+                     keepalive: float = 15):
+        """yields matching task events as server sent events until the client goes away"""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.ensure_listener):
+            log.warning(f"task event listener isn't subscribed yet, early events may be missed")
+        stream = TaskEventStream(task_ids=task_ids, hosts=hosts)
+        with self.lock:
+            self.streams.add(stream)
+        try:
+            yield ": subscribed\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(stream.events.get(), keepalive)
+                except asyncio.TimeoutError:
+                    # comment lines keep proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['task_status']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            with self.lock:
+                self.streams.discard(stream)
+            if stream.dropped:
+                log.warning(f"task event stream dropped {stream.dropped} events for a slow client")
@@ -1,4 +1,7 @@
+from netpalm.backend.core.redis import reds
 from netpalm.backend.core.schedule.schedule import Schedulr
 
 sched = Schedulr()
 schedule_r = sched.init_scheduler()
+if reds.cache_warmer is not None:
+    sched.init_cache_warming(reds.cache_warmer)
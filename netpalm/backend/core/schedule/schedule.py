@@ -1,4 +1,5 @@
 import logging
+import time
 import uuid
 import datetime
 import requests
@@ -7,12 +8,14 @@ from jsonpath_ng import jsonpath, parse
 
 from fastapi.exceptions import HTTPException
 
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from netpalm.backend.core.confload.confload import config
 from netpalm.backend.core.models.task import ResponseBasic
+from netpalm.backend.core.redis.connection import connection_pool
 
 log = logging.getLogger(__name__)
 
@@ -45,28 +48,11 @@ def execute_api_call(**kwargs):
 class Schedulr:
 
     def __init__(self):
-        if config.redis_tls_enabled:
-            self.connect_args = {
-                "host": config.redis_server,
-                "port": config.redis_port,
-                "password": config.redis_key,
-                "ssl": True,
-                "ssl_cert_reqs": "required",
-                "ssl_keyfile": config.redis_tls_key_file,
-                "ssl_certfile": config.redis_tls_cert_file,
-                "ssl_ca_certs": config.redis_tls_ca_cert_file,
-                "socket_connect_timeout": config.redis_socket_connect_timeout,
-                "socket_keepalive": config.redis_socket_keepalive
-            }
-        else:
-            self.connect_args = {
-                "host": config.redis_server,
-                "port": config.redis_port,
-                "password": config.redis_key,
-                "socket_connect_timeout": config.redis_socket_connect_timeout,
-                "socket_keepalive": config.redis_socket_keepalive
-            }
+        self.connect_args = {
+            "connection_pool": connection_pool(config)
+        }
         self.scheduler = None
+        self.cache_warmer = None
 
     def init_scheduler(self):
         """ instantiate the scheduler and make it available in the class """
@@ -75,7 +61,9 @@ class Schedulr:
                                 jobs_key=config.redis_schedule_store,
                                 run_times_key=config.redis_schedule_store_stats,
                                 **self.connect_args
-                                )
+                                ),
+            # cache warming is planned by every controller for itself, so it stays out of the shared store
+            "cache_warming": MemoryJobStore()
         }
         self.executors = {
             "default": ThreadPoolExecutor(config.apscheduler_num_threads),
@@ -91,6 +79,35 @@ class Schedulr:
                                     )
         scheduler.start()
 
+    def init_cache_warming(self, cache_warmer):
+        """plans refreshes of the hot cache entries once every warm interval"""
+        self.cache_warmer = cache_warmer
+        self.scheduler.add_job(
+                            self.warm_cache,
+                            trigger="interval",
+                            seconds=cache_warmer.interval,
+                            id="cache_warming",
+                            jobstore="cache_warming",
+                            replace_existing=True
+                            )
+
+    def warm_cache(self):
+        """schedules each entry due for warming at the time the warmer planned for it"""
+        try:
+            for run_at, cache_key in self.cache_warmer.plan(time.time()):
+                self.scheduler.add_job(
+                                    self.cache_warmer.warm,
+                                    trigger="date",
+                                    run_date=datetime.datetime.fromtimestamp(run_at),
+                                    args=[cache_key],
+                                    id=f"cache_warming:{cache_key}",
+                                    jobstore="cache_warming",
+                                    replace_existing=True,
+                                    misfire_grace_time=self.cache_warmer.interval
+                                    )
+        except Exception as e:
+            log.error(f"warm_cache: {e}")
+
     def purge_creds(self, kw):
         """ purge creds from any redis payload """
         try:
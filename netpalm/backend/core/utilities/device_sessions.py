@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class PooledSession:
+    def __init__(self, driver, session):
+        self.driver = driver
+        self.session = session
+        self.last_used = time.monotonic()
+
+
+class DeviceSessionPool:
+    """keeps driver sessions open between jobs for workers that execute jobs in their own process
+
+    disabled unless pinned_session_reuse is set, every checkout then connects and every checkin logs out just like
+    before. pinned workers enable it and run their jobs in process when it is set.
+    a session is only returned to the pool by a job that finished with it, a job that errors part way
+    through logs its session out rather than hand it to the next one. jobs should hold sessions with
+    session(), which makes sure of that however the job ends.
+    the pool is shared by every job thread in the process, connecting and logging out happen outside its lock"""
+
+    # how to tell whether an idle session is still usable, libraries not listed here are never pooled
+    probes = {
+        "netmiko": lambda session: session.is_alive(),
+        "napalm": lambda session: session.is_alive().get("is_alive", False),
+        "ncclient": lambda session: session.connected,
+    }
+
+    def __init__(self):
+        self.enabled = False
+        self.idle_timeout = 0
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def enable(self, idle_timeout: int):
+        log.info(f"device session pooling enabled, idle timeout {idle_timeout}s")
+        self.enabled = True
+        self.idle_timeout = idle_timeout
+
+    @staticmethod
+    def session_key(library: str, connection_args: dict) -> str:
+        serialized = json.dumps([library, connection_args], sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def is_alive(self, library: str, session) -> bool:
+        try:
+            return bool(self.probes[library](session))
+        except Exception as e:
+            log.info(f"{library} session failed its liveness probe: {e}")
+            return False
+
+    def close(self, library: str, pooled: PooledSession):
+        try:
+            pooled.driver.logout(pooled.session)
+        except Exception as e:
+            # logout reports through the job meta, which isn't there between jobs
+            log.info(f"closing idle {library} session: {e}")
+
+    def reap(self):
+        """closes sessions that have been idle for longer than the idle timeout"""
+        now = time.monotonic()
+        with self.lock:
+            idle = [(key, entry) for key, entry in self.sessions.items()
+                    if now - entry[1].last_used > self.idle_timeout]
+            for key, _ in idle:
+                del self.sessions[key]
+        for _, (library, pooled) in idle:
+            log.info(f"closing {library} session idle for {now - pooled.last_used:.0f}s")
+            self.close(library, pooled)
+
+    def close_all(self):
+        with self.lock:
+            entries = list(self.sessions.values())
+            self.sessions.clear()
+        for library, pooled in entries:
+            self.close(library, pooled)
+
+    def checkout(self, library: str, driver):
+        """returns an open session for the driver's device, reusing a live pooled one when possible"""
+        if not self.enabled or library not in self.probes:
+            return driver.connect()
+        self.reap()
+        key = self.session_key(library, driver.connection_args)
+        with self.lock:
+            entry = self.sessions.pop(key, None)
+        if entry is not None:
+            _, pooled = entry
+            if self.is_alive(library, pooled.session):
+                log.debug(f"reusing pooled {library} session")
+                return pooled.session
+            log.info(f"pooled {library} session is dead, reconnecting")
+            self.close(library, pooled)
+        return driver.connect()
+
+    def checkin(self, library: str, driver, session):
+        """returns a session to the pool once the job is done with it, or logs out when pooling is off"""
+        if not self.enabled or library not in self.probes or session is None:
+            return driver.logout(session)
+        key = self.session_key(library, driver.connection_args)
+        with self.lock:
+            previous = self.sessions.pop(key, None)
+            self.sessions[key] = (library, PooledSession(driver, session))
+        if previous is not None:
+            self.close(*previous)
+
+    @contextmanager
+    def session(self, library: str, driver):
+        """holds a checked out session for the with block, checking it back in when the block finishes and
+        logging it out when the block raises, write_meta_error included"""
+        session = self.checkout(library, driver)
+        try:
+            yield session
+        except BaseException:
+            self.close(library, PooledSession(driver, session))
+            raise
+        self.checkin(library, driver, session)
+
+
+device_sessions = DeviceSessionPool()
@@ -0,0 +1,171 @@
+import datetime
+import json
+import logging
+import math
+import socket
+import time
+from typing import Callable, Dict, List, Tuple
+
+from redis import Redis
+from rq import Queue
+from rq.job import Job
+from rq.utils import utcnow, utcparse
+
+from netpalm.backend.core.confload.confload import config, Config
+from netpalm.backend.core.redis.rediz import fifo_queue_names
+
+log = logging.getLogger(__name__)
+
+
+def fifo_autoscaler_key(hostname: str, config: Config = config) -> str:
+    """key each container publishes its autoscaler state under"""
+    return f"{config.redis_fifo_autoscaler_store}:{hostname}"
+
+
+class FifoAutoscaler:
+    """grows and shrinks this container's fifo worker processes with the depth and age of the fifo queue
+
+    every container sees the same queue, so each one sizes itself for its share of the depth going by how
+    many containers are publishing autoscaler state for the queue. a threaded worker takes on as many
+    tasks at once as its concurrency allows.
+    growing happens as soon as the queue needs it, shrinking only once the queue has needed fewer
+    workers for a whole cooldown and then one worker per interval. workers are stopped with SIGTERM,
+    which rq treats as a warm shutdown so the job in hand is finished first"""
+
+    def __init__(self, queue_name: str, spawn: Callable, base_connection: Redis, config: Config = config):
+        self.queue = Queue(queue_name, connection=base_connection)
+        self.queues = [Queue(name, connection=base_connection) for name in fifo_queue_names(queue_name)]
+        self.spawn = spawn
+        self.base_connection = base_connection
+        self.min_workers = config.fifo_process_min_per_node
+        self.max_workers = max(config.fifo_process_max_per_node, self.min_workers)
+        self.jobs_per_worker = max(config.fifo_autoscale_jobs_per_worker, 1)
+        self.concurrency = max(config.worker_concurrency, 1) if config.worker_mode == "threaded" else 1
+        self.max_job_age = config.fifo_autoscale_max_job_age
+        self.cooldown = config.fifo_autoscale_cooldown
+        self.interval = config.fifo_autoscale_interval
+        self.hostname = socket.gethostname()
+        self.store = config.redis_fifo_autoscaler_store
+        self.state_key = fifo_autoscaler_key(self.hostname, config)
+        self.processes: Dict[int, object] = {}
+        self.stopping: List = []
+        self.counter = 0
+        self.below_since = None
+        self.last_action = None
+
+    def queue_metrics(self) -> Tuple[int, float]:
+        """returns the depth of the fifo queues and the age in seconds of the oldest job waiting in any of them"""
+        with self.base_connection.pipeline() as pipe:
+            for queue in self.queues:
+                pipe.llen(queue.key)
+                pipe.lindex(queue.key, 0)
+            results = pipe.execute()
+        depth = sum(results[0::2])
+        heads = [head.decode() for head in results[1::2] if head]
+        oldest_age = 0.0
+        if heads:
+            with self.base_connection.pipeline() as pipe:
+                for job_id in heads:
+                    pipe.hget(Job.key_for(job_id), "enqueued_at")
+                enqueued = [utcparse(enqueued_at.decode()) for enqueued_at in pipe.execute() if enqueued_at]
+            if enqueued:
+                oldest_age = max((utcnow() - min(enqueued)).total_seconds(), 0.0)
+        return depth, oldest_age
+
+    def live_containers(self) -> int:
+        """containers sharing the queue, going by the autoscaler state that hasn't expired yet, this one included"""
+        others = [key for key in self.base_connection.scan_iter(match=f"{self.store}:*")
+                  if key != self.state_key.encode()]
+        if not others:
+            return 1
+        states = [json.loads(state) for state in self.base_connection.mget(others) if state]
+        return 1 + sum(1 for state in states if state.get("queue") == self.queue.name)
+
+    def desired_workers(self, depth: int, oldest_age: float, containers: int = 1) -> int:
+        desired = math.ceil(depth / (self.jobs_per_worker * self.concurrency * max(containers, 1)))
+        if oldest_age > self.max_job_age:
+            # jobs are waiting too long even if there aren't many of them
+            desired = max(desired, len(self.processes) + 1)
+        return min(max(desired, self.min_workers), self.max_workers)
+
+    def decide(self, depth: int, oldest_age: float, now: float, containers: int = 1) -> Tuple[int, str]:
+        """returns the worker count to run next and what was decided"""
+        current = len(self.processes)
+        desired = self.desired_workers(depth, oldest_age, containers)
+        if desired > current:
+            self.below_since = None
+            return desired, "scale_up"
+        if desired == current:
+            self.below_since = None
+            return current, "hold"
+        if self.below_since is None:
+            self.below_since = now
+        if now - self.below_since < self.cooldown:
+            return current, "hold"
+        return current - 1, "scale_down"
+
+    def reap(self):
+        """forgets worker processes that have exited"""
+        for counter, process in list(self.processes.items()):
+            if not process.is_alive():
+                log.warning(f"fifo worker {counter} exited with {process.exitcode}")
+                del self.processes[counter]
+        self.stopping = [process for process in self.stopping if process.is_alive()]
+
+    def scale_to(self, target: int):
+        while len(self.processes) < target:
+            self.processes[self.counter] = self.spawn(self.counter)
+            self.counter += 1
+        while len(self.processes) > target:
+            newest = max(self.processes)
+            process = self.processes.pop(newest)
+            process.terminate()
+            self.stopping.append(process)
+
+    def tick(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.reap()
+        depth, oldest_age = self.queue_metrics()
+        containers = self.live_containers()
+        current = len(self.processes)
+        target, action = self.decide(depth, oldest_age, now, containers)
+        if target != current:
+            reason = f"{depth} queued across {containers} containers, oldest waiting {oldest_age:.1f}s"
+            log.info(f"fifo autoscaler: {action} from {current} to {target} workers, {reason}")
+            self.last_action = {
+                "action": action,
+                "from_workers": current,
+                "to_workers": target,
+                "reason": reason,
+                "at": datetime.datetime.utcnow().isoformat()
+            }
+            self.scale_to(target)
+        self.publish_state(depth, oldest_age)
+
+    def publish_state(self, depth: int, oldest_age: float):
+        state = {
+            "hostname": self.hostname,
+            "queue": self.queue.name,
+            "workers": len(self.processes),
+            "stopping": len(self.stopping),
+            "min_workers": self.min_workers,
+            "max_workers": self.max_workers,
+            "queue_depth": depth,
+            "oldest_job_age": round(oldest_age, 3),
+            "last_action": self.last_action
+        }
+        try:
+            # expires on its own once this container stops reporting
+            self.base_connection.set(self.state_key, json.dumps(state), ex=max(int(self.interval * 5), 30))
+        except Exception as e:
+            log.error(f"fifo autoscaler: failed to publish state: {e}")
+
+    def run(self):
+        log.info(f"fifo autoscaler: keeping {self.min_workers} to {self.max_workers} workers on {self.queue.name}")
+        self.scale_to(self.min_workers)
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                log.error(f"fifo autoscaler: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,389 @@
+import ctypes
+import importlib
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import redis
+from rq import Worker, SimpleWorker
+from rq.exceptions import DequeueTimeout
+from rq.timeouts import BaseDeathPenalty
+from rq.worker import StopRequested, WorkerStatus
+
+from netpalm.backend.core.confload.confload import config
+from netpalm.backend.core.redis.compression import Compressor
+from netpalm.backend.core.redis.device_semaphore import DeviceSemaphore
+from netpalm.backend.core.redis.rediz import PinnedCapacityStore, ClearableCache, cache_key_prefix, \
+    cache_set_kwargs, cached_task_response, invalidation_channel, worker_liveness_key
+from netpalm.backend.core.redis.task_events import task_event_message, task_host
+from netpalm.backend.core.utilities.device_sessions import device_sessions
+
+log = logging.getLogger(__name__)
+
+# driver modules the libraries only import on first connect, a forked work horse would import them on every job
+PRELOAD_MODULES = (
+    "napalm.eos", "napalm.junos", "napalm.iosxr", "napalm.nxos", "napalm.nxos_ssh", "napalm.ios",
+    "ncclient.devices.default", "ncclient.devices.iosxr", "ncclient.devices.iosxe", "ncclient.devices.junos",
+    "ncclient.devices.nexus", "ncclient.devices.csr",
+    "textfsm", "ttp", "genie.conf.base", "genie.libs.parser.utils",
+)
+
+
+# a pinned queue is only given up while it's empty, in the same step that stops controllers routing to it
+RELEASE_IDLE_QUEUE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('GET', KEYS[3]) == ARGV[2] then
+    redis.call('DEL', KEYS[3])
+end
+return 1
+"""
+
+# seconds a device slot is held past the job timeout, and between checks for slots whose holder died
+DEVICE_LEASE_GRACE = 60
+DEVICE_SWEEP_INTERVAL = 30
+
+
+class NetpalmWorker(Worker):
+    """rq worker which also maintains the per queue liveness index read by the controller
+
+    pinned workers given an idle_timeout exit once they've had nothing to do for that many seconds,
+    handing their queue and their container's process slot back.
+    queues are drained in the order given unless queue_weights maps queue names to weights,
+    then the order is redrawn after every job so heavier queues tend to come first.
+    given a device_semaphore, a job only runs once it holds a session slot on its device,
+    otherwise it's parked until a job on the same device finishes and never runs here.
+    results past the compression threshold are stored compressed, fetching them still returns the original"""
+
+    def __init__(self, *args, idle_timeout: int = None, queue_weights: Dict[str, float] = None,
+                 device_semaphore: DeviceSemaphore = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.idle_timeout = idle_timeout
+        self.queue_weights = queue_weights
+        self.device_semaphore = device_semaphore
+        self.compressor = Compressor(config)
+        self.last_sweep = time.monotonic()
+        self.executing = False
+        self.last_active = time.monotonic()
+        if queue_weights:
+            self.reorder_queues(reference_queue=None)
+
+    def reorder_queues(self, reference_queue):
+        if not self.queue_weights:
+            return super().reorder_queues(reference_queue)
+        # weighted sampling without replacement, each queue draws random() ** (1 / weight)
+        self._ordered_queues = sorted(
+            self.queues,
+            key=lambda queue: random.random() ** (1 / max(self.queue_weights.get(queue.name, 1), 1e-6)),
+            reverse=True
+        )
+
+    def heartbeat(self, timeout=None, pipeline=None):
+        super().heartbeat(timeout=timeout, pipeline=pipeline)
+        timeout = timeout or self.default_worker_ttl + 60
+        connection = pipeline if pipeline is not None else self.connection
+        for queue_name in self.queue_names():
+            connection.set(worker_liveness_key(queue_name), self.name, ex=timeout)
+        if self.device_semaphore is not None and time.monotonic() - self.last_sweep >= DEVICE_SWEEP_INTERVAL:
+            self.last_sweep = time.monotonic()
+            self.device_semaphore.sweep()
+
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        if self.device_semaphore is not None and timeout is not None:
+            # parked jobs are only swept on heartbeats, which an idle worker sends once per dequeue timeout
+            timeout = max(1, min(timeout, DEVICE_SWEEP_INTERVAL))
+        if not self.idle_timeout or timeout is None:
+            return super().dequeue_job_and_maintain_ttl(timeout)
+        # rq's own loop only returns with a job, this one also returns None, which ends the work loop,
+        # once the worker has been idle long enough to give its queue up
+        timeout = max(1, min(timeout, self.idle_timeout // 10))
+        self.set_state(WorkerStatus.IDLE)
+        self.procline(f"Listening on {','.join(self.queue_names())}")
+        connection_wait_time = 1.0
+        while True:
+            try:
+                self.heartbeat()
+                if self.should_run_maintenance_tasks:
+                    self.run_maintenance_tasks()
+                result = self.queue_class.dequeue_any(self._ordered_queues, timeout, connection=self.connection,
+                                                      job_class=self.job_class, serializer=self.serializer)
+                if result is not None:
+                    job, queue = result
+                    job.redis_server_version = self.get_redis_server_version()
+                    self.log.info(f"{queue.name}: {job.id}")
+                    break
+            except DequeueTimeout:
+                if self.is_idle() and self.release_idle_queue():
+                    return None
+            except redis.exceptions.ConnectionError as e:
+                self.log.error(f"could not connect to redis: {e}, retrying in {connection_wait_time} seconds")
+                time.sleep(connection_wait_time)
+                connection_wait_time = min(connection_wait_time * self.exponential_backoff_factor,
+                                           self.max_connection_wait_time)
+            else:
+                connection_wait_time = 1.0
+        self.heartbeat()
+        return result
+
+    def execute_job(self, job, queue):
+        if not self.acquire_device_slot(job, queue):
+            return
+        self.executing = True
+        try:
+            return super().execute_job(job, queue)
+        finally:
+            self.executing = False
+            self.last_active = time.monotonic()
+            self.release_device_slot(job)
+
+    def acquire_device_slot(self, job, queue) -> bool:
+        """false if the job's device is already at its session limit, the job is then parked for later"""
+        host = task_host(job.kwargs)
+        if self.device_semaphore is None or not host:
+            return True
+        timeout = job.timeout if job.timeout and job.timeout > 0 else config.redis_task_timeout
+        if self.device_semaphore.acquire(host, job.id, queue.key, lease=timeout + DEVICE_LEASE_GRACE):
+            return True
+        log.info(f"{host} is at its limit of {self.device_semaphore.limit} sessions, deferring {job.id}")
+        return False
+
+    def release_device_slot(self, job):
+        host = task_host(job.kwargs)
+        if self.device_semaphore is None or not host:
+            return
+        try:
+            self.device_semaphore.release(host, job.id)
+        except Exception as e:
+            # the lease runs out on its own
+            log.error(f"release_device_slot: failed to release {host} for {job.id}: {e}")
+
+    def is_idle(self) -> bool:
+        return bool(self.idle_timeout) and not self.executing \
+            and time.monotonic() - self.last_active >= self.idle_timeout
+
+    def release_idle_queue(self) -> bool:
+        """gives up the pinned queue and its process slot, false if a job has just arrived and the worker must stay"""
+        queue = self.queues[0]
+        released = self.connection.eval(RELEASE_IDLE_QUEUE_SCRIPT, 3, queue.key, config.redis_queue_store,
+                                         worker_liveness_key(queue.name), queue.name, self.name)
+        if not released:
+            self.last_active = time.monotonic()
+            return False
+        log.info(f"{queue.name} idle for {self.idle_timeout}s, stopping its pinned worker")
+        PinnedCapacityStore(self.connection, config.redis_pinned_store).release(socket.gethostname())
+        return True
+
+    def register_death(self):
+        super().register_death()
+        # only clear the index if no other worker on a shared queue has refreshed it since
+        for queue_name in self.queue_names():
+            key = worker_liveness_key(queue_name)
+            if self.connection.get(key) == self.name.encode():
+                self.connection.delete(key)
+
+    def publish_task_event(self, job, queue_name):
+        """tells controllers watching the job about its new state, never fails the job itself"""
+        try:
+            self.connection.publish(config.redis_task_events_q,
+                                    task_event_message(job.id, job.get_status(refresh=False), queue_name,
+                                                       host=task_host(job.kwargs)))
+        except Exception as e:
+            log.error(f"publish_task_event: failed to publish event for {job.id}: {e}")
+
+    def prepare_job_execution(self, job):
+        super().prepare_job_execution(job)
+        self.publish_task_event(job, job.origin)
+
+    def handle_job_success(self, job, queue, started_job_registry):
+        result = job._result
+        job._result = self.compress_job_result(job)
+        try:
+            super().handle_job_success(job, queue, started_job_registry)
+        finally:
+            job._result = result
+        self.cache_job_result(job)
+        self.publish_task_event(job, queue.name)
+
+    def compress_job_result(self, job):
+        """what rq should store as the job's result, never fails the job itself"""
+        try:
+            result, compression = self.compressor.pack(job._result, key=job.id)
+            if compression is not None:
+                with self.connection.pipeline(transaction=False) as pipe:
+                    self.compressor.record(pipe, compression, "result")
+                    pipe.execute()
+            return result
+        except Exception as e:
+            log.error(f"compress_job_result: storing the result of {job.id} uncompressed: {e}")
+            return job._result
+
+    def cache_job_result(self, job):
+        """stores the result of a task enqueued by a cacheable route under the route's cache key,
+        unless the device's cache was poisoned after the task was enqueued"""
+        cache_key = job.meta.get("cache_key")
+        if not cache_key or not config.redis_cache_enabled or job.meta.get("errors"):
+            return
+        try:
+            cache = ClearableCache(self.connection, default_timeout=config.redis_cache_default_timeout,
+                                   key_prefix=cache_key_prefix(config),
+                                   invalidation_channel=invalidation_channel(config),
+                                   index_prefix=config.redis_cache_index_prefix, compressor=self.compressor)
+            cache_config = {"ttl": job.meta.get("cache_ttl"), "stale_ttl": job.meta.get("cache_stale_ttl")}
+            if not cache.set(cache_key, cached_task_response(job), epoch=job.meta.get("cache_epoch"),
+                             **cache_set_kwargs(cache_config)):
+                log.info(f"cache_job_result: not caching {job.id}, {cache_key} was poisoned while it ran")
+        except Exception as e:
+            log.error(f"cache_job_result: failed to cache the result of {job.id}: {e}")
+
+    def handle_job_failure(self, job, queue, started_job_registry=None, exc_string=''):
+        super().handle_job_failure(job, queue, started_job_registry=started_job_registry, exc_string=exc_string)
+        self.publish_task_event(job, queue.name)
+
+
+class NetpalmInProcessWorker(NetpalmWorker, SimpleWorker):
+    """runs jobs in the worker process itself instead of forking a work horse per job
+
+    job timeouts are still enforced, SimpleWorker wraps each job in the same SIGALRM death penalty.
+    device sessions can outlive the job that opened them"""
+
+    def heartbeat(self, timeout=None, pipeline=None):
+        super().heartbeat(timeout=timeout, pipeline=pipeline)
+        # heartbeats keep coming while the queue is idle, so sessions get closed even if no job follows
+        device_sessions.reap()
+
+    def register_death(self):
+        device_sessions.close_all()
+        super().register_death()
+
+
+class ThreadDeathPenalty(BaseDeathPenalty):
+    """job timeout for jobs running outside the main thread, where SIGALRM can't reach them
+
+    the exception is raised in the job's thread the next time it runs python code,
+    so a job blocked inside a single C call is only interrupted once that call returns.
+    the timer only fires while its own job is still running, and cancelling clears an exception it
+    set that the thread hasn't raised yet, so it can't land in rq's bookkeeping or the thread's next job"""
+
+    def __init__(self, timeout, exception, job_id=None, **kwargs):
+        super().__init__(timeout, exception, **kwargs)
+        self._job_id = job_id
+        self._thread_id = threading.get_ident()
+        self._timer = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def set_async_exc(self, exception):
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id),
+                                                   ctypes.py_object(exception) if exception else None)
+
+    def handle_death_penalty(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            log.warning(f"job {self._job_id} in thread {self._thread_id} exceeded its {self._timeout}s timeout")
+            self.set_async_exc(self._exception)
+
+    def setup_death_penalty(self):
+        if self._timeout <= 0:
+            return
+        self._running = True
+        self._timer = threading.Timer(self._timeout, self.handle_death_penalty)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel_death_penalty(self):
+        if self._timer is None:
+            return
+        self._timer.cancel()
+        with self._lock:
+            fired = not self._running
+            self._running = False
+            if fired:
+                # the job finished before the exception reached it
+                self.set_async_exc(None)
+
+
+class NetpalmThreadedWorker(NetpalmInProcessWorker):
+    """runs up to concurrency jobs at once on a thread pool inside the worker process
+
+    a job is only taken off the queue once a thread is free for it, so queued jobs stay available
+    to other workers. rq keeps the current job per thread, so get_current_job and
+    write_meta_error still act on the job running in the calling thread.
+    the worker's own state and current job, as shown by rq info and the worker's redis hash, are one per
+    worker, concurrent jobs overwrite each other's there. job status, meta and results are unaffected"""
+
+    death_penalty_class = ThreadDeathPenalty
+
+    def __init__(self, *args, concurrency: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency or config.worker_concurrency
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=self.name)
+
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        # keep heartbeating while every thread is busy so the worker isn't presumed dead
+        while not self.slots.acquire(timeout=max(1, self.default_worker_ttl - 15)):
+            self.heartbeat()
+        try:
+            result = super().dequeue_job_and_maintain_ttl(timeout)
+        except BaseException:
+            self.slots.release()
+            raise
+        if result is None:
+            self.slots.release()
+        return result
+
+    def execute_job(self, job, queue):
+        if not self.acquire_device_slot(job, queue):
+            self.slots.release()
+            return
+        self.executor.submit(self.run_job, job, queue)
+
+    def run_job(self, job, queue):
+        try:
+            self.perform_job(job, queue)
+        except Exception as e:
+            log.error(f"run_job: {job.id} escaped rq's error handling: {e}")
+        finally:
+            self.release_device_slot(job)
+            self.slots.release()
+
+    def _shutdown(self):
+        # the main thread only ever waits on the queue, running jobs are drained in register_death
+        raise StopRequested()
+
+    def register_death(self):
+        self.executor.shutdown(wait=True)
+        super().register_death()
+
+
+WORKER_CLASSES = {
+    "forking": NetpalmWorker,
+    "inprocess": NetpalmInProcessWorker,
+    "threaded": NetpalmThreadedWorker,
+}
+
+
+def worker_class(mode: str):
+    """the worker class for a worker_mode setting"""
+    try:
+        return WORKER_CLASSES[mode]
+    except KeyError:
+        raise ValueError(f"unknown worker_mode {mode}, expected one of {list(WORKER_CLASSES)}")
+
+
+def preload_drivers():
+    """imports every job function and the driver modules behind them once, before the first job"""
+    from netpalm.backend.core.routes import routes  # noqa: F401
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            log.debug(f"preload_drivers: skipping {module}: {e}")
@@ -1,12 +1,15 @@
-from redis import Redis
 from rq import Queue, Connection, Worker
 import socket
-import json
 import logging
 import uuid
 
 from netpalm.backend.core.confload.confload import config, Config
 from netpalm.backend.core.models.models import PinnedStore
+from netpalm.backend.core.redis.connection import redis_connection
+from netpalm.backend.core.redis.device_semaphore import DeviceSemaphore
+from netpalm.backend.core.redis.rediz import PinnedCapacityStore, fifo_queue_name, fifo_queue_names
+from netpalm.backend.core.utilities.device_sessions import device_sessions
+from netpalm.backend.core.utilities.rediz_worker import NetpalmWorker, preload_drivers, worker_class
 
 log = logging.getLogger(__name__)
 
@@ -22,95 +25,78 @@ class WorkerRediz:
         self.timeout = config.redis_task_timeout
         self.task_result_ttl = config.redis_task_result_ttl
         self.core_q = config.redis_core_q
-        # config check if TLS required
-        if config.redis_tls_enabled:
-            self.base_connection = Redis(
-                host=self.server,
-                port=self.port,
-                password=self.key,
-                ssl=True,
-                ssl_cert_reqs="required",
-                ssl_keyfile=config.redis_tls_key_file,
-                ssl_certfile=config.redis_tls_cert_file,
-                ssl_ca_certs=config.redis_tls_ca_cert_file,
-                socket_connect_timeout=config.redis_socket_connect_timeout,
-                socket_keepalive=config.redis_socket_keepalive,
-            )
-        else:
-            self.base_connection = Redis(
-                host=self.server,
-                port=self.port,
-                password=self.key,
-                socket_connect_timeout=config.redis_socket_connect_timeout,
-                socket_keepalive=config.redis_socket_keepalive,
-            )
+        self.base_connection = redis_connection(config)
+        self.pinned_store = PinnedCapacityStore(self.base_connection, config.redis_pinned_store)
 
     def process_worker_listen(self):
         """pinned worker master container process"""
         with Connection(self.base_connection):
             # register container to pinned store
-            r = self.base_connection.get(config.redis_pinned_store)
-            rjson = json.loads(r)
             hstname = socket.gethostname()
             listn_queue = f"{hstname}_processworker"
-            log.info(rjson)
             data = PinnedStore(
                 hostname=f"{hstname}",
                 count=0,
                 limit=config.pinned_process_per_node,
                 pinned_listen_queue=listn_queue,
             ).dict()
-            rjson.append(data)
-            log.info(rjson)
-            self.base_connection.set(config.redis_pinned_store, json.dumps(rjson))
+            log.info(data)
+            self.pinned_store.register(data)
             # setup queue and start working
             q = Queue(listn_queue)
             u_uid = uuid.uuid4()
             worker_name = f"{listn_queue}_{u_uid}"
-            worker = Worker(q, name=worker_name)
+            worker = NetpalmWorker(q, name=worker_name)
             worker.work()
 
     def pinned_worker_listen(self, queue):
         """pinned worker instance process"""
         with Connection(self.base_connection):
-            # update pinned db
-            r = self.base_connection.get(config.redis_pinned_store)
-            rjson = json.loads(r)
-            hstname = socket.gethostname()
-            for container in rjson:
-                if container["hostname"] == f"{hstname}":
-                    container["count"] += 1
-                    break
-            self.base_connection.set(config.redis_pinned_store, json.dumps(rjson))
+            # capacity for this process was already reserved in the pinned db by the controller
             # setup queue and start working
             q = Queue(queue)
             u_uid = uuid.uuid4()
             worker_name = f"{queue}_{u_uid}"
-            worker = Worker(q, name=worker_name)
+            preload_drivers()
+            if config.pinned_session_reuse:
+                # sessions only survive between jobs that run in this process
+                if config.worker_mode != "inprocess":
+                    log.warning(f"pinned_worker_listen: pinned_session_reuse runs {queue} tasks in process, "
+                                f"overriding worker_mode {config.worker_mode}")
+                device_sessions.enable(config.pinned_session_idle_timeout)
+                mode = "inprocess"
+            elif config.worker_mode == "threaded":
+                # a pinned queue runs one task at a time against its device
+                mode = "inprocess"
+            else:
+                mode = config.worker_mode
+            worker = worker_class(mode)(q, name=worker_name, idle_timeout=config.pinned_worker_idle_timeout)
             worker.work()
 
     def fifo_worker_listen(self, queue, counter):
         """fifo worker instance process"""
         with Connection(self.base_connection):
-            q = Queue(queue)
+            # one queue per priority, highest first
+            queues = [Queue(name) for name in fifo_queue_names(queue)]
+            queue_weights = None
+            if config.fifo_priority_mode == "weighted":
+                queue_weights = {fifo_queue_name(queue, priority): weight
+                                 for priority, weight in config.fifo_priority_weights.items()}
             u_uid = uuid.uuid4()
             worker_name = f"{queue}_{counter}_{u_uid}"
-            worker = Worker(q, name=worker_name)
+            device_semaphore = None
+            if config.fifo_device_max_sessions > 0:
+                device_semaphore = DeviceSemaphore(self.base_connection, config)
+            preload_drivers()
+            worker = worker_class(config.worker_mode)(queues, name=worker_name, queue_weights=queue_weights,
+                                                      device_semaphore=device_semaphore)
             worker.work()
 
     def worker_cleanup(self):
         """cleans up jobs on container shutdown """
         # clear the pinned db store for capacity mgmt
-        r = self.base_connection.get(config.redis_pinned_store)
-        rjson = json.loads(r)
-        idex = 0
         hstname = socket.gethostname()
-        for container in rjson:
-            if container["hostname"] == f"{hstname}":
-                rjson.pop(idex)
-                self.base_connection.set(config.redis_pinned_store, json.dumps(rjson))
-                break
-            idex += 1
+        self.pinned_store.remove(hstname)
         # purge all workers still running on this container
         workers = Worker.all(connection=self.base_connection)
         for worker in workers:
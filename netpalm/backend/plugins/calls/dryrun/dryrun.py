@@ -1,3 +1,4 @@
+from netpalm.backend.core.utilities.device_sessions import device_sessions
 from netpalm.backend.core.utilities.rediz_meta import render_netpalm_payload
 from netpalm.backend.core.utilities.rediz_meta import write_meta_error
 from netpalm.backend.plugins.drivers.napalm.napalm_drvr import naplm
@@ -28,9 +29,8 @@ def dryrun(**kwargs):
         result = {}
         if lib == "napalm":
             napl = naplm(**kwargs)
-            sesh = napl.connect()
-            result = napl.config(session=sesh, command=config, dry_run=True)
-            napl.logout(sesh)
+            with device_sessions.session("napalm", napl) as sesh:
+                result = napl.config(session=sesh, command=config, dry_run=True)
         elif lib == "ncclient":
             # if we rendered j2config, add it to the kwargs['args'] dict
             if j2conf and config:
@@ -38,14 +38,12 @@ def dryrun(**kwargs):
                     kwargs['args'] = {}
                 kwargs['args']['config'] = config
             ncc = ncclien(**kwargs)
-            sesh = ncc.connect()
-            result = ncc.editconfig(session=sesh, dry_run=True)
-            ncc.logout(sesh)
+            with device_sessions.session("ncclient", ncc) as sesh:
+                result = ncc.editconfig(session=sesh, dry_run=True)
         elif lib == "netmiko":
             netmik = netmko(**kwargs)
-            sesh = netmik.connect()
-            result = netmik.config(sesh, config, enable_mode, dry_run=True)
-            netmik.logout(sesh)
+            with device_sessions.session("netmiko", netmik) as sesh:
+                result = netmik.config(sesh, config, enable_mode, dry_run=True)
     except Exception as e:
         write_meta_error(f"{e}")
 
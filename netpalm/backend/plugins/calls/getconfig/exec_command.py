@@ -1,5 +1,6 @@
 import logging
 
+from netpalm.backend.core.utilities.device_sessions import device_sessions
 from netpalm.backend.core.utilities.rediz_meta import render_netpalm_payload
 from netpalm.backend.core.utilities.rediz_meta import write_meta_error
 from netpalm.backend.plugins.drivers.napalm.napalm_drvr import naplm
@@ -32,29 +33,24 @@ def exec_command(**kwargs):
             result = {}
             if lib == "netmiko":
                 netmik = netmko(**kwargs)
-                sesh = netmik.connect()
-                result = netmik.sendcommand(sesh, commandlst)
-                netmik.logout(sesh)
+                with device_sessions.session("netmiko", netmik) as sesh:
+                    result = netmik.sendcommand(sesh, commandlst)
             elif lib == "napalm":
                 napl = naplm(**kwargs)
-                sesh = napl.connect()
-                result = napl.sendcommand(sesh, commandlst)
-                napl.logout(sesh)
+                with device_sessions.session("napalm", napl) as sesh:
+                    result = napl.sendcommand(sesh, commandlst)
             elif lib == "puresnmp":
                 snm = pursnmp(**kwargs)
-                sesh = snm.connect()
-                result = snm.sendcommand(sesh, commandlst)
-                snm.logout(sesh)
+                with device_sessions.session("puresnmp", snm) as sesh:
+                    result = snm.sendcommand(sesh, commandlst)
             elif lib == "ncclient":
                 ncc = ncclien(**kwargs)
-                sesh = ncc.connect()
-                result = ncc.getconfig(sesh)
-                ncc.logout(sesh)
+                with device_sessions.session("ncclient", ncc) as sesh:
+                    result = ncc.getconfig(sesh)
             elif lib == "restconf":
                 rc = restconf(**kwargs)
-                sesh = rc.connect()
-                result = rc.sendcommand(sesh)
-                rc.logout(sesh)
+                with device_sessions.session("restconf", rc) as sesh:
+                    result = rc.sendcommand(sesh)
             else:
                 raise NotImplementedError(f"unknown 'library' parameter {lib}")
         except Exception as e:
@@ -65,44 +61,40 @@ def exec_command(**kwargs):
             result = {}
             if lib == "netmiko":
                 netmik = netmko(**kwargs)
-                sesh = netmik.connect()
-                if commandlst:
-                    result = netmik.sendcommand(sesh, commandlst)
-                if post_checks:
-                    for postcheck in post_checks:
-                        command = postcheck["get_config_args"]["command"]
-                        post_check_result = netmik.sendcommand(sesh, [command])
-                        for matchstr in postcheck["match_str"]:
-                            if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
-                                write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
-                            if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
-                                write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
-                netmik.logout(sesh)
+                with device_sessions.session("netmiko", netmik) as sesh:
+                    if commandlst:
+                        result = netmik.sendcommand(sesh, commandlst)
+                    if post_checks:
+                        for postcheck in post_checks:
+                            command = postcheck["get_config_args"]["command"]
+                            post_check_result = netmik.sendcommand(sesh, [command])
+                            for matchstr in postcheck["match_str"]:
+                                if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
+                                    write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
+                                if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
+                                    write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
             elif lib == "napalm":
                 napl = naplm(**kwargs)
-                sesh = napl.connect()
-                if commandlst:
-                    result = napl.sendcommand(sesh, commandlst)
-                if post_checks:
-                    for postcheck in post_checks:
-                        command = postcheck["get_config_args"]["command"]
-                        post_check_result = napl.sendcommand(sesh, [command])
-                        for matchstr in postcheck["match_str"]:
-                            if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
-                                write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
-                            if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
-                                write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
-                napl.logout(sesh)
+                with device_sessions.session("napalm", napl) as sesh:
+                    if commandlst:
+                        result = napl.sendcommand(sesh, commandlst)
+                    if post_checks:
+                        for postcheck in post_checks:
+                            command = postcheck["get_config_args"]["command"]
+                            post_check_result = napl.sendcommand(sesh, [command])
+                            for matchstr in postcheck["match_str"]:
+                                if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
+                                    write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
+                                if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
+                                    write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
             elif lib == "ncclient":
                 ncc = ncclien(**kwargs)
-                sesh = ncc.connect()
-                result = ncc.getconfig(sesh)
-                ncc.logout(sesh)
+                with device_sessions.session("ncclient", ncc) as sesh:
+                    result = ncc.getconfig(sesh)
             elif lib == "restconf":
                 rc = restconf(**kwargs)
-                sesh = rc.connect()
-                result = rc.sendcommand(sesh)
-                rc.logout(sesh)
+                with device_sessions.session("restconf", rc) as sesh:
+                    result = rc.sendcommand(sesh)
         except Exception as e:
             write_meta_error(f"{e}")
 
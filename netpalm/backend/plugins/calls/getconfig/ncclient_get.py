@@ -1,5 +1,6 @@
 import logging
 
+from netpalm.backend.core.utilities.device_sessions import device_sessions
 from netpalm.backend.core.utilities.rediz_meta import write_meta_error
 from netpalm.backend.plugins.drivers.ncclient.ncclient_drvr import ncclien
 
@@ -17,9 +18,8 @@ def ncclient_get(**kwargs):
         result = {}
         if lib == "ncclient":
             ncc = ncclien(**kwargs)
-            sesh = ncc.connect()
-            result = ncc.getmethod(sesh)
-            ncc.logout(sesh)
+            with device_sessions.session("ncclient", ncc) as sesh:
+                result = ncc.getmethod(sesh)
         else:
             raise NotImplementedError(f"unknown 'library' parameter {lib}")
     except Exception as e:
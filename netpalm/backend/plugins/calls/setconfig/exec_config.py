@@ -1,3 +1,4 @@
+from netpalm.backend.core.utilities.device_sessions import device_sessions
 from netpalm.backend.core.utilities.rediz_meta import write_meta_error, render_netpalm_payload
 from netpalm.backend.plugins.drivers.napalm.napalm_drvr import naplm
 from netpalm.backend.plugins.drivers.ncclient.ncclient_drvr import ncclien
@@ -33,14 +34,12 @@ def exec_config(**kwargs):
         try:
             if lib == "netmiko":
                 netmik = netmko(**kwargs)
-                sesh = netmik.connect()
-                result = netmik.config(sesh, config, enable_mode)
-                netmik.logout(sesh)
+                with device_sessions.session("netmiko", netmik) as sesh:
+                    result = netmik.config(sesh, config, enable_mode)
             elif lib == "napalm":
                 napl = naplm(**kwargs)
-                sesh = napl.connect()
-                result = napl.config(sesh, config)
-                napl.logout(sesh)
+                with device_sessions.session("napalm", napl) as sesh:
+                    result = napl.config(sesh, config)
             elif lib == "ncclient":
                 # if we rendered j2config, add it to the kwargs['args'] dict
                 if j2conf and config:
@@ -48,14 +47,12 @@ def exec_config(**kwargs):
                         kwargs['args'] = {}
                     kwargs['args']['config'] = config
                 ncc = ncclien(**kwargs)
-                sesh = ncc.connect()
-                result = ncc.editconfig(sesh)
-                ncc.logout(sesh)
+                with device_sessions.session("ncclient", ncc) as sesh:
+                    result = ncc.editconfig(sesh)
             elif lib == "restconf":
                 rcc = restconf(**kwargs)
-                sesh = rcc.connect()
-                result = rcc.config(sesh)
-                rcc.logout(sesh)
+                with device_sessions.session("restconf", rcc) as sesh:
+                    result = rcc.config(sesh)
         except Exception as e:
             write_meta_error(f"{e}")
 
@@ -63,68 +60,66 @@ def exec_config(**kwargs):
         try:
             if lib == "netmiko":
                 netmik = netmko(**kwargs)
-                sesh = netmik.connect()
-                if pre_checks:
-                    for precheck in pre_checks:
-                        command = precheck["get_config_args"]["command"]
-                        pre_check_result = netmik.sendcommand(sesh, [command])
-                        for matchstr in precheck["match_str"]:
-                            if precheck["match_type"] == "include" and matchstr not in str(pre_check_result):
-                                write_meta_error(f"PreCheck Failed: {matchstr} not found in {pre_check_result}")
-                                pre_check_ok = False
-                            if precheck["match_type"] == "exclude" and matchstr in str(pre_check_result):
-                                write_meta_error(f"PreCheck Failed: {matchstr} found in {pre_check_result}")
-                                pre_check_ok = False
-                if pre_check_ok:
-                    result = netmik.config(sesh, config, enable_mode)
-                    if post_checks:
-                        for postcheck in post_checks:
-                            command = postcheck["get_config_args"]["command"]
-                            post_check_result = netmik.sendcommand(sesh, [command])
-                            for matchstr in postcheck["match_str"]:
-                                if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
-                                    write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
-                                if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
-                                    write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
-                netmik.logout(sesh)
+                with device_sessions.session("netmiko", netmik) as sesh:
+                    if pre_checks:
+                        for precheck in pre_checks:
+                            command = precheck["get_config_args"]["command"]
+                            pre_check_result = netmik.sendcommand(sesh, [command])
+                            for matchstr in precheck["match_str"]:
+                                if precheck["match_type"] == "include" and matchstr not in str(pre_check_result):
+                                    write_meta_error(f"PreCheck Failed: {matchstr} not found in {pre_check_result}")
+                                    pre_check_ok = False
+                                if precheck["match_type"] == "exclude" and matchstr in str(pre_check_result):
+                                    write_meta_error(f"PreCheck Failed: {matchstr} found in {pre_check_result}")
+                                    pre_check_ok = False
+                    if pre_check_ok:
+                        result = netmik.config(sesh, config, enable_mode)
+                        if post_checks:
+                            for postcheck in post_checks:
+                                command = postcheck["get_config_args"]["command"]
+                                post_check_result = netmik.sendcommand(sesh, [command])
+                                for matchstr in postcheck["match_str"]:
+                                    if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
+                                        write_meta_error(
+                                            f"PostCheck Failed: {matchstr} not found in {post_check_result}")
+                                    if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
+                                        write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
 
             elif lib == "napalm":
                 napl = naplm(**kwargs)
-                sesh = napl.connect()
-                if pre_checks:
-                    for precheck in pre_checks:
-                        command = precheck["get_config_args"]["command"]
-                        pre_check_result = napl.sendcommand(sesh, [command])
-                        for matchstr in precheck["match_str"]:
-                            if precheck["match_type"] == "include" and matchstr not in str(pre_check_result):
-                                write_meta_error(f"PreCheck Failed: {matchstr} not found in {pre_check_result}")
-                                pre_check_ok = False
-                            if precheck["match_type"] == "exclude" and matchstr in str(pre_check_result):
-                                write_meta_error(f"PreCheck Failed: {matchstr} found in {pre_check_result}")
-                                pre_check_ok = False
-                if pre_check_ok:
-                    result = napl.config(sesh,config)
-                    if post_checks:
-                        for postcheck in post_checks:
-                            command = postcheck["get_config_args"]["command"]
-                            post_check_result = napl.sendcommand(sesh, [command])
-                            for matchstr in postcheck["match_str"]:
-                                if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
-                                    write_meta_error(f"PostCheck Failed: {matchstr} not found in {post_check_result}")
-                                if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
-                                    write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
-                napl.logout(sesh)
+                with device_sessions.session("napalm", napl) as sesh:
+                    if pre_checks:
+                        for precheck in pre_checks:
+                            command = precheck["get_config_args"]["command"]
+                            pre_check_result = napl.sendcommand(sesh, [command])
+                            for matchstr in precheck["match_str"]:
+                                if precheck["match_type"] == "include" and matchstr not in str(pre_check_result):
+                                    write_meta_error(f"PreCheck Failed: {matchstr} not found in {pre_check_result}")
+                                    pre_check_ok = False
+                                if precheck["match_type"] == "exclude" and matchstr in str(pre_check_result):
+                                    write_meta_error(f"PreCheck Failed: {matchstr} found in {pre_check_result}")
+                                    pre_check_ok = False
+                    if pre_check_ok:
+                        result = napl.config(sesh,config)
+                        if post_checks:
+                            for postcheck in post_checks:
+                                command = postcheck["get_config_args"]["command"]
+                                post_check_result = napl.sendcommand(sesh, [command])
+                                for matchstr in postcheck["match_str"]:
+                                    if postcheck["match_type"] == "include" and matchstr not in str(post_check_result):
+                                        write_meta_error(
+                                            f"PostCheck Failed: {matchstr} not found in {post_check_result}")
+                                    if postcheck["match_type"] == "exclude" and matchstr in str(post_check_result):
+                                        write_meta_error(f"PostCheck Failed: {matchstr} found in {post_check_result}")
 
             elif lib == "ncclient":
                 ncc = ncclien(**kwargs)
-                sesh = ncc.connect()
-                result = ncc.editconfig(sesh)
-                ncc.logout(sesh)
+                with device_sessions.session("ncclient", ncc) as sesh:
+                    result = ncc.editconfig(sesh)
             elif lib == "restconf":
                 rcc = restconf(**kwargs)
-                sesh = rcc.connect()
-                result = rcc.config(sesh)
-                rcc.logout(sesh)
+                with device_sessions.session("restconf", rcc) as sesh:
+                    result = rcc.config(sesh)
         except Exception as e:
             write_meta_error(f"{e}")        
 
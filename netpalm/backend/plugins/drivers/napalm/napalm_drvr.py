@@ -17,6 +17,7 @@ class naplm:
         try:
             driver = napalm.get_network_driver(self.driver)
             napalmses = driver(**self.connection_args)
+            napalmses.open()
             return napalmses
         except Exception as e:
             write_meta_error(f"{e}")
@@ -24,7 +25,6 @@ class naplm:
     def sendcommand(self, session=False, command=False):
         try:
             result = {}
-            session.open()
             for c in command:
                 if hasattr(session, str(c)):
                     response = getattr(session, str(c))()
@@ -44,7 +44,6 @@ class naplm:
                     napalmconfig += comm + "\n"
             else:
                 napalmconfig = command
-            session.open()
             session.load_merge_candidate(config=napalmconfig)
             diff = session.compare_config()
             if dry_run:
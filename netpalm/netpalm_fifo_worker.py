@@ -10,6 +10,7 @@ from rq import Queue, Connection, Worker
 
 from .backend.core.confload.confload import config
 from .netpalm_worker_common import start_broadcast_listener_process
+from .backend.core.utilities.rediz_fifo_autoscaler import FifoAutoscaler
 from .backend.core.utilities.rediz_worker_controller import WorkerRediz
 
 config.setup_logging(max_debug=True)
@@ -23,9 +24,19 @@ def fifo_worker(queue, counter):
         return e
 
 
+def fifo_worker_process(queue, counter):
+    p = Process(target=fifo_worker, args=(queue, counter,))
+    p.start()
+    return p
+
+
 def fifo_worker_constructor(queue):
     try:
         start_broadcast_listener_process()
+        if config.fifo_autoscale:
+            autoscaler = FifoAutoscaler(queue, spawn=lambda counter: fifo_worker_process(queue, counter),
+                                        base_connection=WorkerRediz().base_connection)
+            autoscaler.run()
         for i in range(config.fifo_process_per_node):
             p = Process(target=fifo_worker, args=(queue, i,))
             p.start()
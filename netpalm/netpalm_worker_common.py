@@ -161,6 +161,11 @@ def handle_delete_universal_template(**kwargs):
     log.info(f"Result: {result['data']}")
 
 
+def handle_cache_invalidate(**kwargs):
+    # only controller processes keep a local result cache, they listen for these themselves
+    log.debug(f"handle_cache_invalidate(): got {kwargs}")
+
+
 def handle_broadcast_message(broadcast_msg: typing.Dict):
     try:
         msg_bytes = broadcast_msg["data"]
@@ -185,6 +190,7 @@ def handle_broadcast_message(broadcast_msg: typing.Dict):
         "ping": handle_ping,
         "process_update_log": update_log_processor.process_log,
         "kill_worker_pid": kill_worker_pid,
+        "cache_invalidate": handle_cache_invalidate,
     }
     msg_type = data["type"]
     if msg_type not in handlers:
@@ -4,26 +4,26 @@ from fastapi import APIRouter
 from fastapi.encoders import jsonable_encoder
 
 # load models
-from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.models.models import GetConfig, BulkGetConfig
 from netpalm.backend.core.models.napalm import NapalmGetConfig
 from netpalm.backend.core.models.ncclient import NcclientGet
 from netpalm.backend.core.models.ncclient import NcclientGetConfig
 from netpalm.backend.core.models.netmiko import NetmikoGetConfig
 from netpalm.backend.core.models.puresnmp import PureSNMPGetConfig
 from netpalm.backend.core.models.restconf import Restconf
-from netpalm.backend.core.models.task import Response
-from netpalm.backend.core.redis import reds
-from netpalm.routers.route_utils import error_handle_w_cache, whitelist
+from netpalm.backend.core.models.task import Response, BulkResponse
+from netpalm.backend.core.redis import reds, areds
+from netpalm.routers.route_utils import error_handle_w_cache, whitelist, HttpErrorHandler, bulk_kwargs, request_dict
 
 log = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _get_config(getcfg: GetConfig, library: str = None):
-    req_data = getcfg.dict(exclude_none=True)
+async def _get_config(getcfg: GetConfig, library: str = None):
+    req_data = request_dict(getcfg, exclude_none=True)
     if library is not None:
         req_data["library"] = library
-    r = reds.execute_task(method="getconfig", kwargs=req_data)
+    r = await areds.execute_task(method="getconfig", kwargs=req_data)
     resp = jsonable_encoder(r)
     return resp
 
@@ -32,40 +32,50 @@ def _get_config(getcfg: GetConfig, library: str = None):
 @router.post("/getconfig", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config(getcfg: GetConfig):
-    return _get_config(getcfg)
+async def get_config(getcfg: GetConfig):
+    return await _get_config(getcfg)
+
+
+# read config from many devices at once
+@router.post("/getconfig/bulk", response_model=BulkResponse, status_code=201)
+@HttpErrorHandler()
+@whitelist
+def get_config_bulk(getcfg: BulkGetConfig):
+    r = reds.execute_bulk_task(method="getconfig", kwargs_list=bulk_kwargs(getcfg))
+    resp = jsonable_encoder(r)
+    return resp
 
 
 # read config
 @router.post("/getconfig/netmiko", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config_netmiko(getcfg: NetmikoGetConfig):
-    return _get_config(getcfg, library="netmiko")
+async def get_config_netmiko(getcfg: NetmikoGetConfig):
+    return await _get_config(getcfg, library="netmiko")
 
 
 # read config
 @router.post("/getconfig/napalm", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config_napalm(getcfg: NapalmGetConfig):
-    return _get_config(getcfg, library="napalm")
+async def get_config_napalm(getcfg: NapalmGetConfig):
+    return await _get_config(getcfg, library="napalm")
 
 
 # read config
 @router.post("/getconfig/puresnmp", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config_puresnmp(getcfg: PureSNMPGetConfig):
-    return _get_config(getcfg, library="puresnmp")
+async def get_config_puresnmp(getcfg: PureSNMPGetConfig):
+    return await _get_config(getcfg, library="puresnmp")
 
 
 # read config
 @router.post("/getconfig/ncclient", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config_ncclient(getcfg: NcclientGetConfig):
-    return _get_config(getcfg, library="ncclient")
+async def get_config_ncclient(getcfg: NcclientGetConfig):
+    return await _get_config(getcfg, library="ncclient")
 
 
 # ncclient Manager.get() rpc call
@@ -76,11 +86,11 @@ def get_config_ncclient(getcfg: NcclientGetConfig):
              status_code=201)
 @error_handle_w_cache
 @whitelist
-def ncclient_get(getcfg: NcclientGet, library: str = "ncclient"):
-    req_data = getcfg.dict(exclude_none=True)
+async def ncclient_get(getcfg: NcclientGet, library: str = "ncclient"):
+    req_data = request_dict(getcfg, exclude_none=True)
     if library is not None:
         req_data["library"] = library
-    r = reds.execute_task(method="ncclient_get", kwargs=req_data)
+    r = await areds.execute_task(method="ncclient_get", kwargs=req_data)
     resp = jsonable_encoder(r)
     return resp
 
@@ -89,5 +99,5 @@ def ncclient_get(getcfg: NcclientGet, library: str = "ncclient"):
 @router.post("/getconfig/restconf", response_model=Response, status_code=201)
 @error_handle_w_cache
 @whitelist
-def get_config_restconf(getcfg: Restconf):
-    return _get_config(getcfg, library="restconf")
+async def get_config_restconf(getcfg: Restconf):
+    return await _get_config(getcfg, library="restconf")
@@ -4,21 +4,31 @@ import hashlib
 import json
 import logging
 from contextlib import contextmanager
-from copy import deepcopy
+from contextvars import ContextVar
 from enum import Enum
 from functools import wraps
 from itertools import chain
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException
 from pydantic import BaseModel
 
 from netpalm.backend.core.confload.confload import config
 from netpalm.backend.core.models.transaction_log import TransactionLogEntryType
-from netpalm.backend.core.redis import reds
+from netpalm.backend.core.redis import reds, areds
+from netpalm.backend.core.redis.rediz import cache_set_kwargs, cache_target, cache_target_for, response_task_id
 
 log = logging.getLogger(__name__)
 
+# the model a cacheable or poisoning route was called with and its dict(), so the request is only dumped once
+request_data: ContextVar[Optional[Tuple[BaseModel, Dict]]] = ContextVar("request_data", default=None)
+
+# background refreshes of stale cache entries, held so they aren't garbage collected mid flight
+_refreshes = set()
+
+# request fields that don't change what the request returns, so they're left out of its cache key
+CACHE_KEY_EXCLUDED = frozenset({"cache", "queue_strategy", "priority"})
+
 
 class SyncAsyncDecoratorFactory:
     """Courtesy of StackOverflow & Github user https://gist.github.com/anatoly-kussul
@@ -50,7 +60,7 @@ class HttpErrorHandler(SyncAsyncDecoratorFactory):
     def wrapper(self, *args, **kwargs):
         try:
             yield
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, HTTPException):
             raise
         except Exception as e:
             import traceback
@@ -63,6 +73,38 @@ class HttpErrorHandler(SyncAsyncDecoratorFactory):
             # raise HTTPException(status_code=500, detail=str(e).split("\n"))
 
 
+@contextmanager
+def dumped_request(args, kwargs):
+    """dumps the route's model once per request for cacheable_model and poison_host_cache, the route and the
+    decorators under them reuse it via request_dict"""
+    model = first_model(args, kwargs)
+    req_data = model.dict()
+    token = request_data.set((model, req_data))
+    try:
+        yield req_data
+    finally:
+        request_data.reset(token)
+
+
+def request_dict(model: BaseModel, exclude_none: bool = False) -> dict:
+    """model.dict(), taken from the dump already made of this request when there is one"""
+    dumped = request_data.get()
+    req_data = dumped[1] if dumped is not None and dumped[0] is model else model.dict()
+    return without_none(model, req_data) if exclude_none else req_data
+
+
+def without_none(value, data):
+    """what value.dict(exclude_none=True) returns, given data=value.dict(). like pydantic, only None model fields are
+    left out, None values in plain dicts and lists are kept"""
+    if isinstance(value, BaseModel):
+        return {key: without_none(getattr(value, key), item) for key, item in data.items() if item is not None}
+    if isinstance(value, dict):
+        return {key: without_none(value[key], item) for key, item in data.items()}
+    if isinstance(value, (list, tuple)):
+        return type(data)(without_none(element, item) for element, item in zip(value, data))
+    return data
+
+
 def cache_key_from_model(model: BaseModel) -> str:
     req_data = model.dict()
     return cache_key_from_req_data(req_data)
@@ -111,6 +153,29 @@ def serialized_for_hash(obj) -> str:
     raise NotImplementedError(f"Somehow {obj!r} broke this function")
 
 
+def canonical_default(obj):
+    """encodes what json can't for canonical_json"""
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=canonical_json)
+    log.error(f"attempting to serialize {obj!r} but it's {type(obj)=}.  Defaulting to generic repr."
+              f"This might result in bad cache performance")
+    return repr(obj)
+
+
+def canonical_json(obj) -> str:
+    """Serialize obj in a single pass, the same for equal objects in any process: dict keys and sets are sorted,
+    str enums encode as their value and tuples as lists"""
+    try:
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=canonical_default)
+    except TypeError:
+        # dict keys json can't sort, like a mix of ints and strings
+        return serialized_for_hash(obj)
+
+
 def cache_key_from_req_data(req_data: dict, unsafe_logging: bool = False) -> str:
     """WARNING: unsafe_logging=True can dump plaintext passwords into logs!"""
 
@@ -125,86 +190,217 @@ def cache_key_from_req_data(req_data: dict, unsafe_logging: bool = False) -> str
                 command = value
                 break
 
-    req_data = deepcopy(req_data)
-    for key in ["cache", "queue_strategy"]:
-        try:
-            req_data.pop(key)
-        except KeyError:
-            pass
+    # a shallow copy is enough, nothing below modifies the request
+    req_data = {key: value for key, value in req_data.items() if key not in CACHE_KEY_EXCLUDED}
 
     if unsafe_logging:
         log.info(f"attempting to hash {req_data!r}")
 
-    cache_key = serialized_for_hash(req_data)
+    cache_key = canonical_json(req_data)
     if unsafe_logging:
         log.info(f"got: {cache_key!r}")
 
-    m = hashlib.sha256()
-    m.update(cache_key.encode("utf-8"))
-    hash = m.hexdigest()
+    hash = hashlib.sha256(cache_key.encode("utf-8")).hexdigest()
     log.info(f"hashed key: {hash}")
 
     cache_key = f'{host}:{port}:{command}:{hash}'
     return cache_key
 
 
-def poison_host_cache(f):
-    """THIS IS PROBABLY NOT ASYNC SAFE YET"""
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        model = [
-            item for item in chain(args, kwargs.values())
-            if isinstance(item, BaseModel)
-        ][0]  # only take first model found because any more than that doesn't make sense
-        req_data = model.dict()
-
-        cache_key = cache_key_from_req_data(req_data)
-        reds.clear_cache_for_host(cache_key)
-        return f(*args, **kwargs)
+def first_model(args, kwargs) -> BaseModel:
+    """only take first model found because any more than that doesn't make sense"""
+    return [
+        item for item in chain(args, kwargs.values())
+        if isinstance(item, BaseModel)
+    ][0]
 
-    return wrapper
 
+def poisoned_cache_keys(req_data: dict) -> List[str]:
+    if isinstance(req_data["connection_args"], list):  # bulk requests touch many hosts
+        return [
+            f'{connection_args.get("host")}:{connection_args.get("port")}:'
+            for connection_args in req_data["connection_args"]
+        ]
+    return [cache_key_from_req_data(req_data)]
 
-def cacheable_model(f):
-    """THIS IS PROBABLY NOT ASYNC SAFE YET
-    Cache results according to global and per-request cache config.
-    ONLY APPLICABLE TO ROUTES WITH DEFINED MODELS THAT INCLUDE CACHE CONFIG"""
+
+def poison_host_cache(f):
+    """clears the cache for every host in the request before running the route, works on sync and async routes"""
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_wrapper(*args, **kwargs):
+            with dumped_request(args, kwargs) as req_data:
+                for cache_key in poisoned_cache_keys(req_data):
+                    await areds.clear_cache_for_host(cache_key)
+                return await f(*args, **kwargs)
+
+        return async_wrapper
 
     @wraps(f)
     def wrapper(*args, **kwargs):
-        model = [
-            item for item in chain(args, kwargs.values())
-            if isinstance(item, BaseModel)
-        ][0]  # only take first model found because any more than that doesn't make sense
+        with dumped_request(args, kwargs) as req_data:
+            for cache_key in poisoned_cache_keys(req_data):
+                reds.clear_cache_for_host(cache_key)
+            return f(*args, **kwargs)
+
+    return wrapper
 
-        req_data = model.dict()
-        cache_config = req_data.get("cache", {})
-        cache_key = cache_key_from_req_data(req_data)
 
-        if poison := cache_config.get("poison"):
-            reds.clear_cache_for_host(cache_key)
+def stale_response(result):
+    """a copy of a cached response flagged as stale, the cached one may be shared by the local cache"""
+    if isinstance(result, dict) and isinstance(result.get("data"), dict):
+        return {**result, "data": {**result["data"], "stale": True}}
+    return result
 
-        if cacheable := cache_config.get("enabled") and not poison:
-            if cache_result := reds.cache.get(cache_key):
-                return cache_result
 
+def refresh_stale_entry(f, args, kwargs, cache_key: str, cache_config: dict):
+    """reruns a route whose cached response went stale, a queued task caches the new response itself"""
+    token = cache_target.set(cache_target_for(cache_key, cache_config))
+    try:
         result = f(*args, **kwargs)
+    except Exception as e:
+        # the refresh claim lapses on its own, so a broken device isn't retried on every request meanwhile
+        log.error(f"refreshing stale cache entry {cache_key} failed: {e}")
+        return
+    finally:
+        cache_target.reset(token)
+    if not response_task_id(result):
+        reds.cache.set(cache_key, result, **cache_set_kwargs(cache_config))
+
+
+async def async_refresh_stale_entry(f, args, kwargs, cache_key: str, cache_config: dict):
+    token = cache_target.set(cache_target_for(cache_key, cache_config))
+    try:
+        result = await f(*args, **kwargs)
+    except Exception as e:
+        log.error(f"refreshing stale cache entry {cache_key} failed: {e}")
+        return
+    finally:
+        cache_target.reset(token)
+    if not response_task_id(result):
+        await areds.cache.set(cache_key, result, **cache_set_kwargs(cache_config))
 
-        if cacheable:
-            if ttl := cache_config.get("ttl"):
-                ttl = min(int(ttl), int(config.redis_task_result_ttl))
-                cache_kwargs = {"timeout": ttl}
-            else:
-                cache_kwargs = {}
-            reds.cache.set(cache_key, result, **cache_kwargs)
 
-        return result
+def cacheable_model(f):
+    """Cache results according to global and per-request cache config, works on sync and async routes.
+    Identical requests arriving while the first is still in flight share its result instead of running again.
+    With a stale_ttl, an expired result is still returned for that long, flagged stale, while one request refreshes it.
+    ONLY APPLICABLE TO ROUTES WITH DEFINED MODELS THAT INCLUDE CACHE CONFIG"""
+
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_wrapper(*args, **kwargs):
+            with dumped_request(args, kwargs) as req_data:
+                cache_config = req_data.get("cache", {})
+                cache_key = cache_key_from_req_data(req_data)
+
+                if poison := cache_config.get("poison"):
+                    await areds.clear_cache_for_host(cache_key)
+
+                claimed = False
+                if cacheable := cache_config.get("enabled") and not poison:
+                    if areds.reds.cache_warmer is not None:
+                        areds.reds.cache_warmer.record_hit(cache_key)
+                    cache_result, stale = await areds.cache.get_entry(cache_key)
+                    if cache_result and stale:
+                        if await areds.cache.claim_refresh(cache_key, config.redis_task_timeout):
+                            refresh = asyncio.create_task(
+                                async_refresh_stale_entry(f, args, kwargs, cache_key, cache_config))
+                            _refreshes.add(refresh)
+                            refresh.add_done_callback(_refreshes.discard)
+                        return stale_response(cache_result)
+                    if cache_result:
+                        return cache_result
+                    if areds.inflight is not None:
+                        if not (claimed := await areds.inflight.claim(cache_key)):
+                            if (inflight_result := await areds.inflight.join(cache_key)) is not None:
+                                return inflight_result
+                            # whatever held the key finished or gave up, this request can lead the next flight
+                            claimed = await areds.inflight.claim(cache_key)
+
+                token = cache_target.set(cache_target_for(cache_key, cache_config)) if cacheable else None
+                try:
+                    result = await f(*args, **kwargs)
+                except BaseException:
+                    if claimed:
+                        await areds.inflight.drop(cache_key)
+                    raise
+                finally:
+                    if token is not None:
+                        cache_target.reset(token)
+
+                # a queued task caches its own result once the worker has it
+                if cacheable and not response_task_id(result):
+                    await areds.cache.set(cache_key, result, **cache_set_kwargs(cache_config))
+                if claimed:
+                    await areds.inflight.publish(cache_key, result)
+
+                return result
+
+        return async_wrapper
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with dumped_request(args, kwargs) as req_data:
+            cache_config = req_data.get("cache", {})
+            cache_key = cache_key_from_req_data(req_data)
+
+            if poison := cache_config.get("poison"):
+                reds.clear_cache_for_host(cache_key)
+
+            claimed = False
+            if cacheable := cache_config.get("enabled") and not poison:
+                if reds.cache_warmer is not None:
+                    reds.cache_warmer.record_hit(cache_key)
+                cache_result, stale = reds.cache.get_entry(cache_key)
+                if cache_result and stale:
+                    # sync routes only enqueue, so the refresh is cheap enough to run before answering
+                    if reds.cache.claim_refresh(cache_key, config.redis_task_timeout):
+                        refresh_stale_entry(f, args, kwargs, cache_key, cache_config)
+                    return stale_response(cache_result)
+                if cache_result:
+                    return cache_result
+                if reds.inflight is not None:
+                    if not (claimed := reds.inflight.claim(cache_key)):
+                        if (inflight_result := reds.inflight.join(cache_key)) is not None:
+                            return inflight_result
+                        # whatever held the key finished or gave up, this request can lead the next flight
+                        claimed = reds.inflight.claim(cache_key)
+
+            token = cache_target.set(cache_target_for(cache_key, cache_config)) if cacheable else None
+            try:
+                result = f(*args, **kwargs)
+            except BaseException:
+                if claimed:
+                    reds.inflight.drop(cache_key)
+                raise
+            finally:
+                if token is not None:
+                    cache_target.reset(token)
+
+            # a queued task caches its own result once the worker has it
+            if cacheable and not response_task_id(result):
+                reds.cache.set(cache_key, result, **cache_set_kwargs(cache_config))
+            if claimed:
+                reds.inflight.publish(cache_key, result)
+
+            return result
 
     return wrapper
 
 
 def error_handle_w_cache(f):
-    """THIS IS PROBABLY NOT ASYNC SAFE YET"""
+    """HttpErrorHandler + cacheable_model, works on sync and async routes"""
+
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        @HttpErrorHandler()
+        @cacheable_model
+        async def async_wrapper(*args, **kwargs):
+            log.info(f"{args=}, {kwargs=}")
+            return await f(*args, **kwargs)
+
+        return async_wrapper
 
     @wraps(f)
     @HttpErrorHandler()
@@ -216,6 +412,23 @@ def error_handle_w_cache(f):
     return wrapper
 
 
+def bulk_kwargs(model: BaseModel) -> List[Dict]:
+    """expands a bulk request into one task payload per entry in connection_args"""
+    req_data = request_dict(model, exclude_none=True)
+    connection_args_list = req_data.pop("connection_args")
+    if req_data.get("queue_strategy") == "pinned":
+        # pinned tasks are queued by host, so one entry without a host fails the whole batch before any is queued
+        missing = [index for index, connection_args in enumerate(connection_args_list)
+                   if not connection_args.get("host")]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"pinned queue_strategy needs connection_args.host, "
+                                                        f"missing from entries {missing}")
+    return [
+        {**req_data, "connection_args": connection_args}
+        for connection_args in connection_args_list
+    ]
+
+
 def add_transaction_log_entry(entry_type: TransactionLogEntryType, data: Dict):
     log.debug(f"Adding {entry_type}: {data}")
     item_dict = {
@@ -231,19 +444,25 @@ def add_transaction_log_entry(entry_type: TransactionLogEntryType, data: Dict):
 
 
 def whitelist(f):
-    """THIS IS PROBABLY NOT ASYNC SAFE YET
+    """Works on sync and async routes.
     Only works on routes with a properly defined BaseModel that includes `connection_args`"""
 
     def get_hosts_and_ips(model: BaseModel) -> List[str]:
-        connection_args = model.dict()["connection_args"]
+        dumped = request_data.get()
+        if dumped is not None and dumped[0] is model:
+            connection_args_list = dumped[1]["connection_args"]
+        else:
+            connection_args_list = model.dict(include={"connection_args"})["connection_args"]
+        if isinstance(connection_args_list, dict):
+            connection_args_list = [connection_args_list]
         return [
             value
+            for connection_args in connection_args_list
             for key, value in connection_args.items()
             if (key in ["host", "ip"]) and (value is not None)
         ]
 
-    @wraps(f)
-    def wrapper(*args, **kwargs):
+    def check(args, kwargs):
         arg_list = list(args) + list(kwargs.values())
         try:
             model = [arg for arg in arg_list if isinstance(arg, BaseModel)][0]
@@ -257,6 +476,17 @@ def whitelist(f):
             raise HTTPException(status_code=403,
                                 detail=f"hosts in {hostnames} not permitted by whitelist: {config.whitelist.definition}")
 
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_wrapper(*args, **kwargs):
+            check(args, kwargs)
+            return await f(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        check(args, kwargs)
         return f(*args, **kwargs)
 
     return wrapper
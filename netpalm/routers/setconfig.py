@@ -4,24 +4,24 @@ from fastapi import APIRouter
 from fastapi.encoders import jsonable_encoder
 
 # load models
-from netpalm.backend.core.models.models import SetConfig
+from netpalm.backend.core.models.models import SetConfig, BulkSetConfig
 from netpalm.backend.core.models.napalm import NapalmSetConfig
 from netpalm.backend.core.models.ncclient import NcclientSetConfig
 from netpalm.backend.core.models.netmiko import NetmikoSetConfig
 from netpalm.backend.core.models.restconf import Restconf
-from netpalm.backend.core.models.task import Response
-from netpalm.backend.core.redis import reds
-from netpalm.routers.route_utils import HttpErrorHandler, poison_host_cache, whitelist
+from netpalm.backend.core.models.task import Response, BulkResponse
+from netpalm.backend.core.redis import reds, areds
+from netpalm.routers.route_utils import HttpErrorHandler, poison_host_cache, whitelist, bulk_kwargs, request_dict
 
 log = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _set_config(setcfg: SetConfig, library: str = None):
-    req_data = setcfg.dict(exclude_none=True)
+async def _set_config(setcfg: SetConfig, library: str = None):
+    req_data = request_dict(setcfg, exclude_none=True)
     if library is not None:
         req_data["library"] = library
-    r = reds.execute_task(method="setconfig", kwargs=req_data)
+    r = await areds.execute_task(method="setconfig", kwargs=req_data)
     resp = jsonable_encoder(r)
     return resp
 
@@ -31,17 +31,28 @@ def _set_config(setcfg: SetConfig, library: str = None):
 @HttpErrorHandler()
 @poison_host_cache
 @whitelist
-def set_config(setcfg: SetConfig):
-    return _set_config(setcfg)
+async def set_config(setcfg: SetConfig):
+    return await _set_config(setcfg)
+
+
+# deploy a configuration to many devices at once
+@router.post("/setconfig/bulk", response_model=BulkResponse, status_code=201)
+@HttpErrorHandler()
+@poison_host_cache
+@whitelist
+def set_config_bulk(setcfg: BulkSetConfig):
+    r = reds.execute_bulk_task(method="setconfig", kwargs_list=bulk_kwargs(setcfg))
+    resp = jsonable_encoder(r)
+    return resp
 
 
 # dry run a configuration
 @router.post("/setconfig/dry-run", response_model=Response, status_code=201)
 @HttpErrorHandler()
 @whitelist
-def set_config_dry_run(setcfg: SetConfig):
-    req_data = setcfg.dict(exclude_none=True)
-    r = reds.execute_task(method="dryrun", kwargs=req_data)
+async def set_config_dry_run(setcfg: SetConfig):
+    req_data = request_dict(setcfg, exclude_none=True)
+    r = await areds.execute_task(method="dryrun", kwargs=req_data)
     resp = jsonable_encoder(r)
     return resp
 
@@ -51,8 +62,8 @@ def set_config_dry_run(setcfg: SetConfig):
 @HttpErrorHandler()
 @poison_host_cache
 @whitelist
-def set_config_netmiko(setcfg: NetmikoSetConfig):
-    return _set_config(setcfg, library="netmiko")
+async def set_config_netmiko(setcfg: NetmikoSetConfig):
+    return await _set_config(setcfg, library="netmiko")
 
 
 # deploy a configuration
@@ -60,8 +71,8 @@ def set_config_netmiko(setcfg: NetmikoSetConfig):
 @HttpErrorHandler()
 @poison_host_cache
 @whitelist
-def set_config_napalm(setcfg: NapalmSetConfig):
-    return _set_config(setcfg, library="napalm")
+async def set_config_napalm(setcfg: NapalmSetConfig):
+    return await _set_config(setcfg, library="napalm")
 
 
 # deploy a configuration
@@ -69,8 +80,8 @@ def set_config_napalm(setcfg: NapalmSetConfig):
 @HttpErrorHandler()
 @poison_host_cache
 @whitelist
-def set_config_ncclient(setcfg: NcclientSetConfig):
-    return _set_config(setcfg, library="ncclient")
+async def set_config_ncclient(setcfg: NcclientSetConfig):
+    return await _set_config(setcfg, library="ncclient")
 
 
 # deploy a configuration
@@ -78,5 +89,5 @@ def set_config_ncclient(setcfg: NcclientSetConfig):
 @HttpErrorHandler()
 @poison_host_cache
 @whitelist
-def set_config_restconf(setcfg: Restconf):
-    return _set_config(setcfg, library="restconf")
+async def set_config_restconf(setcfg: Restconf):
+    return await _set_config(setcfg, library="restconf")
@@ -1,21 +1,24 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
+from starlette.responses import StreamingResponse
 
-from netpalm.backend.core.models.task import Response, WorkerResponse
+from netpalm.backend.core.models.task import Response, WorkerResponse, BulkResponse, TaskStatusRequest, \
+    TaskStatusResponse, TaskStatusEnum
 from netpalm.backend.core.models.models import PinnedStore
+from netpalm.backend.core.confload.confload import config
 
-from netpalm.backend.core.redis import reds
+from netpalm.backend.core.redis import reds, areds
 
 router = APIRouter()
 
 
 # get specific task
 @router.get("/task/{task_id}", response_model=Response)
-def get_task(task_id: str):
+async def get_task(task_id: str):
     try:
-        r = reds.fetchtask(task_id=task_id)
+        r = await areds.fetchtask(task_id=task_id)
         resp = jsonable_encoder(r)
         if not resp:
             raise HTTPException(status_code=404)
@@ -23,6 +26,49 @@ def get_task(task_id: str):
     except Exception as e:
         raise HTTPException(status_code=404)
 
+# wait for a specific task to finish
+@router.get("/task/{task_id}/wait", response_model=Response)
+async def wait_for_task(task_id: str,
+                        timeout: float = Query(30, ge=0, description="seconds to hold the request open, "
+                                                                     "capped at task_wait_max_timeout")):
+    timeout = min(timeout, config.task_wait_max_timeout)
+    r = await reds.task_events.wait(task_id, timeout, areds.fetchtask)
+    resp = jsonable_encoder(r)
+    if not resp:
+        raise HTTPException(status_code=404)
+    return resp
+
+
+# stream task lifecycle events as they happen
+@router.get("/tasks/events")
+async def stream_task_events(task_id: Optional[List[str]] = Query(None, description="only stream these tasks"),
+                             host: Optional[List[str]] = Query(None, description="only stream tasks for these hosts")):
+    events = reds.task_events.stream(task_ids=task_id, hosts=host, keepalive=config.task_events_keepalive)
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# get the status of many tasks at once
+@router.post("/tasks/status", response_model=TaskStatusResponse)
+def get_task_statuses(status_request: TaskStatusRequest):
+    try:
+        r = reds.fetch_task_statuses(task_ids=status_request.task_ids,
+                                     include_result=status_request.include_result)
+        resp = jsonable_encoder(r)
+        return resp
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e).split('\n'))
+
+
+# get the tasks submitted as part of a bulk request
+@router.get("/batch/{batch_id}", response_model=BulkResponse)
+def get_batch(batch_id: str):
+    r = reds.fetch_batch(batch_id=batch_id)
+    if not r:
+        raise HTTPException(status_code=404)
+    resp = jsonable_encoder(r)
+    return resp
+
+
 # get all tasks in queue
 @router.get("/taskqueue/")
 def get_task_list():
@@ -36,9 +82,13 @@ def get_task_list():
 
 # task view route for specific host
 @router.get("/taskqueue/{host}")
-def get_host_task_list(host: str):
+def get_host_task_list(host: str,
+                       status: Optional[List[TaskStatusEnum]] = Query(None, description="only list tasks in these states"),
+                       cursor: int = Query(0, ge=0, description="next_cursor from the previous page"),
+                       limit: int = Query(100, ge=1, le=1000)):
     try:
-        r = reds.getjobliststatus(q=host)
+        statuses = [s.value for s in status] if status else None
+        r = reds.getjobliststatus(q=host, statuses=statuses, cursor=cursor, limit=limit)
         resp = jsonable_encoder(r)
         if not resp:
             raise HTTPException(status_code=404)
@@ -79,6 +129,17 @@ def list_pinned_containers():
         raise HTTPException(status_code=500, detail=str(e).split('\n'))
 
 
+# get the fifo autoscaler state of every container
+@router.get("/containers/fifo/", response_model=List)
+def list_fifo_containers():
+    try:
+        r = reds.fetch_fifo_autoscaler_state()
+        resp = jsonable_encoder(r)
+        return resp
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e).split('\n'))
+
+
 # # purge the container a container from the db
 # @router.delete("/containers/pinned/{hostname}")
 # def purge_pinned_containers_from_db(hostname: str):
@@ -2,14 +2,16 @@ import json
 import logging
 from typing import Optional
 
-from fastapi import APIRouter, Query, Path
+from fastapi import APIRouter, HTTPException, Query, Path
 from fastapi.encoders import jsonable_encoder
 from starlette.responses import RedirectResponse
 
 # load config
 from netpalm.backend.core.confload.confload import config
+from netpalm.backend.core.models.models import GetConfig
 from netpalm.backend.core.redis import reds
-from netpalm.routers.route_utils import HttpErrorHandler
+from netpalm.backend.core.redis.connection import pool_stats
+from netpalm.routers.route_utils import HttpErrorHandler, cache_key_from_req_data, whitelist, without_none
 
 log = logging.getLogger(__name__)
 router = APIRouter()
@@ -69,16 +71,63 @@ def flush_cache_device(
 
 @router.get("/cache")
 @HttpErrorHandler()
-def list_cached_items():
+def list_cached_items(
+        cursor: Optional[int] = Query(None, title="Cursor",
+                                      description="page through the cache from here, start with 0. "
+                                                  "omit to list every key at once"),
+        limit: int = Query(100, title="Limit", description="roughly how many keys to return per page")
+):
     log.info(f"Getting cache info")
-    keys = reds.cache.keys()
-    rslt = {
-        "cache": keys,
-        "size": len(keys)
-    }
+    if cursor is None:
+        keys = reds.cache.keys()
+        rslt = {
+            "cache": keys,
+            "size": len(keys)
+        }
+    else:
+        next_cursor, keys = reds.cache.scan(cursor=cursor, count=limit)
+        rslt = {
+            "cache": keys,
+            "size": len(keys),
+            "next_cursor": next_cursor  # 0 once every key has been listed
+        }
+    if reds.cache_enabled and reds.local_cache is not None:
+        rslt["local"] = reds.local_cache.stats()
     return rslt
 
 
+# utility route - which cache entries are kept warm
+@router.get("/cache/warm")
+@HttpErrorHandler()
+def get_cache_warming():
+    if reds.cache_warmer is None:
+        return {"enabled": False}
+    return {"enabled": True, **reds.cache_warmer.status()}
+
+
+# utility route - keep a getconfig request's cache entry warm whether or not it's requested
+@router.post("/cache/warm", status_code=201)
+@HttpErrorHandler()
+@whitelist
+def pin_cache_warming(getcfg: GetConfig):
+    if reds.cache_warmer is None:
+        raise HTTPException(status_code=400, detail="cache warming is disabled")
+    req_data = getcfg.dict()
+    cache_key = cache_key_from_req_data(req_data)
+    reds.cache_warmer.pin(cache_key, "getconfig", without_none(getcfg, req_data), req_data["cache"])
+    return {"cache_key": cache_key}
+
+
+@router.delete("/cache/warm/{cache_key}")
+@HttpErrorHandler()
+def unpin_cache_warming(
+        cache_key: str = Path(..., title="The cache key to stop keeping warm")
+):
+    if reds.cache_warmer is None:
+        return {"unpinned": False}
+    return {"unpinned": reds.cache_warmer.unpin(cache_key)}
+
+
 @router.get("/cache/{cache_key}")
 @HttpErrorHandler()
 def get_cache_item(
@@ -93,3 +142,17 @@ def get_cache_item(
         cache_key: reds.cache.get(cache_key)
     }
     return rslt
+
+
+# utility route - how well large cached and stored results compress
+@router.get("/compression")
+@HttpErrorHandler()
+def get_compression_stats():
+    return reds.compressor.stats(reds.base_connection)
+
+
+# utility route - redis connection pool usage for this controller process
+@router.get("/redis-pool")
+@HttpErrorHandler()
+def get_redis_pool_stats():
+    return pool_stats()
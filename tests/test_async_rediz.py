@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from random import randint
+
+import pytest
+from rq import Queue, SimpleWorker
+from rq.job import Job
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.routers import route_utils
+from netpalm.routers.route_utils import cacheable_model, poison_host_cache, whitelist
+
+pytestmark = pytest.mark.nolab
+log = logging.getLogger(__name__)
+
+request = {
+    "library": "netmiko",
+    "connection_args": {
+        "device_type": "cisco_ios", "host": "10.0.2.33", "username": "admin", "password": "admin"
+    },
+    "command": "show run | i hostname",
+    "cache": {
+        "enabled": True,
+        "ttl": 300,
+        "poison": False
+    }
+}
+
+
+@pytest.fixture(scope="function")
+def redis_helpers(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_async_fifo_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    redis_helper.cache.clear()
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, config)
+    # the routers share the module level clients, the asyncio one must not outlive a test's event loop
+    monkeypatch.setattr(route_utils, "areds", async_redis_helper)
+    yield redis_helper, async_redis_helper
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def test_execute_task_matches_rq_enqueue(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+    r = asyncio.run(async_redis_helper.execute_task(method="getconfig", kwargs=request))
+    assert r["status"] == "success"
+    assert r["data"]["task_status"] == "queued"
+
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    assert queue.job_ids == [r["data"]["task_id"]]
+    assert queue.key.encode() in redis_helper.base_connection.smembers(Queue.redis_queues_keys)
+
+    job = Job.fetch(r["data"]["task_id"], connection=redis_helper.base_connection)
+    assert job.kwargs == request
+    assert job.func == redis_helper.routes["getconfig"]
+    assert job.origin == queue.name
+    assert job.description == queue.name
+    assert job.meta == redis_helper.get_redis_meta_template()
+    assert (job.ttl, job.result_ttl, job.timeout) == (redis_helper.ttl, redis_helper.task_result_ttl,
+                                                      redis_helper.timeout)
+    assert 0 < redis_helper.base_connection.ttl(job.key) <= redis_helper.ttl
+
+
+def test_fetchtask_renders_like_the_blocking_client(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    job = queue.enqueue("builtins.len", args=("abcd",), meta=redis_helper.get_redis_meta_template())
+    SimpleWorker(queue, connection=redis_helper.base_connection).work(burst=True)
+
+    async def fetch():
+        return await async_redis_helper.fetchtask(job.id), await async_redis_helper.fetchtask("no such task")
+
+    r, missing = asyncio.run(fetch())
+    expected = redis_helper.fetchtask(job.id)
+    assert r["data"]["task_status"] == expected["data"]["task_status"] == "finished"
+    assert r["data"]["task_result"] == expected["data"]["task_result"] == 4
+    assert r["data"]["task_meta"]["ended_at"] == expected["data"]["task_meta"]["ended_at"]
+    assert isinstance(missing, Exception)
+
+
+def test_cache_is_shared_with_the_blocking_client(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+
+    async def round_trip():
+        await async_redis_helper.cache.set("1.1.1.1:22:show run", {"data": "async"}, timeout=60)
+        redis_helper.cache.set("1.1.1.1:22:show ver", {"data": "sync"})
+        assert await async_redis_helper.cache.get("1.1.1.1:22:show ver") == {"data": "sync"}
+        assert redis_helper.cache.get("1.1.1.1:22:show run") == {"data": "async"}
+        assert await async_redis_helper.clear_cache_for_host("1.1.1.1:22:") == 2
+        assert redis_helper.cache.get("1.1.1.1:22:show run") is None
+
+    asyncio.run(round_trip())
+
+
+def test_async_route_decorators(redis_helpers):
+    @poison_host_cache
+    @whitelist
+    async def foo_set(*args, **kwargs):
+        return
+
+    @cacheable_model
+    @whitelist
+    async def foo_get(*args, **kwargs):
+        return randint(1, 10 ** 30)
+
+    assert asyncio.iscoroutinefunction(foo_set) and asyncio.iscoroutinefunction(foo_get)
+    model = GetConfig(**request)
+
+    async def run():
+        first_result = await foo_get(model)
+        assert await foo_get(model) == first_result  # cache is working
+        await foo_set(model.copy(update={"command": "something else entirely"}))
+        assert await foo_get(model) != first_result  # poisoned
+
+    asyncio.run(run())
+
+
+def test_send_broadcast(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+    pubsub = redis_helper.base_connection.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(redis_helper.config.redis_broadcast_q)
+    assert asyncio.run(async_redis_helper.send_broadcast("hello")) == {"result": "Message Sent"}
+    messages = [pubsub.get_message(timeout=0.1) for _ in range(10)]
+    assert [message["data"] for message in messages if message] == [b"hello"]
+
+
+def test_job_hash_matches_rq_enqueue_call(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    conn = redis_helper.base_connection
+    kwargs = {"connection_args": {"host": "10.0.2.33"}, "command": "show run"}
+    # what the blocking client enqueues, straight through rq
+    expected = queue.enqueue_call(func=redis_helper.routes["getconfig"], description=queue.name, ttl=redis_helper.ttl,
+                                  result_ttl=redis_helper.task_result_ttl, kwargs=kwargs,
+                                  meta=redis_helper.get_redis_meta_template(), timeout=redis_helper.timeout)
+    r = asyncio.run(async_redis_helper.sendtask(q=queue.name, exe="getconfig", kwargs=kwargs))
+    task_key = Job.key_for(r["data"]["task_id"])
+
+    timestamps = (b"created_at", b"enqueued_at")
+    expected_hash = {k: v for k, v in conn.hgetall(expected.key).items() if k not in timestamps}
+    assert {k: v for k, v in conn.hgetall(task_key).items() if k not in timestamps} == expected_hash
+    assert set(conn.hgetall(task_key)) == set(conn.hgetall(expected.key))
+    assert conn.ttl(task_key) == conn.ttl(expected.key)
+    assert queue.job_ids == [expected.id, r["data"]["task_id"]]
+
+
+@pytest.mark.benchmark
+def test_async_enqueue_outpaces_the_threadpool(redis_helpers):
+    redis_helper, async_redis_helper = redis_helpers
+    tasks = 500
+    kwargs = {**request, "cache": {"enabled": False}}
+
+    # the sync routes ran the blocking client on starlette's 40 threads
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        list(pool.map(lambda _: redis_helper.execute_task(method="getconfig", kwargs=kwargs), range(tasks)))
+    threaded = tasks / (time.perf_counter() - started)
+
+    async def enqueue():
+        await asyncio.gather(*[async_redis_helper.execute_task(method="getconfig", kwargs=kwargs)
+                               for _ in range(tasks)])
+
+    started = time.perf_counter()
+    asyncio.run(enqueue())
+    evented = tasks / (time.perf_counter() - started)
+    log.info(f"threadpool enqueue: {threaded:.1f} tasks/sec, asyncio enqueue: {evented:.1f} tasks/sec")
+    assert evented > threaded
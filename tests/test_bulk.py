@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from rq import Queue
+from rq.job import Job
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import BulkGetConfig
+from netpalm.backend.core.redis import rediz
+from netpalm.routers.route_utils import bulk_kwargs
+
+pytestmark = pytest.mark.nolab
+
+bulk_request = {
+    "library": "netmiko",
+    "connection_args": [
+        {"device_type": "cisco_ios", "host": f"10.0.2.{i}", "username": "admin", "password": "admin"}
+        for i in range(50)
+    ],
+    "command": "show run | i hostname",
+    "args": {"use_textfsm": True},
+    "queue_strategy": "fifo"
+}
+
+
+@pytest.fixture(scope="function")
+def bulk_redis_helper():
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_bulk_fifo_{uuid.uuid4()}"
+    config.redis_batch_store = f"test_bulk_batch_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    yield redis_helper
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def test_bulk_kwargs_shares_body():
+    kwargs_list = bulk_kwargs(BulkGetConfig(**bulk_request))
+    assert len(kwargs_list) == 50
+    for kw, connection_args in zip(kwargs_list, bulk_request["connection_args"]):
+        assert kw["connection_args"] == connection_args
+        assert kw["command"] == bulk_request["command"]
+        assert kw["args"] == bulk_request["args"]
+
+
+def test_pinned_entries_without_a_host_are_rejected(bulk_redis_helper: rediz.Rediz):
+    pinned_request = {**bulk_request, "queue_strategy": "pinned",
+                      "connection_args": [{"host": "10.0.2.1"}, {"device_type": "cisco_ios"}, {"host": ""}]}
+    with pytest.raises(HTTPException) as e:
+        bulk_kwargs(BulkGetConfig(**pinned_request))
+    assert e.value.status_code == 422
+    assert "[1, 2]" in e.value.detail
+
+    kwargs_list = [{**pinned_request, "connection_args": connection_args}
+                   for connection_args in pinned_request["connection_args"]]
+    with pytest.raises(ValueError):
+        bulk_redis_helper.execute_bulk_task(method="getconfig", kwargs_list=kwargs_list)
+    # nothing was routed or queued for the entry that did have a host
+    assert "10.0.2.1" not in bulk_redis_helper.local_queuedb
+
+
+def test_execute_bulk_task(bulk_redis_helper: rediz.Rediz):
+    kwargs_list = bulk_kwargs(BulkGetConfig(**bulk_request))
+    result = bulk_redis_helper.execute_bulk_task(method="getconfig", kwargs_list=kwargs_list)
+
+    task_ids = result["data"]["task_ids"]
+    assert len(task_ids) == 50
+    queue: Queue = bulk_redis_helper.local_queuedb[bulk_redis_helper.config.redis_fifo_q]["queue"]
+    assert queue.get_job_ids() == task_ids
+
+    jobs = Job.fetch_many(task_ids, connection=bulk_redis_helper.base_connection)
+    for job, kw in zip(jobs, kwargs_list):
+        assert job.kwargs["connection_args"]["host"] == kw["connection_args"]["host"]
+        assert job.get_status() == "queued"
+        assert job.meta["errors"] == []
+
+    batch = bulk_redis_helper.fetch_batch(result["data"]["batch_id"])
+    assert batch["data"]["task_ids"] == task_ids
+    assert bulk_redis_helper.fetch_batch(str(uuid.uuid4())) is False
+
+
+def test_fetch_task_statuses(bulk_redis_helper: rediz.Rediz):
+    kwargs_list = bulk_kwargs(BulkGetConfig(**bulk_request))
+    task_ids = bulk_redis_helper.execute_bulk_task(method="getconfig", kwargs_list=kwargs_list)["data"]["task_ids"]
+    finished = Job.fetch(task_ids[0], connection=bulk_redis_helper.base_connection)
+    finished.set_status("finished")
+    finished._result = {"show run | i hostname": ["hostname cat"]}
+    finished.save()
+    missing_id = str(uuid.uuid4())
+
+    result = bulk_redis_helper.fetch_task_statuses(task_ids + [missing_id])
+    tasks = result["data"]["tasks"]
+    assert [task["task_id"] for task in tasks] == task_ids
+    assert result["data"]["missing"] == [missing_id]
+    assert tasks[0]["task_status"] == "finished"
+    assert all(task["task_status"] == "queued" for task in tasks[1:])
+    assert all(task["task_result"] is None for task in tasks)
+
+    result = bulk_redis_helper.fetch_task_statuses(task_ids[:2], include_result=True)
+    assert result["data"]["tasks"][0]["task_result"] == {"show run | i hostname": ["hostname cat"]}
+    assert result["data"]["tasks"][1]["task_result"] is None
@@ -0,0 +1,85 @@
+import uuid
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.routers import util
+
+pytestmark = pytest.mark.nolab
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_cache_key_prefix = f"TEST_CACHE_INDEX_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    monkeypatch.setattr(util, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.cache.clear()
+
+
+def test_clearing_a_host_only_touches_its_index(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("1.1.1.1:22:show run", "run")
+    cache.set_many({"1.1.1.1:22:show ver": "ver", "1.1.1.1:220:show run": "other port"})
+    assert redis_helper.base_connection.smembers(cache.index_key("1.1.1.1:22")) == {b"1.1.1.1:22:show run",
+                                                                                    b"1.1.1.1:22:show ver"}
+
+    assert redis_helper.clear_cache_for_host("1.1.1.1:22:") == 2
+    assert cache.get("1.1.1.1:22:show ver") is None
+    assert cache.get("1.1.1.1:220:show run") == "other port"  # KEYS 1.1.1.1:22* used to take this too
+    assert not redis_helper.base_connection.exists(cache.index_key("1.1.1.1:22"))
+
+
+def test_index_lives_as_long_as_its_longest_entry(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    index_key = cache.index_key("1.1.1.1:22")
+    cache.set("1.1.1.1:22:show run", "run", timeout=100)
+    assert 90 < redis_helper.base_connection.ttl(index_key) <= 100
+    cache.set("1.1.1.1:22:show ver", "ver", timeout=10)
+    assert 90 < redis_helper.base_connection.ttl(index_key) <= 100
+    cache.set("1.1.1.1:22:show clock", "clock", timeout=1000)
+    assert 990 < redis_helper.base_connection.ttl(index_key) <= 1000
+    cache.set("1.1.1.1:22:show inv", "inv", timeout=0)  # never expires
+    assert redis_helper.base_connection.ttl(index_key) == -1
+
+
+def test_listing_leaves_out_the_index_and_pages(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set_many({f"1.1.1.{n}:22:show run": n for n in range(25)})
+    everything = util.list_cached_items(cursor=None, limit=100)
+    assert everything["size"] == 25
+
+    seen = []
+    cursor = 0
+    while True:
+        page = util.list_cached_items(cursor=cursor, limit=10)
+        seen.extend(page["cache"])
+        cursor = page["next_cursor"]
+        if cursor == 0:
+            break
+    assert sorted(seen) == sorted(everything["cache"])
+
+    assert cache.clear() == 25
+    assert not redis_helper.base_connection.keys(f"{cache.index_prefix}*")
+
+
+def test_deleting_an_entry_drops_it_from_the_index(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("1.1.1.1:22:show run", "run")
+    cache.set("1.1.1.1:22:show ver", "ver")
+    assert cache.delete("1.1.1.1:22:show run")
+    assert redis_helper.base_connection.smembers(cache.index_key("1.1.1.1:22")) == {b"1.1.1.1:22:show ver"}
+
+
+def test_writes_prune_members_whose_entries_expired(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    conn = redis_helper.base_connection
+    cache.set_many({f"1.1.1.1:22:cmd{n}": n for n in range(5)})
+    # gone the way an expired entry goes, behind the index's back
+    conn.delete(*[f"{cache.key_prefix}1.1.1.1:22:cmd{n}" for n in range(5)])
+    for n in range(30):
+        cache.set("1.1.1.1:22:show ver", n)
+    assert conn.smembers(cache.index_key("1.1.1.1:22")) == {b"1.1.1.1:22:show ver"}
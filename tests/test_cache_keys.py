@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from copy import deepcopy
+
+import pytest
+
+from netpalm.backend.core.models.models import GetConfig, QueueStrategy, TaskPriority
+from netpalm.routers.route_utils import cache_key_from_model, cache_key_from_req_data, cacheable_model, \
+    canonical_json, request_dict, serialized_for_hash, whitelist, without_none
+
+pytestmark = pytest.mark.nolab
+log = logging.getLogger(__name__)
+
+req_data = {
+    "library": "netmiko",
+    "connection_args": {"host": "10.0.2.33", "port": 22, "username": "admin", "password": "admin"},
+    "command": "show run",
+    "args": {"use_textfsm": True, "read_timeout": 30},
+}
+
+# what a big j2config style request looks like
+large_req_data = {
+    **req_data,
+    "args": {
+        "template": "interfaces",
+        "vars": {
+            f"GigabitEthernet0/{n}": {"description": f"uplink {n}", "vlans": list(range(n, n + 20)), "shutdown": False}
+            for n in range(200)
+        }
+    }
+}
+
+
+def test_key_is_pinned():
+    # cache entries written by one release must still be found by the next, any change here drops the whole cache
+    assert cache_key_from_req_data(req_data) == \
+        "10.0.2.33:22:show run:6ddb1e19ccd1ae7ed1759156456eb87e0912b0c7daf6a0fc167e3752fa26d2b4"
+
+
+def test_ordering_doesnt_matter():
+    shuffled = {
+        "args": {"read_timeout": 30, "use_textfsm": True},
+        "command": "show run",
+        "connection_args": {"password": "admin", "username": "admin", "port": 22, "host": "10.0.2.33"},
+        "library": "netmiko",
+    }
+    assert cache_key_from_req_data(shuffled) == cache_key_from_req_data(req_data)
+    assert canonical_json({"b": {2, 3, 1}}) == canonical_json({"b": {1, 3, 2}})
+
+
+def test_values_matter():
+    keys = {
+        cache_key_from_req_data(req_data),
+        cache_key_from_req_data({**req_data, "args": {"use_textfsm": False, "read_timeout": 30}}),
+        cache_key_from_req_data({**req_data, "args": {"use_textfsm": True, "read_timeout": "30"}}),
+        cache_key_from_req_data({**req_data, "args": {"use_textfsm": True, "read_timeout": 30, "extra": None}}),
+        cache_key_from_req_data({**req_data, "connection_args": {**req_data["connection_args"], "password": "x"}}),
+        cache_key_from_req_data({**req_data, "command": ["show run"]}),
+    }
+    assert len(keys) == 6
+
+
+def test_routing_and_cache_config_dont_matter():
+    routed = {
+        **req_data,
+        "cache": {"enabled": True, "ttl": 30},
+        "queue_strategy": QueueStrategy.pinned,
+        "priority": TaskPriority.high
+    }
+    assert cache_key_from_req_data(routed) == cache_key_from_req_data(req_data)
+
+
+def test_equivalent_encodings_match():
+    assert canonical_json({"library": QueueStrategy.fifo}) == canonical_json({"library": "fifo"})
+    assert canonical_json({"command": ("show run", "show ver")}) == canonical_json({"command": ["show run", "show ver"]})
+    model = GetConfig(**req_data)
+    assert cache_key_from_model(model) == cache_key_from_req_data(model.dict())
+
+
+def test_request_is_left_alone():
+    original = deepcopy(large_req_data)
+    routed = {**large_req_data, "cache": {"enabled": True}}
+    cache_key_from_req_data(routed)
+    assert routed == {**original, "cache": {"enabled": True}}
+
+
+def test_keys_that_cant_be_sorted_still_hash():
+    assert canonical_json({1: "a", "b": 2}) == serialized_for_hash({1: "a", "b": 2})
+
+
+def test_key_is_stable_across_processes():
+    # str and set hashing is salted per process, nothing in the key may depend on it
+    script = ("import json, sys; from netpalm.routers.route_utils import canonical_json; "
+              "print(canonical_json(json.loads(sys.argv[1]) | {'set': {'a', 'b', 'c', 'd'}}))")
+    outputs = {
+        subprocess.run([sys.executable, "-c", script, json.dumps(large_req_data)], capture_output=True, text=True,
+                       check=True, env={**os.environ, "PYTHONHASHSEED": str(seed)}).stdout
+        for seed in (1, 2, 3)
+    }
+    assert len(outputs) == 1
+    assert outputs == {canonical_json({**large_req_data, "set": {"d", "c", "b", "a"}}) + "\n"}
+
+
+def test_request_is_dumped_once(monkeypatch):
+    dumps = []
+    real_dict = GetConfig.dict
+
+    def counted_dict(self, *args, **kwargs):
+        dumps.append(kwargs)
+        return real_dict(self, *args, **kwargs)
+
+    enqueued = []
+
+    @cacheable_model
+    @whitelist
+    def route(getcfg: GetConfig):
+        enqueued.append(request_dict(getcfg, exclude_none=True))
+        return {"status": "success"}
+
+    model = GetConfig(**{**req_data, "webhook": {"name": "default_webhook"}, "cache": {"enabled": False}})
+    expected = model.dict(exclude_none=True)
+    monkeypatch.setattr(GetConfig, "dict", counted_dict)
+    route(model)
+    assert len(dumps) == 1
+    assert enqueued == [expected]
+    # called outside a cacheable route it dumps the model itself
+    assert request_dict(model, exclude_none=True) == expected
+
+
+def test_without_none_matches_exclude_none():
+    model = GetConfig(**{
+        **req_data,
+        "connection_args": {**req_data["connection_args"], "secret": None,
+                            "nested": {"a": None, "b": [None, {"c": None}]}},
+        "webhook": {"name": None, "args": {"x": None, "y": 1}},
+        "post_checks": [{"match_type": "include", "match_str": ["a", None],
+                         "get_config_args": {"command": "show run"}}],
+    })
+    assert without_none(model, model.dict()) == model.dict(exclude_none=True)
+
+
+def legacy_cache_key(req_data: dict) -> str:
+    """what cache_key_from_req_data did before canonical_json, for comparison"""
+    req_data = deepcopy(req_data)
+    for key in ["cache", "queue_strategy", "priority"]:
+        req_data.pop(key, None)
+    return hashlib.sha256(serialized_for_hash(req_data).encode("utf-8")).hexdigest()
+
+
+@pytest.mark.benchmark
+def test_canonical_key_outpaces_repr_sorting():
+    rounds = 50
+    rates = {}
+    for name, func in (("legacy", legacy_cache_key), ("canonical", cache_key_from_req_data)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func(large_req_data)
+        rates[name] = rounds / (time.perf_counter() - started)
+        log.info(f"{name} cache key: {rates[name]:.1f} keys/sec")
+
+    assert rates["canonical"] > rates["legacy"] * 3
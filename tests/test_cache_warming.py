@@ -0,0 +1,177 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.routers import route_utils, util
+from netpalm.routers.route_utils import cacheable_model, cache_key_from_model
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+
+pytestmark = pytest.mark.nolab
+
+request = {
+    "library": "netmiko",
+    "connection_args": {"host": "10.0.2.35", "port": 22},
+    "command": "show ip bgp summary",
+    "cache": {"enabled": True, "ttl": 60, "poison": False}
+}
+
+
+def fake_getconfig(**kwargs):
+    return {kwargs["command"]: ["BGP router identifier 10.0.2.35"]}
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_cache_warming_fifo_{uuid.uuid4()}"
+    config.redis_cache_warm_enabled = True
+    config.redis_cache_warm_store = f"test_cache_warm_{uuid.uuid4()}"
+    config.redis_cache_warm_top_n = 2
+    config.redis_cache_warm_interval = 60
+    config.redis_cache_warm_lead = 10
+    redis_helper = rediz.Rediz(config)
+    redis_helper.clear_cache_for_host("10.0.2.35:22:")
+    monkeypatch.setitem(redis_helper.routes, "fake_getconfig", fake_getconfig)
+    monkeypatch.setattr(route_utils, "reds", redis_helper)
+    monkeypatch.setattr(util, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.clear_cache_for_host("10.0.2.35:22:")
+    warmer = redis_helper.cache_warmer
+    redis_helper.base_connection.delete(warmer.hits_key, warmer.pinned_key, warmer.decay_key,
+                                        *redis_helper.base_connection.keys(f"{warmer.payloads_prefix}*"))
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def queue_of(redis_helper: rediz.Rediz):
+    return redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+
+
+def run_worker(redis_helper: rediz.Rediz):
+    queue = queue_of(redis_helper)
+    NetpalmInProcessWorker(queue, name=f"{queue.name}_worker", connection=redis_helper.base_connection).work(
+        burst=True)
+
+
+def remember(redis_helper: rediz.Rediz, command: str, stale_ttl=None) -> str:
+    cache_key = f"10.0.2.35:22:{command}"
+    redis_helper.cache_warmer.remember(cache_key, "fake_getconfig", {**request, "command": command},
+                                       {"cache_key": cache_key, "cache_ttl": 60, "cache_stale_ttl": stale_ttl})
+    redis_helper.cache_warmer.flush_payloads()
+    return cache_key
+
+
+def test_hits_pick_the_top_keys(redis_helper: rediz.Rediz):
+    warmer = redis_helper.cache_warmer
+    for cache_key, hits in (("10.0.2.35:22:a", 3), ("10.0.2.35:22:b", 1), ("10.0.2.35:22:c", 5)):
+        for _ in range(hits):
+            warmer.record_hit(cache_key)
+    warmer.flush_hits()
+    assert warmer.candidates() == ["10.0.2.35:22:c", "10.0.2.35:22:a"]
+
+    warmer.pin("10.0.2.35:22:b", "fake_getconfig", request, request["cache"])
+    assert warmer.candidates() == ["10.0.2.35:22:b", "10.0.2.35:22:c", "10.0.2.35:22:a"]
+    assert warmer.unpin("10.0.2.35:22:b")
+    assert warmer.candidates() == ["10.0.2.35:22:c", "10.0.2.35:22:a"]
+
+
+def test_decay_forgets_keys_nobody_asks_for(redis_helper: rediz.Rediz):
+    warmer = redis_helper.cache_warmer
+    hot, cold = remember(redis_helper, "hot"), remember(redis_helper, "cold")
+    warmer.record_hit(hot)
+    warmer.record_hit(hot)
+    warmer.record_hit(cold)
+    warmer.flush_hits()
+
+    warmer.decay()
+    warmer.decay()  # only once per interval
+    assert redis_helper.base_connection.zscore(warmer.hits_key, hot) == 1
+    assert redis_helper.base_connection.zscore(warmer.hits_key, cold) == 0.5
+
+    redis_helper.base_connection.delete(warmer.decay_key)  # the next interval
+    warmer.decay()
+    assert redis_helper.base_connection.zscore(warmer.hits_key, hot) == 0.5
+    assert redis_helper.base_connection.zscore(warmer.hits_key, cold) is None
+    assert redis_helper.base_connection.keys(f"{warmer.payloads_prefix}*") == [warmer.payload_key(hot).encode()]
+
+
+def test_plan_spreads_entries_due_before_the_next_run(redis_helper: rediz.Rediz):
+    warmer = redis_helper.cache_warmer
+    warmer.top_n = 10
+    soon, later, missing, distant, stale = (remember(redis_helper, "soon"), remember(redis_helper, "later"),
+                                            remember(redis_helper, "missing"), remember(redis_helper, "distant"),
+                                            remember(redis_helper, "stale", stale_ttl=600))
+    redis_helper.cache.set(soon, "soon", timeout=12)
+    redis_helper.cache.set(later, "later", timeout=60)
+    redis_helper.cache.set(distant, "distant", timeout=300)
+    redis_helper.cache.set(stale, "stale", timeout=30, stale_ttl=600)
+    for cache_key in (soon, later, missing, distant, stale):
+        warmer.record_hit(cache_key)
+
+    plan = warmer.plan(now=1000)
+    assert [cache_key for _, cache_key in plan] == [missing, soon, stale, later]
+    # each is due lead seconds before it goes stale or sooner, one every interval / 4 seconds at most
+    assert [round(run_at) for run_at, _ in plan] == [1000, 1002, 1020, 1045]
+
+
+def test_warm_enqueues_once_and_the_worker_caches_the_result(redis_helper: rediz.Rediz, monkeypatch):
+    warmer = redis_helper.cache_warmer
+    monkeypatch.setitem(redis_helper.routes, "getconfig", fake_getconfig)
+    model = GetConfig(**request)
+    cache_key = cache_key_from_model(model)
+    assert util.pin_cache_warming(model) == {"cache_key": cache_key}
+    assert util.get_cache_warming()["pinned"] == [cache_key]
+
+    queued = warmer.warm(cache_key)
+    assert warmer.warm(cache_key) is None  # already being refreshed
+    assert queue_of(redis_helper).count == 1
+    run_worker(redis_helper)
+
+    cached = redis_helper.cache.get(cache_key)
+    assert cached["data"]["task_id"] == queued["data"]["task_id"]
+    assert cached["data"]["task_result"] == {"show ip bgp summary": ["BGP router identifier 10.0.2.35"]}
+    assert 0 < redis_helper.base_connection.ttl(redis_helper.key_prefix + cache_key) <= 60
+    assert util.unpin_cache_warming(cache_key) == {"unpinned": True}
+
+
+def test_pin_failures_are_reported_like_other_routes(redis_helper: rediz.Rediz, monkeypatch):
+    def broken_pin(*args, **kwargs):
+        raise RuntimeError("redis went away")
+
+    monkeypatch.setattr(redis_helper.cache_warmer, "pin", broken_pin)
+    with pytest.raises(HTTPException) as e:
+        util.pin_cache_warming(GetConfig(**request))
+    assert e.value.status_code == 500
+    assert "redis went away" in e.value.detail["Error"]
+
+
+def test_cacheable_routes_feed_the_warmer(redis_helper: rediz.Rediz, monkeypatch):
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, redis_helper.config)
+    monkeypatch.setattr(route_utils, "areds", async_redis_helper)
+    warmer = redis_helper.cache_warmer
+
+    @cacheable_model
+    async def getconfig(model):
+        return await async_redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    asyncio.run(getconfig(model))
+    cache_key = cache_key_from_model(model)
+    # buffered until the next flush
+    assert not redis_helper.base_connection.exists(warmer.payload_key(cache_key))
+    warmer.flush()
+    assert warmer.candidates() == [cache_key]
+    assert 0 < redis_helper.base_connection.ttl(warmer.payload_key(cache_key)) <= \
+        request["cache"]["ttl"] + warmer.interval + warmer.lead
+
+    # the route's task is what warming reruns
+    run_worker(redis_helper)
+    redis_helper.base_connection.delete(redis_helper.key_prefix + cache_key)
+    assert warmer.warm(cache_key)["data"]["task_queue"] == redis_helper.config.redis_fifo_q
+    run_worker(redis_helper)
+    assert redis_helper.cache.get(cache_key)["data"]["task_result"] == fake_getconfig(**request)
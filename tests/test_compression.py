@@ -0,0 +1,133 @@
+import asyncio
+import pickle
+import uuid
+
+import pytest
+from rq import Queue
+from rq.job import Job
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.backend.core.redis.compression import Compressor
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+from netpalm.routers import util
+
+pytestmark = pytest.mark.nolab
+
+RUNNING_CONFIG = "\n".join(f"interface GigabitEthernet0/{n}\n description uplink {n}\n no shutdown" for n in range(2000))
+
+
+def show_running_config():
+    return RUNNING_CONFIG
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_cache_key_prefix = f"TEST_COMPRESSION_{uuid.uuid4()}"
+    config.redis_compression_stats = f"test_compression_stats_{uuid.uuid4()}"
+    config.redis_compression_enabled = True
+    config.redis_compression_threshold = 1024
+    redis_helper = rediz.Rediz(config)
+    monkeypatch.setattr(util, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.cache.clear()
+    redis_helper.base_connection.delete(config.redis_compression_stats, redis_helper.compressor.recent_key)
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "lzma", "bz2"])
+def test_pack_round_trips_through_plain_pickle(algorithm):
+    config = confload.initialize_config()
+    config.redis_compression_enabled = True
+    config.redis_compression_algorithm = algorithm
+    config.redis_compression_threshold = 1024
+    compressor = Compressor(config)
+
+    packed, compression = compressor.pack({"show run": RUNNING_CONFIG}, key="10.0.2.33:22:show run")
+    assert len(pickle.dumps(packed)) < len(RUNNING_CONFIG) / 5
+    assert pickle.loads(pickle.dumps(packed)) == {"show run": RUNNING_CONFIG}
+    assert compression["algorithm"] == algorithm
+    assert compression["compressed_bytes"] < compression["original_bytes"]
+    assert compression["ratio"] > 1
+    assert compression["cpu_ms"] >= 0
+
+    # small values are stored as they are, but they're only pickled the once
+    packed, compression = compressor.pack("show clock", key="10.0.2.33:22:show clock")
+    assert pickle.loads(pickle.dumps(packed)) == "show clock"
+    assert compression is None
+
+
+def test_unknown_algorithm_is_refused():
+    config = confload.initialize_config()
+    config.redis_compression_algorithm = "rar"
+    with pytest.raises(ValueError):
+        Compressor(config)
+
+
+def test_large_cache_values_are_stored_compressed(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show run", RUNNING_CONFIG)
+    stored = redis_helper.base_connection.get(cache.key_prefix + "10.0.2.33:22:show run")
+    assert len(stored) < len(RUNNING_CONFIG) / 5
+    cache.local = None  # read it back from redis rather than from process memory
+    assert cache.get("10.0.2.33:22:show run") == RUNNING_CONFIG
+
+    cache.set("10.0.2.33:22:show clock", "12:00")
+    assert cache.get("10.0.2.33:22:show clock") == "12:00"
+
+
+def test_local_cache_is_charged_uncompressed_sizes(redis_helper: rediz.Rediz):
+    redis_helper.config.redis_cache_local = True
+    local_helper = rediz.Rediz(redis_helper.config)
+    local_helper.local_cache.ensure_listener()
+    assert local_helper.local_cache.subscribed.wait(5)
+    cache = local_helper.cache
+    cache.set("10.0.2.33:22:show run", RUNNING_CONFIG)
+    stored = redis_helper.base_connection.get(cache.key_prefix + "10.0.2.33:22:show run")
+    assert cache.get("10.0.2.33:22:show run") == RUNNING_CONFIG
+    assert local_helper.local_cache.get("10.0.2.33:22:show run") == (True, RUNNING_CONFIG)
+    assert local_helper.local_cache.stats()["bytes"] >= len(RUNNING_CONFIG) > 5 * len(stored)
+
+
+def test_uncompressed_entries_still_read(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    # what every entry looked like before compression
+    redis_helper.base_connection.set(cache.key_prefix + "10.0.2.33:22:show run", b"!" + pickle.dumps(RUNNING_CONFIG))
+    assert cache.get("10.0.2.33:22:show run") == RUNNING_CONFIG
+
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, redis_helper.config)
+
+    async def set_and_get():
+        await async_redis_helper.cache.set("10.0.2.33:22:show tech", RUNNING_CONFIG)
+        cache.local = None
+        return await async_redis_helper.cache.get("10.0.2.33:22:show tech")
+
+    assert asyncio.run(set_and_get()) == RUNNING_CONFIG
+
+
+def test_large_job_results_are_stored_compressed(redis_helper: rediz.Rediz):
+    queue = Queue(f"test_compression_{uuid.uuid4()}", connection=redis_helper.base_connection)
+    job = queue.enqueue(show_running_config)
+    worker = NetpalmInProcessWorker([queue], name=f"{queue.name}_worker", connection=redis_helper.base_connection)
+    worker.work(burst=True)
+
+    stored = redis_helper.base_connection.hget(Job.key_for(job.id), "result")
+    assert len(stored) < len(RUNNING_CONFIG) / 5
+    assert Job.fetch(job.id, connection=redis_helper.base_connection).result == RUNNING_CONFIG
+    queue.delete(delete_jobs=True)
+
+
+def test_compression_metrics(redis_helper: rediz.Rediz):
+    redis_helper.cache.set("10.0.2.33:22:show run", RUNNING_CONFIG)
+    redis_helper.cache.set("10.0.2.33:22:show clock", "12:00")
+
+    stats = util.get_compression_stats()
+    assert stats["algorithm"] == "zlib"
+    assert stats["totals"]["cache"]["entries"] == 1
+    assert stats["totals"]["cache"]["ratio"] > 5
+    [entry] = stats["recent"]
+    assert entry["key"] == "10.0.2.33:22:show run"
+    assert entry["kind"] == "cache"
+    assert entry["ratio"] > 5
+    assert "cpu_ms" in entry
@@ -0,0 +1,125 @@
+import threading
+import time
+import uuid
+
+import pytest
+from rq import Queue, Worker
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.device_semaphore import DeviceSemaphore
+from netpalm.backend.core.utilities.rediz_worker import NetpalmThreadedWorker, NetpalmWorker, DEVICE_SWEEP_INTERVAL
+
+pytestmark = pytest.mark.nolab
+
+running = {}
+peak = {}
+lock = threading.Lock()
+
+
+def device_task(**kwargs):
+    host = kwargs["connection_args"]["host"]
+    with lock:
+        running[host] = running.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), running[host])
+    time.sleep(0.2)
+    with lock:
+        running[host] -= 1
+    return host
+
+
+@pytest.fixture(scope="function")
+def redis_helper():
+    config = confload.initialize_config()
+    config.redis_device_semaphore = f"test_device_semaphore_{uuid.uuid4()}"
+    config.fifo_device_max_sessions = 1
+    redis_helper = rediz.Rediz(config)
+    yield redis_helper
+    conn = redis_helper.base_connection
+    for host in ("10.0.2.33", "10.0.2.34"):
+        conn.delete(*redis_helper.device_semaphore.keys(host))
+
+
+@pytest.fixture(scope="function")
+def semaphore(redis_helper: rediz.Rediz):
+    return redis_helper.device_semaphore
+
+
+def test_acquire_parks_jobs_over_the_limit(semaphore: DeviceSemaphore):
+    queue = Queue(f"test_device_q_{uuid.uuid4()}", connection=semaphore.base_connection)
+    assert semaphore.acquire("10.0.2.33", "job1", queue.key, lease=60)
+    # holding a slot already isn't a second session
+    assert semaphore.acquire("10.0.2.33", "job1", queue.key, lease=60)
+    assert not semaphore.acquire("10.0.2.33", "job2", queue.key, lease=60)
+    assert semaphore.acquire("10.0.2.34", "job3", queue.key, lease=60)
+    assert semaphore.holders("10.0.2.33") == 1
+    assert semaphore.deferred("10.0.2.33") == 1
+
+    assert semaphore.release("10.0.2.33", "job1") == 1
+    assert queue.job_ids == ["job2"]
+    assert semaphore.deferred("10.0.2.33") == 0
+    assert not semaphore.base_connection.sismember(semaphore.deferred_hosts, "10.0.2.33")
+    queue.empty()
+
+
+def test_sweep_requeues_behind_expired_leases(semaphore: DeviceSemaphore):
+    queue = Queue(f"test_device_q_{uuid.uuid4()}", connection=semaphore.base_connection)
+    assert semaphore.acquire("10.0.2.33", "dead", queue.key, lease=1)
+    assert not semaphore.acquire("10.0.2.33", "job2", queue.key, lease=60)
+    assert semaphore.sweep() == 0
+
+    # the holder never releases, once its lease runs out sweeping puts what it blocked back
+    time.sleep(1.1)
+    assert semaphore.sweep() == 1
+    assert queue.job_ids == ["job2"]
+    assert semaphore.holders("10.0.2.33") == 0
+    queue.empty()
+
+
+def test_worker_never_exceeds_device_limit(semaphore: DeviceSemaphore):
+    running.clear()
+    peak.clear()
+    queue = Queue(f"test_device_q_{uuid.uuid4()}", connection=semaphore.base_connection)
+    jobs = [queue.enqueue(device_task, kwargs={"connection_args": {"host": host}})
+            for host in ("10.0.2.33", "10.0.2.33", "10.0.2.33", "10.0.2.34")]
+    # a burst worker stops once the queue is empty, parked jobs only come back as the running ones finish
+    while queue.count or semaphore.deferred("10.0.2.33"):
+        worker = NetpalmThreadedWorker(queue, name=f"{queue.name}_worker_{uuid.uuid4()}",
+                                       connection=semaphore.base_connection, concurrency=4,
+                                       device_semaphore=semaphore)
+        worker.work(burst=True)
+
+    assert peak == {"10.0.2.33": 1, "10.0.2.34": 1}
+    for job in jobs:
+        job.refresh()
+        assert job.is_finished
+    assert semaphore.holders("10.0.2.33") == 0
+
+
+def test_parked_jobs_are_listed(redis_helper: rediz.Rediz, semaphore: DeviceSemaphore):
+    queue = Queue(f"test_device_q_{uuid.uuid4()}", connection=semaphore.base_connection)
+    holder, parked = (queue.enqueue_call(device_task, kwargs={"connection_args": {"host": "10.0.2.33"}},
+                                         meta=redis_helper.get_redis_meta_template()) for _ in range(2))
+    # as a worker would have dequeued them
+    semaphore.base_connection.delete(queue.key)
+    assert semaphore.acquire("10.0.2.33", holder.id, queue.key, lease=60)
+    assert not semaphore.acquire("10.0.2.33", parked.id, queue.key, lease=60)
+
+    assert redis_helper.getjoblist(q=False)["data"]["deferred_depth"] == {"10.0.2.33": 1}
+    listing = redis_helper.getjobliststatus("10.0.2.33", statuses=["deferred"])["data"]
+    assert [task["data"]["task_id"] for task in listing["task_id"]] == [parked.id]
+    assert listing["total"] == 1
+    semaphore.release("10.0.2.33", holder.id)
+    queue.empty()
+    holder.delete()
+
+
+def test_idle_workers_still_sweep(semaphore: DeviceSemaphore, monkeypatch):
+    timeouts = []
+    monkeypatch.setattr(Worker, "dequeue_job_and_maintain_ttl", lambda self, timeout: timeouts.append(timeout))
+    queue = Queue(f"test_device_q_{uuid.uuid4()}", connection=semaphore.base_connection)
+    worker = NetpalmWorker(queue, name=f"{queue.name}_worker", connection=semaphore.base_connection,
+                           device_semaphore=semaphore)
+    # sweeps ride on heartbeats, a worker with nothing to do has to wake up for them
+    worker.dequeue_job_and_maintain_ttl(405)
+    assert timeouts == [DEVICE_SWEEP_INTERVAL]
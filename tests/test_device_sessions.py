@@ -0,0 +1,220 @@
+import threading
+import uuid
+
+import pytest
+from rq import Queue
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.rediz import worker_liveness_key
+from netpalm.backend.core.utilities import device_sessions as device_sessions_module
+from netpalm.backend.core.utilities.device_sessions import DeviceSessionPool
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+
+pytestmark = pytest.mark.nolab
+
+
+class FakeSession:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeDriver:
+    connects = 0
+
+    def __init__(self, host="10.0.2.33"):
+        self.connection_args = {"host": host, "username": "admin", "password": "admin"}
+
+    def connect(self):
+        FakeDriver.connects += 1
+        return FakeSession()
+
+    def logout(self, session):
+        session.closed = True
+
+
+@pytest.fixture(scope="function")
+def pool():
+    FakeDriver.connects = 0
+    pool = DeviceSessionPool()
+    pool.enable(idle_timeout=300)
+    return pool
+
+
+def test_disabled_pool_connects_and_logs_out_every_time():
+    pool = DeviceSessionPool()
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    assert session.closed
+    assert not pool.sessions
+
+
+def test_live_session_is_reused(pool):
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    assert not session.closed
+
+    # a later job builds its own driver for the same device
+    assert pool.checkout("netmiko", FakeDriver()) is session
+    assert FakeDriver.connects == 1
+
+
+def test_sessions_are_keyed_by_connection_args(pool):
+    first, second = FakeDriver(), FakeDriver(host="10.0.2.34")
+    session = pool.checkout("netmiko", first)
+    pool.checkin("netmiko", first, session)
+    assert pool.checkout("netmiko", second) is not session
+    assert pool.checkout("napalm", FakeDriver()) is not session
+
+
+def test_dead_session_is_replaced(pool):
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    session.alive = False
+
+    replacement = pool.checkout("netmiko", driver)
+    assert replacement is not session
+    assert session.closed
+    assert FakeDriver.connects == 2
+
+
+def test_failing_probe_counts_as_dead(pool):
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    session.is_alive = lambda: 1 / 0
+    assert pool.checkout("netmiko", driver) is not session
+
+
+def test_idle_sessions_are_reaped(pool):
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    pool.idle_timeout = 0
+    pool.reap()
+    assert session.closed
+    assert not pool.sessions
+
+
+def test_unsupported_libraries_are_not_pooled(pool):
+    driver = FakeDriver()
+    session = pool.checkout("restconf", driver)
+    pool.checkin("restconf", driver, session)
+    assert session.closed
+    assert not pool.sessions
+
+
+def test_close_all(pool):
+    sessions = []
+    for host in ("10.0.2.33", "10.0.2.34"):
+        driver = FakeDriver(host=host)
+        session = pool.checkout("netmiko", driver)
+        pool.checkin("netmiko", driver, session)
+        sessions.append(session)
+    pool.close_all()
+    assert all(session.closed for session in sessions)
+    assert not pool.sessions
+
+
+def test_session_is_checked_back_in(pool):
+    driver = FakeDriver()
+    with pool.session("netmiko", driver) as session:
+        pass
+    assert not session.closed
+    assert pool.checkout("netmiko", driver) is session
+
+
+def test_session_that_errors_is_logged_out(pool):
+    driver = FakeDriver()
+    with pytest.raises(Exception, match="failed"):
+        with pool.session("netmiko", driver) as session:
+            raise Exception("failed")  # what write_meta_error raises
+    assert session.closed
+    assert not pool.sessions
+
+
+def test_concurrent_checkouts_share_the_pool(pool):
+    errors = []
+
+    def job():
+        try:
+            for _ in range(50):
+                with pool.session("netmiko", FakeDriver()):
+                    pass
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(pool.sessions) == 1
+
+
+def pooled_job():
+    pool = device_sessions_module.device_sessions
+    driver = FakeDriver()
+    session = pool.checkout("netmiko", driver)
+    pool.checkin("netmiko", driver, session)
+    return id(session)
+
+
+def test_session_worker_shares_sessions_across_jobs(monkeypatch):
+    pool = DeviceSessionPool()
+    pool.enable(idle_timeout=300)
+    monkeypatch.setattr(device_sessions_module, "device_sessions", pool)
+    monkeypatch.setattr("netpalm.backend.core.utilities.rediz_worker.device_sessions", pool)
+    FakeDriver.connects = 0
+
+    reds = rediz.Rediz(confload.initialize_config())
+    queue_name = f"test_sessions_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=reds.base_connection)
+    jobs = [queue.enqueue(pooled_job) for _ in range(3)]
+    worker = NetpalmInProcessWorker(queue, name=f"{queue_name}_worker", connection=reds.base_connection)
+    try:
+        worker.work(burst=True)
+    finally:
+        reds.base_connection.delete(worker_liveness_key(queue_name))
+
+    assert len({queue.fetch_job(job.id).result for job in jobs}) == 1
+    assert FakeDriver.connects == 1
+    # the worker closes its sessions once it's done
+    assert not pool.sessions
+
+
+def failing_pooled_job():
+    with device_sessions_module.device_sessions.session("netmiko", FakeDriver()) as session:
+        failing_pooled_job.session = session
+        raise Exception("PostCheck Failed")
+
+
+def test_failed_job_logs_its_session_out(monkeypatch):
+    pool = DeviceSessionPool()
+    pool.enable(idle_timeout=300)
+    monkeypatch.setattr(device_sessions_module, "device_sessions", pool)
+    monkeypatch.setattr("netpalm.backend.core.utilities.rediz_worker.device_sessions", pool)
+
+    reds = rediz.Rediz(confload.initialize_config())
+    queue_name = f"test_sessions_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=reds.base_connection)
+    job = queue.enqueue(failing_pooled_job)
+    worker = NetpalmInProcessWorker(queue, name=f"{queue_name}_worker", connection=reds.base_connection)
+    # the session has to be gone by the time the job is done, not when the worker exits
+    monkeypatch.setattr(worker, "register_death", lambda: None)
+    try:
+        worker.work(burst=True)
+    finally:
+        reds.base_connection.delete(worker_liveness_key(queue_name))
+
+    assert queue.fetch_job(job.id).is_failed
+    assert failing_pooled_job.session.closed
+    assert not pool.sessions
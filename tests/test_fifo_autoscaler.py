@@ -0,0 +1,135 @@
+import json
+import uuid
+
+import pytest
+from rq import Queue
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.utilities.rediz_fifo_autoscaler import FifoAutoscaler
+
+pytestmark = pytest.mark.nolab
+
+
+class FakeProcess:
+    def __init__(self):
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.alive = False
+
+
+def noop():
+    pass
+
+
+@pytest.fixture(scope="function")
+def autoscaler():
+    config = confload.initialize_config()
+    config.fifo_process_min_per_node = 1
+    config.fifo_process_max_per_node = 4
+    config.fifo_autoscale_jobs_per_worker = 2
+    config.fifo_autoscale_max_job_age = 10
+    config.fifo_autoscale_cooldown = 30
+    config.redis_fifo_autoscaler_store = f"test_fifo_autoscaler_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    autoscaler = FifoAutoscaler(f"test_fifo_{uuid.uuid4()}", spawn=lambda counter: FakeProcess(),
+                                base_connection=redis_helper.base_connection, config=config)
+    autoscaler.redis_helper = redis_helper
+    autoscaler.scale_to(autoscaler.min_workers)
+    yield autoscaler
+    redis_helper.base_connection.delete(*redis_helper.base_connection.keys(f"{config.redis_fifo_autoscaler_store}:*"),
+                                        *[queue.key for queue in autoscaler.queues])
+
+
+def enqueue(autoscaler: FifoAutoscaler, count: int, queue_name: str = None):
+    queue = Queue(queue_name or autoscaler.queue.name, connection=autoscaler.base_connection)
+    return [queue.enqueue(noop) for _ in range(count)]
+
+
+def test_queue_metrics(autoscaler: FifoAutoscaler):
+    assert autoscaler.queue_metrics() == (0, 0.0)
+    enqueue(autoscaler, 3)
+    depth, oldest_age = autoscaler.queue_metrics()
+    assert depth == 3
+    assert 0 <= oldest_age < 5
+
+    # every priority counts towards the depth
+    enqueue(autoscaler, 2, queue_name=f"{autoscaler.queue.name}_low")
+    assert autoscaler.queue_metrics()[0] == 5
+
+
+def test_scales_up_with_depth_within_bounds(autoscaler: FifoAutoscaler):
+    assert autoscaler.decide(depth=5, oldest_age=0, now=0) == (3, "scale_up")
+    assert autoscaler.decide(depth=100, oldest_age=0, now=0) == (4, "scale_up")
+
+
+def test_scales_up_on_old_jobs(autoscaler: FifoAutoscaler):
+    assert autoscaler.decide(depth=1, oldest_age=60, now=0) == (2, "scale_up")
+
+
+def test_depth_is_shared_with_other_containers(autoscaler: FifoAutoscaler):
+    assert autoscaler.live_containers() == 1
+    # two more containers working the queue and one working some other queue
+    for hostname, queue in (("other-a", autoscaler.queue.name), ("other-b", autoscaler.queue.name),
+                            ("elsewhere", "some_other_fifo_queue")):
+        autoscaler.base_connection.set(f"{autoscaler.store}:{hostname}", json.dumps({"queue": queue}))
+    autoscaler.publish_state(0, 0)
+    assert autoscaler.live_containers() == 3
+    enqueue(autoscaler, 12)
+    autoscaler.tick(now=0)
+    assert len(autoscaler.processes) == 2
+    assert autoscaler.decide(depth=12, oldest_age=0, now=0, containers=1) == (4, "scale_up")
+
+
+def test_threaded_workers_count_their_concurrency(autoscaler: FifoAutoscaler):
+    config = confload.initialize_config()
+    config.worker_mode, config.worker_concurrency = "threaded", 5
+    config.fifo_autoscale_jobs_per_worker = 2
+    threaded = FifoAutoscaler(autoscaler.queue.name, spawn=lambda counter: FakeProcess(),
+                              base_connection=autoscaler.base_connection, config=config)
+    assert threaded.concurrency == 5
+    autoscaler.concurrency = threaded.concurrency
+    assert autoscaler.decide(depth=10, oldest_age=0, now=0) == (1, "hold")
+    assert autoscaler.decide(depth=11, oldest_age=0, now=0) == (2, "scale_up")
+
+
+def test_scale_down_waits_for_cooldown(autoscaler: FifoAutoscaler):
+    autoscaler.scale_to(4)
+    assert autoscaler.decide(depth=0, oldest_age=0, now=100) == (4, "hold")
+    assert autoscaler.decide(depth=0, oldest_age=0, now=120) == (4, "hold")
+    # a burst in the meantime starts the cooldown over
+    assert autoscaler.decide(depth=8, oldest_age=0, now=125) == (4, "hold")
+    assert autoscaler.decide(depth=0, oldest_age=0, now=126) == (4, "hold")
+    assert autoscaler.decide(depth=0, oldest_age=0, now=150) == (4, "hold")
+    assert autoscaler.decide(depth=0, oldest_age=0, now=157) == (3, "scale_down")
+
+
+def test_tick_stops_newest_workers_and_publishes_state(autoscaler: FifoAutoscaler):
+    enqueue(autoscaler, 7)
+    autoscaler.tick(now=0)
+    assert len(autoscaler.processes) == 4
+    newest = autoscaler.processes[max(autoscaler.processes)]
+
+    autoscaler.base_connection.delete(autoscaler.queue.key)
+    autoscaler.tick(now=1)
+    autoscaler.tick(now=40)
+    assert len(autoscaler.processes) == 3
+    assert not newest.is_alive()
+
+    state, = autoscaler.redis_helper.fetch_fifo_autoscaler_state()
+    assert state["workers"] == 3
+    assert state["queue_depth"] == 0
+    assert state["last_action"]["action"] == "scale_down"
+
+
+def test_dead_workers_are_replaced(autoscaler: FifoAutoscaler):
+    only, = autoscaler.processes.values()
+    only.alive = False
+    autoscaler.tick(now=0)
+    assert len(autoscaler.processes) == 1
+    assert only not in autoscaler.processes.values()
@@ -0,0 +1,120 @@
+import time
+import uuid
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.local_cache import LocalCache, cache_invalidate_message
+
+pytestmark = pytest.mark.nolab
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_cache_key_prefix = f"TEST_LOCAL_CACHE_{uuid.uuid4()}"
+    config.redis_cache_local_max_entries = 3
+    redis_helper = rediz.Rediz(config)
+    redis_helper.local_cache.ensure_listener()
+    assert redis_helper.local_cache.subscribed.wait(5)
+    yield redis_helper
+    redis_helper.cache.clear()
+
+
+def eventually(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_hits_are_served_from_memory(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show ver", {"data": "cisco"})
+    assert cache.get("10.0.2.33:22:show ver") == {"data": "cisco"}
+    # gone from redis behind the cache's back, the next hit never asks redis
+    redis_helper.base_connection.delete(cache.key_prefix + "10.0.2.33:22:show ver")
+    assert cache.get("10.0.2.33:22:show ver") == {"data": "cisco"}
+
+
+def test_writes_and_clears_invalidate(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show ver", "old")
+    cache.set("10.0.2.34:22:show ver", "other")
+    assert cache.get("10.0.2.33:22:show ver") == "old"
+    assert cache.get("10.0.2.34:22:show ver") == "other"
+
+    cache.set("10.0.2.33:22:show ver", "new")
+    assert cache.get("10.0.2.33:22:show ver") == "new"
+
+    redis_helper.clear_cache_for_host("10.0.2.33:22:")
+    assert cache.get("10.0.2.33:22:show ver") is None
+    assert redis_helper.local_cache.get("10.0.2.34:22:show ver") == (True, "other")
+
+    cache.clear()
+    assert redis_helper.local_cache.stats()["entries"] == 0
+
+
+def test_broadcasts_from_other_processes_invalidate(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show ver", "old")
+    assert cache.get("10.0.2.33:22:show ver") == "old"
+    # what a worker or another controller sends after writing the key
+    redis_helper.base_connection.publish(redis_helper.config.redis_broadcast_q,
+                                         cache_invalidate_message(keys=["10.0.2.33:22:show ver"]))
+    assert eventually(lambda: redis_helper.local_cache.get("10.0.2.33:22:show ver") == (False, None))
+
+
+def test_broadcasts_for_other_prefixes_are_ignored(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show ver", "mine")
+    cache.set("10.0.2.34:22:show ver", "also mine")
+    assert cache.get("10.0.2.33:22:show ver") == "mine"
+    assert cache.get("10.0.2.34:22:show ver") == "also mine"
+    # a deployment with its own prefix sharing this redis and broadcast channel clearing its cache
+    redis_helper.base_connection.publish(redis_helper.config.redis_broadcast_q,
+                                         cache_invalidate_message(flush=True, prefix="SOME_OTHER_PREFIX"))
+    redis_helper.base_connection.publish(redis_helper.config.redis_broadcast_q,
+                                         cache_invalidate_message(keys=["10.0.2.34:22:show ver"],
+                                                                  prefix=redis_helper.key_prefix))
+    # messages arrive in order, so once the second one has landed the first one was ignored
+    assert eventually(lambda: redis_helper.local_cache.get("10.0.2.34:22:show ver") == (False, None))
+    assert redis_helper.local_cache.get("10.0.2.33:22:show ver") == (True, "mine")
+
+
+def test_entries_expire_with_their_redis_key(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.33:22:show ver", "short lived", timeout=1)
+    assert cache.get("10.0.2.33:22:show ver") == "short lived"
+    time.sleep(1.1)
+    assert cache.get("10.0.2.33:22:show ver") is None
+
+
+def test_bounded_by_entries_and_bytes(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    for n in range(4):
+        cache.set(f"10.0.2.33:22:cmd{n}", n)
+        cache.get(f"10.0.2.33:22:cmd{n}")
+    local = redis_helper.local_cache
+    assert local.stats()["entries"] == 3
+    assert local.get("10.0.2.33:22:cmd0") == (False, None)  # least recently used goes first
+
+    small = LocalCache(redis_helper.base_connection, "unused", max_entries=100, max_bytes=100)
+    small.subscribed.set()
+    small.put("a", "a", 60, -1, small.generation)
+    small.put("b", "b", 60, -1, small.generation)
+    small.put("huge", "huge", 1000, -1, small.generation)
+    assert small.stats()["bytes"] == 60
+    assert small.get("b") == (True, "b") and small.get("a") == (False, None)
+
+
+def test_fill_racing_an_invalidation_is_dropped(redis_helper: rediz.Rediz):
+    local = redis_helper.local_cache
+    generation = local.generation
+    local.drop(keys=["10.0.2.33:22:show ver"])
+    local.put("10.0.2.33:22:show ver", "read before the invalidation", 10, -1, generation)
+    assert local.get("10.0.2.33:22:show ver") == (False, None)
@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import time
+import uuid
+
+import pytest
+from rq import Queue
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import PinnedStore
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.async_rediz import AsyncRediz
+from netpalm.backend.core.redis.rediz import PinnedQueue, worker_liveness_key
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+
+pytestmark = pytest.mark.nolab
+
+
+@pytest.fixture(scope="function")
+def idle_redis_helper():
+    config = confload.initialize_config()
+    redis_helper = rediz.Rediz(config)
+    hostname = socket.gethostname()
+    redis_helper.pinned_store.register(PinnedStore(hostname=hostname, count=0, limit=2,
+                                                   pinned_listen_queue=f"{hostname}_processworker").dict())
+    yield redis_helper
+    redis_helper.pinned_store.remove(hostname)
+
+
+def pinned_worker(redis_helper: rediz.Rediz, idle_timeout: int):
+    """sets a pinned queue up the way the controller and processworker would"""
+    queue_name = f"test_idle_{uuid.uuid4()}"
+    assert redis_helper.pinned_store.reserve()
+    redis_helper.append_network_queue_db(queue_name)
+    queue = Queue(queue_name, connection=redis_helper.base_connection)
+    return NetpalmInProcessWorker(queue, name=f"{queue_name}_worker", connection=redis_helper.base_connection,
+                                  idle_timeout=idle_timeout)
+
+
+def free_slots(redis_helper: rediz.Rediz) -> int:
+    container, = [c for c in redis_helper.fetch_pinned_store() if c["hostname"] == socket.gethostname()]
+    return container["limit"] - container["count"]
+
+
+def test_idle_pinned_worker_releases_queue_and_slot(idle_redis_helper: rediz.Rediz):
+    worker = pinned_worker(idle_redis_helper, idle_timeout=1)
+    queue_name = worker.queue_names()[0]
+    assert free_slots(idle_redis_helper) == 1
+
+    start = time.monotonic()
+    worker.work()
+    assert time.monotonic() - start < 5
+
+    conn = idle_redis_helper.base_connection
+    assert not conn.hexists(idle_redis_helper.networked_queuedb, queue_name)
+    assert not conn.exists(worker_liveness_key(queue_name))
+    assert free_slots(idle_redis_helper) == 2
+    # the next request for the host has to create a worker again
+    assert idle_redis_helper.getqueue(queue_name) is False
+
+
+def test_worker_with_queued_jobs_is_not_idle(idle_redis_helper: rediz.Rediz):
+    worker = pinned_worker(idle_redis_helper, idle_timeout=1)
+    queue_name = worker.queue_names()[0]
+    worker.queues[0].enqueue(time.sleep, 0)
+
+    worker.last_active -= 5
+    assert worker.is_idle()
+    assert not worker.release_idle_queue()  # a job is waiting, so this must not stop the worker
+
+    assert idle_redis_helper.base_connection.hexists(idle_redis_helper.networked_queuedb, queue_name)
+    assert free_slots(idle_redis_helper) == 1
+    assert not worker.is_idle()
+    idle_redis_helper.pinned_store.release(socket.gethostname())
+
+
+def test_workers_without_idle_timeout_never_idle(idle_redis_helper: rediz.Rediz):
+    worker = pinned_worker(idle_redis_helper, idle_timeout=None)
+    worker.last_active -= 10000
+    assert not worker.is_idle()
+    idle_redis_helper.pinned_store.release(socket.gethostname())
+
+
+def test_job_pushed_onto_a_released_queue_is_rerouted(idle_redis_helper: rediz.Rediz, monkeypatch):
+    worker = pinned_worker(idle_redis_helper, idle_timeout=1)
+    queue_name = worker.queue_names()[0]
+    assert isinstance(idle_redis_helper.append_local_queue_db(queue_name), PinnedQueue)
+    rerouted = []
+    monkeypatch.setattr(idle_redis_helper, "reoute_and_create_q_worker", lambda hst: rerouted.append(hst))
+
+    # the controller found the queue registered and is about to push, only then does the worker let it go
+    worker.last_active -= 5
+    assert worker.release_idle_queue()
+    first = idle_redis_helper.sendtask(q=queue_name, exe="script", kwargs={"script": "hello_world"})
+    second = asyncio.run(AsyncRediz(idle_redis_helper).sendtask(q=queue_name, exe="script",
+                                                                kwargs={"script": "hello_world"}))
+    # the jobs are kept and their queue handed to a new worker
+    assert rerouted == [queue_name, queue_name]
+    assert worker.queues[0].get_job_ids() == [first["data"]["task_id"], second["data"]["task_id"]]
+
+
+def test_job_pushed_onto_a_registered_queue_stays_put(idle_redis_helper: rediz.Rediz, monkeypatch):
+    worker = pinned_worker(idle_redis_helper, idle_timeout=1)
+    queue_name = worker.queue_names()[0]
+    idle_redis_helper.append_local_queue_db(queue_name)
+    rerouted = []
+    monkeypatch.setattr(idle_redis_helper, "reoute_and_create_q_worker", lambda hst: rerouted.append(hst))
+
+    task = idle_redis_helper.sendtask(q=queue_name, exe="script", kwargs={"script": "hello_world"}, at_front=True)
+    assert rerouted == []
+    # with a job queued the worker can't give the queue up
+    worker.last_active -= 5
+    assert not worker.release_idle_queue()
+    assert worker.queues[0].get_job_ids() == [task["data"]["task_id"]]
+    idle_redis_helper.pinned_store.release(socket.gethostname())
@@ -0,0 +1,76 @@
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from netpalm.backend.core.redis import reds
+from netpalm.backend.core.redis.rediz import PinnedCapacityStore
+
+pytestmark = pytest.mark.nolab
+
+
+def container(hostname: str, limit: int, count: int = 0):
+    return {
+        "hostname": hostname,
+        "count": count,
+        "limit": limit,
+        "pinned_listen_queue": f"{hostname}_processworker"
+    }
+
+
+@pytest.fixture(scope="function")
+def pinned_store():
+    store = PinnedCapacityStore(reds.base_connection, f"test_netpalm_pinned_store_{uuid.uuid4()}")
+    yield store
+    reds.base_connection.delete(store.store_name, store.capacity_name)
+
+
+def test_reserve_picks_least_loaded_container(pinned_store: PinnedCapacityStore):
+    pinned_store.register(container("a", limit=4))
+    pinned_store.register(container("b", limit=4))
+
+    hostnames = [pinned_store.reserve()["hostname"] for _ in range(4)]
+    assert sorted(hostnames) == ["a", "a", "b", "b"]  # spread, not packed onto the first container
+
+    counts = {c["hostname"]: c["count"] for c in pinned_store.all()}
+    assert counts == {"a": 2, "b": 2}
+
+
+def test_reserve_never_overcommits(pinned_store: PinnedCapacityStore):
+    pinned_store.register(container("a", limit=5))
+    pinned_store.register(container("b", limit=3))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: pinned_store.reserve(), range(20)))
+
+    reserved = [r for r in results if r is not None]
+    assert len(reserved) == 8
+    assert pinned_store.reserve() is None
+    assert all(c["count"] == c["limit"] for c in pinned_store.all())
+
+
+def test_release_is_bounded_by_limit(pinned_store: PinnedCapacityStore):
+    pinned_store.register(container("a", limit=2))
+    assert pinned_store.reserve()["pinned_listen_queue"] == "a_processworker"
+    assert pinned_store.release("a")
+    assert not pinned_store.release("a")  # already fully free
+    assert not pinned_store.release("does-not-exist")
+    assert pinned_store.all()[0]["count"] == 0
+
+
+def test_remove_container(pinned_store: PinnedCapacityStore):
+    pinned_store.register(container("a", limit=2))
+    assert pinned_store.remove("a")
+    assert pinned_store.all() == []
+    assert pinned_store.reserve() is None
+
+
+def test_legacy_pinned_store_is_migrated(pinned_store: PinnedCapacityStore):
+    legacy_store = [container("a", limit=4, count=3), container("b", limit=4, count=1)]
+    reds.base_connection.set(pinned_store.store_name, json.dumps(legacy_store))
+
+    pinned_store.migrate()
+
+    assert pinned_store.all() == legacy_store
+    assert pinned_store.reserve()["hostname"] == "b"
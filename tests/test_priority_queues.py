@@ -0,0 +1,111 @@
+import asyncio
+import random
+import uuid
+from collections import Counter
+
+import pytest
+from rq import Queue
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import Script, TaskPriority
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.backend.core.redis.rediz import fifo_queue_name, fifo_queue_names, worker_liveness_key
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+from netpalm.routers.route_utils import cache_key_from_req_data
+
+pytestmark = pytest.mark.nolab
+
+executed = []
+
+
+def record(label):
+    executed.append(label)
+    return label
+
+
+@pytest.fixture(scope="function")
+def priority_redis_helper():
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_priority_fifo_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    yield redis_helper
+    for name in fifo_queue_names(config.redis_fifo_q):
+        redis_helper.local_queuedb[name]["queue"].delete(delete_jobs=True)
+        redis_helper.base_connection.delete(worker_liveness_key(name))
+
+
+def test_fifo_queue_names():
+    assert fifo_queue_names("fifo") == ["fifo_high", "fifo", "fifo_low"]
+    assert fifo_queue_name("fifo") == "fifo"
+    assert fifo_queue_name("fifo", TaskPriority.normal) == "fifo"
+    assert fifo_queue_name("fifo", TaskPriority.high) == "fifo_high"
+    assert fifo_queue_name("fifo", "low") == "fifo_low"
+
+
+def test_priority_selects_fifo_queue(priority_redis_helper: rediz.Rediz):
+    fifo_q = priority_redis_helper.config.redis_fifo_q
+    for priority, queue_name in ((None, fifo_q), ("high", f"{fifo_q}_high"), ("low", f"{fifo_q}_low")):
+        req_data = Script(script="hello_world", queue_strategy="fifo", priority=priority).dict()
+        r = priority_redis_helper.execute_task(method="script", kwargs=req_data)
+        assert r["data"]["task_queue"] == queue_name
+
+    assert priority_redis_helper.fifo_queue_depths() == {"high": 1, "normal": 1, "low": 1}
+    assert priority_redis_helper.getjoblist(q=False)["data"]["queue_depth"] == {"high": 1, "normal": 1, "low": 1}
+
+
+def test_bulk_tasks_honour_priority(priority_redis_helper: rediz.Rediz):
+    kwargs_list = [{"script": "hello_world", "priority": "low"}, {"script": "hello_world"}]
+    priority_redis_helper.execute_bulk_task(method="script", kwargs_list=kwargs_list)
+    assert priority_redis_helper.fifo_queue_depths() == {"high": 0, "normal": 1, "low": 1}
+
+
+def test_high_priority_jumps_a_queue(priority_redis_helper: rediz.Rediz):
+    fifo_q = priority_redis_helper.config.redis_fifo_q
+    queue = priority_redis_helper.local_queuedb[fifo_q]["queue"]
+    first = priority_redis_helper.sendtask(q=fifo_q, exe="script", kwargs={"script": "hello_world"})
+    urgent = priority_redis_helper.sendtask(q=fifo_q, exe="script", kwargs={"script": "hello_world"}, at_front=True)
+    assert queue.job_ids == [urgent["data"]["task_id"], first["data"]["task_id"]]
+
+    async_redis_helper = async_rediz.AsyncRediz(priority_redis_helper, priority_redis_helper.config)
+    also_urgent = asyncio.run(async_redis_helper.sendtask(q=fifo_q, exe="script", kwargs={"script": "hello_world"},
+                                                          at_front=True))
+    assert queue.job_ids[0] == also_urgent["data"]["task_id"]
+
+
+def test_priority_does_not_change_cache_key():
+    req_data = {"connection_args": {"host": "10.0.2.33"}, "command": "show run", "args": {}}
+    assert cache_key_from_req_data({**req_data, "priority": "high"}) == cache_key_from_req_data(req_data)
+
+
+def run_worker(redis_helper: rediz.Rediz, queue_weights=None):
+    fifo_q = redis_helper.config.redis_fifo_q
+    queues = [Queue(name, connection=redis_helper.base_connection) for name in fifo_queue_names(fifo_q)]
+    worker = NetpalmInProcessWorker(queues, name=f"{fifo_q}_worker_{uuid.uuid4()}",
+                                    connection=redis_helper.base_connection, queue_weights=queue_weights)
+    worker.work(burst=True)
+
+
+def test_worker_drains_priorities_in_strict_order(priority_redis_helper: rediz.Rediz):
+    fifo_q = priority_redis_helper.config.redis_fifo_q
+    executed.clear()
+    for priority in ("low", "normal", "high", "low", "high"):
+        Queue(fifo_queue_name(fifo_q, priority), connection=priority_redis_helper.base_connection).enqueue(
+            record, priority)
+    run_worker(priority_redis_helper)
+    assert executed == ["high", "high", "normal", "low", "low"]
+
+
+def test_weighted_worker_favours_heavier_queues(priority_redis_helper: rediz.Rediz):
+    fifo_q = priority_redis_helper.config.redis_fifo_q
+    random.seed(1)
+    executed.clear()
+    for priority in ("high", "low"):
+        queue = Queue(fifo_queue_name(fifo_q, priority), connection=priority_redis_helper.base_connection)
+        for _ in range(30):
+            queue.enqueue(record, priority)
+    run_worker(priority_redis_helper, queue_weights={f"{fifo_q}_high": 9, f"{fifo_q}_low": 1})
+
+    # low priority work still gets a share while high priority work is waiting
+    first_half = Counter(executed[:30])
+    assert first_half["high"] > first_half["low"] > 0
+    assert len(executed) == 60
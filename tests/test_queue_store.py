@@ -0,0 +1,78 @@
+import json
+import logging
+import time
+import uuid
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+
+pytestmark = pytest.mark.nolab
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="function")
+def queue_store_redis_helper():
+    config = confload.initialize_config()
+    config.redis_queue_store = f"test_netpalm_queue_store_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    yield redis_helper
+    redis_helper.base_connection.delete(config.redis_queue_store)
+
+
+def test_legacy_queue_db_is_migrated(queue_store_redis_helper: rediz.Rediz):
+    conn = queue_store_redis_helper.base_connection
+    legacy_db = {"netpalm-db": "queue-val", "10.0.2.33": True, "10.0.2.34": True}
+    conn.set(queue_store_redis_helper.networked_queuedb, json.dumps(legacy_db))
+
+    queue_store_redis_helper.migrate_network_queue_db()
+
+    assert conn.type(queue_store_redis_helper.networked_queuedb) == b"hash"
+    assert conn.hexists(queue_store_redis_helper.networked_queuedb, "10.0.2.33")
+    assert conn.hexists(queue_store_redis_helper.networked_queuedb, "10.0.2.34")
+    assert not conn.hexists(queue_store_redis_helper.networked_queuedb, "netpalm-db")
+
+    queue_store_redis_helper.migrate_network_queue_db()  # migrating twice is harmless
+    assert conn.hlen(queue_store_redis_helper.networked_queuedb) == 2
+
+
+def test_migration_is_logged_once_it_commits(queue_store_redis_helper: rediz.Rediz, caplog):
+    conn = queue_store_redis_helper.base_connection
+    conn.set(queue_store_redis_helper.networked_queuedb, json.dumps({"10.0.2.33": True}))
+    with caplog.at_level(logging.INFO, logger=rediz.log.name):
+        queue_store_redis_helper.migrate_network_queue_db()
+        queue_store_redis_helper.migrate_network_queue_db()
+    assert [record.getMessage() for record in caplog.records if "legacy" in record.getMessage()] == \
+        ["migrated 1 queues from legacy networked queue db"]
+
+
+def test_append_network_queue_db(queue_store_redis_helper: rediz.Rediz):
+    assert queue_store_redis_helper.getqueue("10.0.2.33") is False
+    queue_store_redis_helper.append_network_queue_db("10.0.2.33")
+    conn = queue_store_redis_helper.base_connection
+    assert conn.hexists(queue_store_redis_helper.networked_queuedb, "10.0.2.33")
+
+
+def time_queue_lookups(redis_helper: rediz.Rediz, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        redis_helper.append_network_queue_db(f"bench-{i}")
+        redis_helper.getqueue(f"bench-missing-{i}")
+    return (time.perf_counter() - start) / iterations
+
+
+@pytest.mark.benchmark
+def test_queue_routing_is_constant_time(queue_store_redis_helper: rediz.Rediz):
+    conn = queue_store_redis_helper.base_connection
+    iterations = 500
+    results = {}
+    for host_count in (100, 20000):
+        conn.delete(queue_store_redis_helper.networked_queuedb)
+        hosts = {f"10.{i // 65536}.{i // 256 % 256}.{i % 256}": 1 for i in range(host_count)}
+        conn.hset(queue_store_redis_helper.networked_queuedb, mapping=hosts)
+        results[host_count] = time_queue_lookups(queue_store_redis_helper, iterations)
+        log.info(f"{host_count} pinned hosts: {results[host_count] * 1000:.3f}ms per routing lookup")
+
+    # the legacy json blob was ~200x slower at 20k hosts, a hash should stay flat
+    assert results[20000] < results[100] * 3
@@ -0,0 +1,108 @@
+import socket
+import ssl
+import threading
+import time
+from copy import copy
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis.connection import InstrumentedConnectionPool, InstrumentedConnection, \
+    InstrumentedSSLConnection, connection_pool
+
+pytestmark = pytest.mark.nolab
+
+TLS_DIR = "netpalm/backend/core/security/cert/tls"
+
+
+class OKServer:
+    """answers every RESP command with +OK, enough for redis-py to AUTH and run SET"""
+
+    def __init__(self, tls: bool = False):
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.context = None
+        if tls:
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(f"{TLS_DIR}/redis.crt", f"{TLS_DIR}/redis.key")
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        try:
+            if self.context:
+                conn = self.context.wrap_socket(conn, server_side=True)
+            reader = conn.makefile("rb")
+            while line := reader.readline():
+                for _ in range(int(line[1:])):
+                    length = int(reader.readline()[1:])
+                    reader.read(length + 2)
+                conn.sendall(b"+OK\r\n")
+        except (OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+
+
+def test_pool_counts_waits_and_usage():
+    server = OKServer()
+    pool = InstrumentedConnectionPool(max_connections=1, timeout=5, connection_class=InstrumentedConnection,
+                                      host="127.0.0.1", port=server.port, password="secret")
+    connection = pool.get_connection("SET")
+    assert pool.usage()["in_use"] == 1
+    assert pool.usage()["idle"] == 0
+
+    threading.Timer(0.3, pool.release, args=(connection,)).start()
+    start = time.monotonic()
+    waited = pool.get_connection("SET")
+    assert time.monotonic() - start >= 0.25
+    pool.release(waited)
+
+    usage = pool.usage()
+    assert usage["waits"] == 1
+    assert usage["wait_seconds"] >= 0.25
+    assert usage["connections_created"] == 1
+    assert (usage["in_use"], usage["idle"], usage["max_connections"]) == (0, 1, 1)
+
+
+def test_tls_handshakes_are_counted():
+    server = OKServer(tls=True)
+    pool = InstrumentedConnectionPool(max_connections=2, timeout=5, connection_class=InstrumentedSSLConnection,
+                                      ssl_cert_reqs="none", host="127.0.0.1", port=server.port, password="secret")
+    for _ in range(3):
+        connection = pool.get_connection("SET")
+        connection.send_command("SET", "key", "value")
+        assert connection.read_response() == b"OK"
+        connection.disconnect()
+        pool.release(connection)
+
+    usage = pool.usage()
+    assert usage["tls_handshakes"] == 3
+    assert usage["connections_created"] == 1
+    assert usage["connect_seconds"] > 0
+
+
+def test_factory_pools_follow_tls_and_auth_settings():
+    server = OKServer(tls=True)
+    plain = copy(confload.initialize_config())
+    plain.redis_server, plain.redis_port, plain.redis_tls_enabled = "127.0.0.1", server.port, False
+    assert connection_pool(plain) is connection_pool(copy(plain))
+
+    other_password = copy(plain)
+    other_password.redis_key = "some other password"
+    assert connection_pool(other_password) is not connection_pool(plain)
+
+    tls = copy(plain)
+    tls.redis_tls_enabled = True
+    pool = connection_pool(tls)
+    assert pool is not connection_pool(plain)
+    # the test certificate has long expired, so a connection that really verifies it never comes up
+    with pytest.raises(ConnectionError, match="certificate"):
+        pool.get_connection("SET")
+    assert pool.usage()["tls_handshakes"] == 0
+    assert pool.usage()["connect_seconds"] > 0
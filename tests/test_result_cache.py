@@ -0,0 +1,144 @@
+import asyncio
+import uuid
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.routers import route_utils
+from netpalm.routers.route_utils import cacheable_model, cache_key_from_model
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+
+pytestmark = pytest.mark.nolab
+
+request = {
+    "library": "netmiko",
+    "connection_args": {"host": "10.0.2.33", "port": 22},
+    "command": "show version",
+    "cache": {"enabled": True, "ttl": 60, "poison": False}
+}
+
+
+def fake_getconfig(**kwargs):
+    return {kwargs["command"]: ["Cisco IOS Software, Version 15.2"]}
+
+
+def broken_getconfig(**kwargs):
+    from netpalm.backend.core.utilities.rediz_meta import write_meta_error
+    write_meta_error("device unreachable")
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_result_cache_fifo_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    redis_helper.cache.clear()
+    monkeypatch.setitem(redis_helper.routes, "fake_getconfig", fake_getconfig)
+    monkeypatch.setitem(redis_helper.routes, "broken_getconfig", broken_getconfig)
+    monkeypatch.setattr(route_utils, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def run_worker(redis_helper: rediz.Rediz):
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    NetpalmInProcessWorker(queue, name=f"{queue.name}_worker", connection=redis_helper.base_connection).work(
+        burst=True)
+
+
+def test_cache_hit_returns_device_output(redis_helper: rediz.Rediz):
+    calls = []
+
+    @cacheable_model
+    def getconfig(model):
+        calls.append(model)
+        return redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    queued = getconfig(model)
+    assert queued["data"]["task_status"] == "queued"
+    assert redis_helper.cache.get(cache_key_from_model(model)) is None  # the acknowledgement isn't cached
+
+    run_worker(redis_helper)
+
+    cached = getconfig(model)
+    assert len(calls) == 1
+    assert cached["data"]["cached"] is True
+    assert cached["data"]["task_status"] == "finished"
+    assert cached["data"]["task_result"] == {"show version": ["Cisco IOS Software, Version 15.2"]}
+    assert cached["data"]["task_id"] == queued["data"]["task_id"]
+    assert 0 < redis_helper.base_connection.ttl(redis_helper.key_prefix + cache_key_from_model(model)) <= 60
+
+
+def test_failed_tasks_are_not_cached(redis_helper: rediz.Rediz):
+    @cacheable_model
+    def getconfig(model):
+        return redis_helper.execute_task(method="broken_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    getconfig(model)
+    run_worker(redis_helper)
+    assert redis_helper.cache.get(cache_key_from_model(model)) is None
+
+
+def test_results_fetched_before_a_poison_are_not_cached(redis_helper: rediz.Rediz):
+    @cacheable_model
+    def getconfig(model):
+        return redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    getconfig(model)
+    # a setconfig lands while the getconfig is still queued, what it reads may predate the change
+    redis_helper.clear_cache_for_host(cache_key_from_model(model))
+    run_worker(redis_helper)
+    assert redis_helper.cache.get(cache_key_from_model(model)) is None
+
+    # one enqueued after the poison is cached as normal
+    getconfig(model)
+    run_worker(redis_helper)
+    assert redis_helper.cache.get(cache_key_from_model(model))["data"]["cached"] is True
+
+    # and so is a result fetched before a full clear
+    getconfig(GetConfig(**{**request, "command": "show clock"}))
+    redis_helper.cache.clear()
+    run_worker(redis_helper)
+    assert redis_helper.cache.keys() == []
+
+
+def test_cached_results_never_outlive_their_task(redis_helper: rediz.Rediz):
+    @cacheable_model
+    def getconfig(model):
+        return redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**{**request, "cache": {"enabled": True, "ttl": redis_helper.config.redis_task_result_ttl * 2}})
+    getconfig(model)
+    run_worker(redis_helper)
+    ttl = redis_helper.base_connection.ttl(redis_helper.key_prefix + cache_key_from_model(model))
+    assert 0 < ttl <= redis_helper.config.redis_task_result_ttl
+
+
+def test_async_routes_tag_their_tasks(redis_helper: rediz.Rediz, monkeypatch):
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, redis_helper.config)
+    monkeypatch.setattr(route_utils, "areds", async_redis_helper)
+
+    @cacheable_model
+    async def getconfig(model):
+        return await async_redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+
+    async def run():
+        # tasks enqueued outside a cacheable route aren't cached
+        return await getconfig(model), await async_redis_helper.execute_task(method="fake_getconfig",
+                                                                             kwargs=model.dict())
+
+    queued, plain = asyncio.run(run())
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    job = queue.fetch_job(queued["data"]["task_id"])
+    assert job.meta["cache_key"] == cache_key_from_model(model)
+    assert job.meta["cache_ttl"] == 60
+    assert job.meta["cache_epoch"] == redis_helper.cache.epoch("10.0.2.33:22")
+    assert "cache_key" not in queue.fetch_job(plain["data"]["task_id"]).meta
@@ -26,7 +26,7 @@ cache_key_data = [
         },
         "command": "show ip int bri",
         "expected_cache_key": "foo.com:200:show ip int bri:"
-                              "c724034119d4c50b0ab84caa66a4505bc4793d04dac443abb4255ee605b11469"
+                              "56b1031865c8d32be867af843fc57d445c3e5d3a19dff88d321e60b651a946cc"
     },
     {
         "connection_args": {
@@ -38,7 +38,7 @@ cache_key_data = [
         },
         "command": "show ip int bri",
         "expected_cache_key": "foo.com:200:show ip int bri:"
-                              "af9bafc9f56fc2898ec690990588600558615a6b93c40171708a660ece14d929"
+                              "1eb43b68c6dfc5e73923917c7f8968ea304d1a924701cc27adf5bbad029e968a"
     },
     {
         "connection_args": {
@@ -46,7 +46,7 @@ cache_key_data = [
         },
         "command": "show ip int bri",
         "expected_cache_key": "foo.com:None:show ip int bri:"
-                              "4f86e603dd721d1a93d78a058ed49c07fa04a222b5409f7d27cfcd3e76e4d665"
+                              "6d3c5aa6a4c673b9cd9a45588b9eb0ddc05ebd64299abc55ebe68f5007247175"
     },
     {
         "library": "ncclient",
@@ -65,7 +65,7 @@ cache_key_data = [
         "queue_strategy": "fifo",
         "expected_cache_key": "10.0.2.39:830:<filter type='subtree'>"
                               "<System xmlns='http://cisco.com/ns/yang/cisco-nx-os-device'></System></filter>:"
-                              "f2cdfc252eec75496ee9817d5f1efe1ca1df43f259b11864daf5d3b639ef70d5"
+                              "cbd94fcfe71fa7b0db05453725bf590017d093a4c37729e0baaac9cf3d07a5ff"
     },
     {
         "connection_args": {
@@ -82,7 +82,7 @@ cache_key_data = [
         "webhook": True,
         "queue_strategy": "fifo",
         "expected_cache_key": "10.0.2.23:None:['show run | i hostname', 'show ip int brief']:"
-                              "cb5b0659cf349cf8cb49960ead9ba75adf216af4e1422d46f1c6ad64b8675ef8"
+                              "3547cf3060642619107a596b561e1c37a1bcb6f779ea9c8a6d4da3a775fa4b2f"
     }
 ]
 
@@ -0,0 +1,166 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.routers import route_utils
+from netpalm.routers.route_utils import cacheable_model, cache_key_from_model
+
+pytestmark = pytest.mark.nolab
+
+request = {
+    "library": "netmiko",
+    "connection_args": {"host": "10.0.2.33", "port": 22},
+    "command": "show version",
+    "cache": {"enabled": True, "ttl": 300, "poison": False}
+}
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_singleflight_fifo_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    redis_helper.cache.clear()
+    redis_helper.inflight.clear_keys("10.0.2.33:22")
+    monkeypatch.setattr(route_utils, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def slow_enqueue(redis_helper: rediz.Rediz, calls: list):
+    def getconfig(model):
+        calls.append(model)
+        time.sleep(0.2)  # long enough for every other request to arrive while this one is in flight
+        return redis_helper.execute_task(method="getconfig", kwargs=model.dict())
+
+    return getconfig
+
+
+def test_identical_requests_share_one_task(redis_helper: rediz.Rediz):
+    calls = []
+    getconfig = cacheable_model(slow_enqueue(redis_helper, calls))
+    model = GetConfig(**request)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda _: getconfig(model), range(20)))
+
+    assert len(calls) == 1
+    assert len({r["data"]["task_id"] for r in results}) == 1
+    assert redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"].count == 1
+
+
+def test_finished_tasks_are_not_joined(redis_helper: rediz.Rediz):
+    calls = []
+    getconfig = cacheable_model(slow_enqueue(redis_helper, calls))
+    model = GetConfig(**request)
+    first = getconfig(model)
+    cache_key = cache_key_from_model(model)
+    redis_helper.cache.delete(cache_key)
+    # still queued, a cache miss joins the task in flight
+    assert getconfig(model)["data"]["task_id"] == first["data"]["task_id"]
+
+    queue = redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+    job = queue.fetch_job(first["data"]["task_id"])
+    job.set_status("finished")
+    redis_helper.cache.delete(cache_key)
+    assert getconfig(model)["data"]["task_id"] != first["data"]["task_id"]
+    assert len(calls) == 2
+
+
+def test_failed_claim_lets_the_next_request_run(redis_helper: rediz.Rediz):
+    @cacheable_model
+    def broken(model):
+        raise RuntimeError("device unreachable")
+
+    model = GetConfig(**request)
+    with pytest.raises(RuntimeError):
+        broken(model)
+    assert redis_helper.inflight.lookup(cache_key_from_model(model)) == (False, None)
+
+
+def test_async_identical_requests_share_one_task(redis_helper: rediz.Rediz, monkeypatch):
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, redis_helper.config)
+    monkeypatch.setattr(route_utils, "areds", async_redis_helper)
+    calls = []
+
+    @cacheable_model
+    async def getconfig(model):
+        calls.append(model)
+        await asyncio.sleep(0.2)
+        return await async_redis_helper.execute_task(method="getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+
+    async def run():
+        return await asyncio.gather(*[getconfig(model) for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert len({r["data"]["task_id"] for r in results}) == 1
+
+
+def test_joiners_wake_as_soon_as_the_request_is_published(redis_helper: rediz.Rediz):
+    inflight = redis_helper.inflight
+    cache_key = cache_key_from_model(GetConfig(**request))
+    assert inflight.claim(cache_key)
+    published = {"data": {"task_id": None, "cached": False}}
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        started = time.monotonic()
+        joined = pool.submit(inflight.join, cache_key)
+        time.sleep(0.2)
+        inflight.publish(cache_key, published)
+        assert joined.result() == published
+    # woken by the publish rather than after the full wait
+    assert time.monotonic() - started < inflight.wait / 2
+    inflight.drop(cache_key)
+
+    dropped = inflight.claim("10.0.2.33:22:show clock:abc")
+    assert dropped
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        joined = pool.submit(inflight.join, "10.0.2.33:22:show clock:abc")
+        time.sleep(0.2)
+        started = time.monotonic()
+        redis_helper.clear_cache_for_host("10.0.2.33:22:show clock:abc")
+        assert joined.result() is None
+    assert time.monotonic() - started < inflight.wait / 2
+
+
+def test_joiners_are_bounded(redis_helper: rediz.Rediz):
+    inflight = redis_helper.inflight
+    cache_key = cache_key_from_model(GetConfig(**request))
+    assert inflight.claim(cache_key)
+    for _ in range(redis_helper.config.redis_cache_singleflight_max_joiners):
+        assert inflight.joiners.acquire(blocking=False)
+    # every slot is taken, so this one runs on its own instead of parking a thread
+    started = time.monotonic()
+    assert inflight.join(cache_key) is None
+    assert time.monotonic() - started < 0.5
+    for _ in range(redis_helper.config.redis_cache_singleflight_max_joiners):
+        inflight.joiners.release()
+    inflight.drop(cache_key)
+
+
+def test_async_joiners_wake_as_soon_as_the_request_is_published(redis_helper: rediz.Rediz):
+    async_inflight = async_rediz.AsyncRediz(redis_helper, redis_helper.config).inflight
+    cache_key = cache_key_from_model(GetConfig(**request))
+    published = {"data": {"task_id": None, "cached": False}}
+
+    async def run():
+        assert await async_inflight.claim(cache_key)
+        joined = asyncio.create_task(async_inflight.join(cache_key))
+        await asyncio.sleep(0.2)
+        started = time.monotonic()
+        await async_inflight.publish(cache_key, published)
+        assert await joined == published
+        elapsed = time.monotonic() - started
+        await async_inflight.drop(cache_key)
+        return elapsed
+
+    assert asyncio.run(run()) < redis_helper.inflight.wait / 2
@@ -0,0 +1,129 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.models.models import GetConfig
+from netpalm.backend.core.redis import rediz, async_rediz
+from netpalm.routers import route_utils
+from netpalm.routers.route_utils import cacheable_model, cache_key_from_model
+from netpalm.backend.core.utilities.rediz_worker import NetpalmInProcessWorker
+
+pytestmark = pytest.mark.nolab
+
+request = {
+    "library": "netmiko",
+    "connection_args": {"host": "10.0.2.34", "port": 22},
+    "command": "show interfaces",
+    "cache": {"enabled": True, "ttl": 1, "stale_ttl": 60, "poison": False}
+}
+
+device_output = {"show interfaces": ["GigabitEthernet0/0 is up"]}
+
+
+def fake_getconfig(**kwargs):
+    return device_output
+
+
+@pytest.fixture(scope="function")
+def redis_helper(monkeypatch):
+    monkeypatch.setenv("NETPALM_REDIS_CACHE_ENABLED", "TRUE")
+    config = confload.initialize_config()
+    config.redis_fifo_q = f"test_stale_cache_fifo_{uuid.uuid4()}"
+    redis_helper = rediz.Rediz(config)
+    redis_helper.clear_cache_for_host("10.0.2.34:22:")
+    monkeypatch.setitem(redis_helper.routes, "fake_getconfig", fake_getconfig)
+    monkeypatch.setattr(route_utils, "reds", redis_helper)
+    yield redis_helper
+    redis_helper.clear_cache_for_host("10.0.2.34:22:")
+    redis_helper.local_queuedb[config.redis_fifo_q]["queue"].delete(delete_jobs=True)
+
+
+def queue_of(redis_helper: rediz.Rediz):
+    return redis_helper.local_queuedb[redis_helper.config.redis_fifo_q]["queue"]
+
+
+def run_worker(redis_helper: rediz.Rediz):
+    queue = queue_of(redis_helper)
+    NetpalmInProcessWorker(queue, name=f"{queue.name}_worker", connection=redis_helper.base_connection).work(
+        burst=True)
+
+
+def test_stale_entries_outlive_their_ttl(redis_helper: rediz.Rediz):
+    cache = redis_helper.cache
+    cache.set("10.0.2.34:22:show clock", "12:00", timeout=1, stale_ttl=60)
+    assert 55 < redis_helper.base_connection.ttl(redis_helper.key_prefix + "10.0.2.34:22:show clock") <= 61
+    assert cache.get_entry("10.0.2.34:22:show clock") == ("12:00", False)
+
+    time.sleep(1.1)
+    assert cache.get_entry("10.0.2.34:22:show clock") == ("12:00", True)
+    assert cache.get("10.0.2.34:22:show clock") == "12:00"
+
+    # only the first caller to find it stale refreshes it, until it's written again
+    assert cache.claim_refresh("10.0.2.34:22:show clock", ttl=60)
+    assert not cache.claim_refresh("10.0.2.34:22:show clock", ttl=60)
+    cache.set("10.0.2.34:22:show clock", "12:01", timeout=1, stale_ttl=60)
+    assert cache.get_entry("10.0.2.34:22:show clock") == ("12:01", False)
+    assert cache.claim_refresh("10.0.2.34:22:show clock", ttl=60)
+
+    cache.set("10.0.2.34:22:show ver", "15.2", timeout=1)
+    time.sleep(1.1)
+    assert cache.get_entry("10.0.2.34:22:show ver") == (None, False)
+
+
+def test_stale_hit_returns_at_once_and_refreshes_once(redis_helper: rediz.Rediz):
+    calls = []
+
+    @cacheable_model
+    def getconfig(model):
+        calls.append(model)
+        return redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    getconfig(model)
+    run_worker(redis_helper)
+    fresh = getconfig(model)
+    assert fresh["data"]["cached"] is True
+    assert fresh["data"]["stale"] is False
+
+    time.sleep(1.1)
+    stale = getconfig(model)
+    assert stale["data"]["stale"] is True
+    assert stale["data"]["task_result"] == device_output
+    assert getconfig(model)["data"]["stale"] is True
+    assert len(calls) == 2  # the first request and a single refresh
+    assert queue_of(redis_helper).count == 1
+    assert queue_of(redis_helper).fetch_job(queue_of(redis_helper).job_ids[0]).meta["cache_stale_ttl"] == 60
+
+    run_worker(redis_helper)
+    refreshed = getconfig(model)
+    assert refreshed["data"]["stale"] is False
+    assert refreshed["data"]["task_id"] != fresh["data"]["task_id"]
+
+
+def test_async_stale_hit_refreshes_in_the_background(redis_helper: rediz.Rediz, monkeypatch):
+    async_redis_helper = async_rediz.AsyncRediz(redis_helper, redis_helper.config)
+    monkeypatch.setattr(route_utils, "areds", async_redis_helper)
+    calls = []
+
+    @cacheable_model
+    async def getconfig(model):
+        calls.append(model)
+        return await async_redis_helper.execute_task(method="fake_getconfig", kwargs=model.dict())
+
+    model = GetConfig(**request)
+    redis_helper.cache.set(cache_key_from_model(model), {"data": {"task_result": device_output}},
+                           timeout=1, stale_ttl=60)
+
+    async def run():
+        await asyncio.sleep(1.1)
+        responses = [await getconfig(model), await getconfig(model)]
+        await asyncio.gather(*route_utils._refreshes)
+        return responses
+
+    responses = asyncio.run(run())
+    assert [response["data"]["stale"] for response in responses] == [True, True]
+    assert len(calls) == 1
+    assert queue_of(redis_helper).count == 1
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import pytest
+from rq import Queue, SimpleWorker
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.utilities.rediz_worker import NetpalmWorker
+
+pytestmark = pytest.mark.nolab
+
+
+class InProcessNetpalmWorker(NetpalmWorker, SimpleWorker):
+    pass
+
+
+@pytest.fixture(scope="function")
+def events_redis_helper():
+    return rediz.Rediz(confload.initialize_config())
+
+
+@pytest.fixture(scope="function")
+def queue(events_redis_helper: rediz.Rediz):
+    queue = Queue(f"test_task_events_{uuid.uuid4()}", connection=events_redis_helper.base_connection)
+    yield queue
+    queue.delete(delete_jobs=True)
+
+
+def enqueue(redis_helper: rediz.Rediz, queue: Queue, func="builtins.len", args=("abc",)):
+    return queue.enqueue(func, args=args, meta=redis_helper.get_redis_meta_template())
+
+
+def work(queue: Queue):
+    InProcessNetpalmWorker(queue, connection=queue.connection).work(burst=True)
+
+
+def wait_in_thread(redis_helper: rediz.Rediz, task_id: str, timeout: float):
+    """rq workers need the main thread for their signal handlers, so the waiter gets its own"""
+    outcome = {}
+
+    def wait():
+        start = time.monotonic()
+        outcome["response"] = asyncio.run(redis_helper.task_events.wait(task_id, timeout, redis_helper.fetchtask))
+        outcome["elapsed"] = time.monotonic() - start
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_wait_answers_when_the_task_finishes(events_redis_helper: rediz.Rediz, queue: Queue):
+    job = enqueue(events_redis_helper, queue)
+    thread, outcome = wait_in_thread(events_redis_helper, job.id, 10)
+    time.sleep(0.5)
+    work(queue)
+    thread.join()
+
+    r = outcome["response"]
+    assert outcome["elapsed"] < 5
+    assert r["data"]["task_status"] == "finished"
+    assert r["data"]["task_result"] == 3
+    assert not events_redis_helper.task_events.waiters
+
+
+def test_wait_answers_when_the_task_fails(events_redis_helper: rediz.Rediz, queue: Queue):
+    job = enqueue(events_redis_helper, queue, args=(1,))
+    thread, outcome = wait_in_thread(events_redis_helper, job.id, 10)
+    time.sleep(0.5)
+    work(queue)
+    thread.join()
+
+    r = outcome["response"]
+    assert outcome["elapsed"] < 5
+    assert r["data"]["task_status"] == "failed"
+
+
+def test_wait_times_out_with_current_state(events_redis_helper: rediz.Rediz, queue: Queue):
+    job = enqueue(events_redis_helper, queue)
+
+    start = time.monotonic()
+    r = asyncio.run(events_redis_helper.task_events.wait(job.id, 0.5, events_redis_helper.fetchtask))
+    assert time.monotonic() - start >= 0.5
+    assert r["data"]["task_status"] == "queued"
+    assert not events_redis_helper.task_events.waiters
+
+
+def test_wait_returns_finished_tasks_immediately(events_redis_helper: rediz.Rediz, queue: Queue):
+    job = enqueue(events_redis_helper, queue)
+    work(queue)
+
+    start = time.monotonic()
+    r = asyncio.run(events_redis_helper.task_events.wait(job.id, 10, events_redis_helper.fetchtask))
+    assert time.monotonic() - start < 1
+    assert r["data"]["task_status"] == "finished"
+
+
+def stream_in_thread(redis_helper: rediz.Rediz, count: int, **filters):
+    outcome = {"events": []}
+
+    async def read():
+        async for chunk in redis_helper.task_events.stream(keepalive=0.2, **filters):
+            if chunk.startswith("event:"):
+                outcome["events"].append(json.loads(chunk.split("data: ", 1)[1]))
+                if len(outcome["events"]) == count:
+                    break
+    thread = threading.Thread(target=asyncio.run, args=(read(),), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not redis_helper.task_events.streams and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return thread, outcome
+
+
+def test_stream_follows_lifecycle_filtered_by_host(events_redis_helper: rediz.Rediz, queue: Queue):
+    thread, outcome = stream_in_thread(events_redis_helper, 3, hosts=["10.0.2.1"])
+    jobs = []
+    for host in ("10.0.2.1", "10.0.2.2"):
+        job = queue.enqueue("builtins.dict", kwargs={"connection_args": {"host": host}},
+                            meta=events_redis_helper.get_redis_meta_template())
+        events_redis_helper.publish_task_event(job.id, "queued", queue.name, host=host)
+        jobs.append(job)
+    work(queue)
+    thread.join(5)
+
+    assert [(e["task_id"], e["task_status"]) for e in outcome["events"]] == [
+        (jobs[0].id, "queued"), (jobs[0].id, "started"), (jobs[0].id, "finished")
+    ]
+    assert {e["host"] for e in outcome["events"]} == {"10.0.2.1"}
+    assert not events_redis_helper.task_events.streams
+
+
+def test_stream_filters_by_task_id(events_redis_helper: rediz.Rediz, queue: Queue):
+    jobs = [enqueue(events_redis_helper, queue) for _ in range(3)]
+    thread, outcome = stream_in_thread(events_redis_helper, 2, task_ids=[jobs[1].id])
+    work(queue)
+    thread.join(5)
+
+    assert [e["task_status"] for e in outcome["events"]] == ["started", "finished"]
+    assert {e["task_id"] for e in outcome["events"]} == {jobs[1].id}
+
+
+def test_wait_route_caps_the_timeout(monkeypatch):
+    from netpalm.routers import task as task_router
+    waited = []
+
+    async def wait(task_id, timeout, fetchtask):
+        waited.append(timeout)
+        return {"status": "success"}
+
+    monkeypatch.setattr(task_router.reds.task_events, "wait", wait)
+    monkeypatch.setattr(task_router.config, "task_wait_max_timeout", 60)
+    asyncio.run(task_router.wait_for_task("some-task", timeout=3600))
+    asyncio.run(task_router.wait_for_task("some-task", timeout=5))
+    assert waited == [60, 5]
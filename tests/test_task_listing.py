@@ -0,0 +1,74 @@
+import uuid
+
+import pytest
+from rq import Queue
+from rq.registry import FinishedJobRegistry
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+
+pytestmark = pytest.mark.nolab
+
+
+@pytest.fixture(scope="function")
+def listing_queue():
+    config = confload.initialize_config()
+    redis_helper = rediz.Rediz(config)
+    queue = Queue(f"test_listing_{uuid.uuid4()}", connection=redis_helper.base_connection)
+    jobs = [queue.enqueue("builtins.print", meta={"errors": []}) for _ in range(7)]
+    finished = FinishedJobRegistry(queue=queue)
+    for job in jobs[:3]:
+        queue.remove(job)
+        job.set_status("finished")
+        finished.add(job, -1)
+    yield redis_helper, queue, jobs
+    queue.delete(delete_jobs=True)
+    redis_helper.base_connection.delete(finished.key)
+
+
+def listed_ids(response):
+    return [task["data"]["task_id"] for task in response["data"]["task_id"]]
+
+
+def test_listing_pages_across_registries(listing_queue):
+    redis_helper, queue, jobs = listing_queue
+    seen = []
+    cursor = 0
+    while cursor is not None:
+        r = redis_helper.getjobliststatus(queue.name, cursor=cursor, limit=3)
+        assert r["data"]["total"] == 7
+        seen += listed_ids(r)
+        cursor = r["data"]["next_cursor"]
+    assert sorted(seen) == sorted(job.id for job in jobs)
+    assert len(seen) == 7
+
+
+def test_listing_filters_status(listing_queue):
+    redis_helper, queue, jobs = listing_queue
+    r = redis_helper.getjobliststatus(queue.name, statuses=["finished"])
+    assert r["data"]["total"] == 3
+    assert sorted(listed_ids(r)) == sorted(job.id for job in jobs[:3])
+    assert {task["data"]["task_status"] for task in r["data"]["task_id"]} == {"finished"}
+    assert r["data"]["next_cursor"] is None
+
+
+def test_listing_does_not_write(listing_queue, monkeypatch):
+    redis_helper, queue, jobs = listing_queue
+    before = {job.id: redis_helper.base_connection.hgetall(job.key) for job in jobs}
+
+    def no_save(*args, **kwargs):
+        raise AssertionError("listing must not save jobs")
+
+    monkeypatch.setattr("rq.job.Job.save", no_save)
+    r = redis_helper.getjobliststatus(queue.name)
+    assert len(r["data"]["task_id"]) == 7
+    assert before == {job.id: redis_helper.base_connection.hgetall(job.key) for job in jobs}
+
+
+def test_total_counts_expired_registry_entries(listing_queue):
+    redis_helper, queue, jobs = listing_queue
+    # a finished job whose hash expired before the registry got round to cleaning it up
+    redis_helper.base_connection.delete(jobs[0].key)
+    r = redis_helper.getjobliststatus(queue.name, statuses=["finished"])
+    assert r["data"]["total"] == 3
+    assert sorted(listed_ids(r)) == sorted(job.id for job in jobs[1:3])
@@ -0,0 +1,63 @@
+import uuid
+
+import pytest
+from rq import Queue
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.rediz import worker_liveness_key
+from netpalm.backend.core.utilities.rediz_worker import NetpalmWorker
+
+pytestmark = pytest.mark.nolab
+
+
+@pytest.fixture(scope="function")
+def liveness_redis_helper():
+    config = confload.initialize_config()
+    config.worker_liveness_cache_ttl = 60
+    return rediz.Rediz(config)
+
+
+@pytest.fixture(scope="function")
+def worker(liveness_redis_helper: rediz.Rediz):
+    queue_name = f"test_liveness_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=liveness_redis_helper.base_connection)
+    worker = NetpalmWorker(queue, name=f"{queue_name}_worker", connection=liveness_redis_helper.base_connection)
+    yield worker
+    liveness_redis_helper.base_connection.delete(worker_liveness_key(queue_name))
+
+
+def test_heartbeat_maintains_liveness_index(liveness_redis_helper: rediz.Rediz, worker: NetpalmWorker):
+    queue_name = worker.queue_names()[0]
+    assert not liveness_redis_helper.worker_is_alive(queue_name)
+
+    worker.register_birth()
+    worker.heartbeat()
+    conn = liveness_redis_helper.base_connection
+    assert conn.get(worker_liveness_key(queue_name)) == worker.name.encode()
+    assert 0 < conn.ttl(worker_liveness_key(queue_name)) <= worker.default_worker_ttl + 60
+    assert liveness_redis_helper.worker_is_alive(queue_name)
+
+    worker.register_death()
+    assert not conn.exists(worker_liveness_key(queue_name))
+
+
+def test_liveness_is_memoized(liveness_redis_helper: rediz.Rediz, worker: NetpalmWorker):
+    queue_name = worker.queue_names()[0]
+    worker.heartbeat()
+    assert liveness_redis_helper.worker_is_alive(queue_name)
+
+    liveness_redis_helper.base_connection.delete(worker_liveness_key(queue_name))
+    assert liveness_redis_helper.worker_is_alive(queue_name)  # served from the in-process memo
+
+    liveness_redis_helper.worker_liveness_memo.clear()
+    assert not liveness_redis_helper.worker_is_alive(queue_name)
+
+
+def test_register_death_keeps_other_workers_liveness(liveness_redis_helper: rediz.Rediz, worker: NetpalmWorker):
+    queue_name = worker.queue_names()[0]
+    other = NetpalmWorker(worker.queues, name=f"{queue_name}_other", connection=liveness_redis_helper.base_connection)
+    worker.heartbeat()
+    other.heartbeat()
+    worker.register_death()
+    assert liveness_redis_helper.base_connection.exists(worker_liveness_key(queue_name))
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+import uuid
+
+import pytest
+from rq import Queue
+from rq.timeouts import JobTimeoutException
+
+from netpalm.backend.core.confload import confload
+from netpalm.backend.core.redis import rediz
+from netpalm.backend.core.redis.rediz import worker_liveness_key
+from netpalm.backend.core.utilities.rediz_meta import write_meta_error
+from netpalm.backend.core.utilities.rediz_worker import (
+    NetpalmInProcessWorker, NetpalmThreadedWorker, NetpalmWorker, ThreadDeathPenalty, preload_drivers, worker_class
+)
+from netpalm.backend.plugins.calls.scriptrunner.script import script_exec
+
+pytestmark = pytest.mark.nolab
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="function")
+def mode_redis_helper():
+    return rediz.Rediz(confload.initialize_config())
+
+
+def run_hello_world(redis_helper: rediz.Rediz, mode: str, jobs: int) -> float:
+    """runs the hello_world script jobs times through a burst worker, returns jobs/sec"""
+    queue_name = f"test_worker_mode_{mode}_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=redis_helper.base_connection)
+    enqueued = [
+        queue.enqueue(script_exec, kwargs={"script": "hello_world", "args": {"hello": "world"}},
+                      meta=redis_helper.get_redis_meta_template())
+        for _ in range(jobs)
+    ]
+    worker = worker_class(mode)(queue, name=f"{queue_name}_worker", connection=redis_helper.base_connection)
+    start = time.perf_counter()
+    try:
+        worker.work(burst=True)
+    finally:
+        redis_helper.base_connection.delete(worker_liveness_key(queue_name))
+    elapsed = time.perf_counter() - start
+    assert all(queue.fetch_job(job.id).get_status() == "finished" for job in enqueued)
+    return jobs / elapsed
+
+
+def test_worker_class():
+    assert worker_class("forking") is NetpalmWorker
+    assert worker_class("inprocess") is NetpalmInProcessWorker
+    assert worker_class("threaded") is NetpalmThreadedWorker
+    with pytest.raises(ValueError):
+        worker_class("threads")
+
+
+def test_inprocess_worker_runs_jobs(mode_redis_helper: rediz.Rediz):
+    assert run_hello_world(mode_redis_helper, "inprocess", 3) > 0
+
+
+def test_inprocess_worker_enforces_timeouts(mode_redis_helper: rediz.Rediz):
+    queue_name = f"test_worker_mode_timeout_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=mode_redis_helper.base_connection)
+    job = queue.enqueue(time.sleep, 5, job_timeout=1)
+    worker = worker_class("inprocess")(queue, name=f"{queue_name}_worker",
+                                       connection=mode_redis_helper.base_connection)
+    start = time.perf_counter()
+    try:
+        worker.work(burst=True)
+    finally:
+        mode_redis_helper.base_connection.delete(worker_liveness_key(queue_name))
+    assert time.perf_counter() - start < 4
+    assert queue.fetch_job(job.id).get_status() == "failed"
+
+
+def device_wait(seconds: float, fail: bool = False):
+    """stands in for a device task, mostly waiting on the network"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+    if fail:
+        write_meta_error("device said no")
+    return seconds
+
+
+def run_threaded(redis_helper: rediz.Rediz, calls, concurrency: int):
+    queue_name = f"test_worker_mode_threaded_{uuid.uuid4()}"
+    queue = Queue(queue_name, connection=redis_helper.base_connection)
+    jobs = [queue.enqueue(device_wait, meta=redis_helper.get_redis_meta_template(), **call) for call in calls]
+    worker = NetpalmThreadedWorker(queue, name=f"{queue_name}_worker", connection=redis_helper.base_connection,
+                                   concurrency=concurrency)
+    start = time.perf_counter()
+    try:
+        worker.work(burst=True)
+    finally:
+        redis_helper.base_connection.delete(worker_liveness_key(queue_name))
+    return [queue.fetch_job(job.id) for job in jobs], time.perf_counter() - start
+
+
+def test_threaded_worker_runs_jobs_concurrently(mode_redis_helper: rediz.Rediz):
+    jobs, elapsed = run_threaded(mode_redis_helper, [{"args": (0.5,)}] * 8, concurrency=4)
+    assert all(job.get_status() == "finished" for job in jobs)
+    # two rounds of four, a serial worker would take four seconds
+    assert elapsed < 2
+
+
+def test_threaded_worker_keeps_meta_per_job(mode_redis_helper: rediz.Rediz):
+    calls = [{"args": (0.2,)}, {"args": (0.2,), "kwargs": {"fail": True}}, {"args": (0.2,)}]
+    (ok, failed, also_ok), _ = run_threaded(mode_redis_helper, calls, concurrency=3)
+    assert failed.get_status() == "failed"
+    assert failed.meta["errors"] == ["device said no"]
+    for job in (ok, also_ok):
+        assert job.get_status() == "finished"
+        assert job.meta["errors"] == []
+
+
+def test_threaded_worker_enforces_timeouts(mode_redis_helper: rediz.Rediz):
+    calls = [{"args": (5,), "job_timeout": 1}, {"args": (0.2,)}]
+    (slow, quick), elapsed = run_threaded(mode_redis_helper, calls, concurrency=2)
+    assert slow.get_status() == "failed"
+    assert "JobTimeoutException" in slow.exc_info
+    assert quick.get_status() == "finished"
+    assert elapsed < 4
+
+
+def keep_running_python():
+    # an exception set on this thread is raised at the next bytecode, give it plenty of chances
+    for _ in range(100000):
+        pass
+
+
+def test_thread_death_penalty_firing_after_its_job_is_ignored():
+    penalty = ThreadDeathPenalty(60, JobTimeoutException, job_id="finished")
+    with penalty:
+        pass
+    # the timer going off just as the job finished, before cancel could stop it
+    penalty.handle_death_penalty()
+    keep_running_python()
+
+
+def test_thread_death_penalty_clears_an_exception_its_job_never_raised():
+    penalties, outcome = [], []
+    blocked, finish = threading.Event(), threading.Event()
+
+    def job():
+        try:
+            penalties.append(ThreadDeathPenalty(60, JobTimeoutException, job_id="racing"))
+            with penalties[0]:
+                blocked.set()
+                finish.wait()  # a C call, a pending exception waits until it returns
+                # what's left of the job is done by the time cancel runs below
+            keep_running_python()
+            outcome.append("finished")
+        except JobTimeoutException:
+            outcome.append("timed out")
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    assert blocked.wait(5)
+    penalties[0].handle_death_penalty()
+    penalties[0].cancel_death_penalty()
+    finish.set()
+    thread.join(5)
+    assert outcome == ["finished"]
+
+
+@pytest.mark.benchmark
+def test_inprocess_worker_outpaces_forking(mode_redis_helper: rediz.Rediz):
+    # needs a real redis server, a forked work horse's writes to an in-memory stand-in never reach this process
+    preload_drivers()
+    jobs = 50
+    rates = {mode: run_hello_world(mode_redis_helper, mode, jobs) for mode in ("forking", "inprocess")}
+    for mode, rate in rates.items():
+        log.info(f"{mode} worker: {rate:.1f} hello_world jobs/sec")
+
+    # a fork, wait and reap per job costs several times what the hello_world script itself does
+    assert rates["inprocess"] > rates["forking"]